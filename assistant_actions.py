@@ -1,73 +1,216 @@
 # assistant_actions.py
+import re
 import webbrowser
 import sys # Still good to have for explicit exit handling, though GUI now orchestrates
 
 # Import functions from other modules
 from tts_stt import speak # Still needed for Marco's AI responses
-from media_player import play_youtube_audio, stop_vlc_player, get_vlc_player
+from media_player import play_youtube_audio, queue_youtube_audio, play_next_track, stop_vlc_player, get_vlc_player
 from news_api import get_news
 from llm_interaction import get_gemini_response # This function already calls speak internally
+from command_router import CommandRouter
+from intent_classifier import Intent, IntentClassifier, normalize
+from client_actions import send_action
+
+# Every command is matched against all triggers in a single pass; higher priority wins when several match
+ROUTER = CommandRouter()
+
+WEBSITES = {
+    "google": ("https://www.google.com", "Google"),
+    "facebook": ("https://www.facebook.com", "Facebook"),
+    "youtube": ("https://www.youtube.com", "YouTube"),
+    "linkedin": ("https://www.linkedin.com", "LinkedIn"),
+}
+
+# --- Core Commands ---
+@ROUTER.route("marco_stop", phrases=["marco stop"], priority=100, preempt=True)
+def handle_marco_stop(match):
+    stop_vlc_player() # This function now handles its own speak()
+    return "exit_program" # Signal to main.py (via GUI) to exit
+
+# --- Web Browser Commands ---
+@ROUTER.route("open_website", phrases=[f"open {site}" for site in WEBSITES], priority=90)
+def handle_open_website(match):
+    url, site_name = WEBSITES[match.trigger.split()[-1]]
+    if not send_action("open_url", url=url, title=site_name): # A server session's client opens it itself
+        webbrowser.open(url)
+    speak(f"Opening {site_name}.", cache=True) # One phrase per site, pre-rendered at startup
+    return f"Opened {site_name}."
+
+# --- Music Playback Commands ---
+@ROUTER.route("play", prefixes=["play"], priority=80, group="music", policy="supersede")
+def handle_play(match):
+    play_youtube_audio(match.argument) # This function handles its own speak()
+    return "Searching for and playing music."
+
+@ROUTER.route("queue", prefixes=["queue", "add to queue"], priority=85)
+def handle_queue(match):
+    queue_youtube_audio(match.argument) # This function handles its own speak()
+    return "Added music to the queue."
+
+# Bare "next"/"skip" only, so questions like "next week's weather" still reach the LLM
+@ROUTER.route("next_track", phrases=["next song", "next track", "skip song", "skip track"],
+              patterns=[r"^\s*(?:next|skip)(?: (?:it|this|this one))?\s*$"], priority=82)
+def handle_next_track(match):
+    play_next_track() # This function handles its own speak()
+    return "Skipped to the next track."
+
+@ROUTER.route("stop_music", phrases=["stop music", "stop song"], priority=70, group="music", policy="supersede")
+def handle_stop_music(match):
+    stop_vlc_player() # This function handles its own speak()
+    return "Music control command processed."
+
+# --- News Commands ---
+@ROUTER.route("news", phrases=["news"], priority=60, group="news", policy="supersede")
+def handle_news(match):
+    command = match.command
+    if "indian news" in command or "india news" in command:
+        get_news(country='in') # This function handles its own speak()
+        return "Fetching Indian news."
+    elif "international news" in command or "global news" in command:
+        get_news(topic='breaking') # This function handles its own speak()
+        return "Fetching international news."
+    else:
+        speak("Specify desired news. Options are: 'Indian news' or 'International news'.", cache=True)
+        return "Clarification needed for news."
+
+# --- Program Exit Commands ---
+# "exit"/"quit" must start the command so phrases like "play exit music" are not mistaken for them
+@ROUTER.route("exit", prefixes=["exit", "quit"], phrases=["goodbye"], priority=50, preempt=True)
+def handle_exit(match):
+    stop_vlc_player() # Ensure music stops before exit (this calls speak internally)
+    return "exit_program" # Signal to main.py (via GUI) to exit
+
+# --- Fallback to LLM for unhandled commands ---
+def handle_llm(match):
+    # LLM interaction module handles its own speaking
+    get_gemini_response(match.command)
+    return "LLM processed your request." # Generic status for LLM interaction
+
+# LLM turns share the conversation history, so they run one at a time and in order
+ROUTER.set_fallback("llm", handle_llm, group="conversation", policy="serial")
+
+# --- Intents for phrasings the triggers above miss ---
+# Each one is rewritten to the command its route expects; "chat" only holds general questions,
+# so inputs closest to those stay with the LLM. Intents whose rewrite parses the request (and gives
+# up on anything else) can get by with a lower similarity threshold. Thresholds and the margin are
+# tuned on the held-out phrasings and near misses in tests/test_intent_classifier.py.
+REQUEST_THRESHOLD = 0.4
+PLAY_THRESHOLD = 0.45 # "listen to"/"hear" also start plenty of requests that are not about music
+QUEUE_THRESHOLD = 0.3 # Titles dominate the n-grams, and only "add ... to the queue" phrasings parse
+
+_PLAY_REQUEST = re.compile(
+    r"^(?:(?:can|could|would|will) you |please |hey |marco )*"
+    r"(?:(?:i (?:want to|wanna|would like to)|id like to) (?:listen to|hear) |let me hear |lets hear |"
+    r"(?:put|throw|turn|stick) on |listen to |(?:start |begin )?play(?:ing)? (?:(?:me|us) )?|blast |spin |queue up )"
+    r"(?:(?:some|a|an|the|my) )*"
+    # Not "listen to me carefully", "let me hear your opinion", "listen to this joke"
+    r"(?!(?:me|you|your|yourself|him|her|us|them|this|that|it|what|how|why)\b)"
+    r"(?P<query>.+?)(?: (?:for me|please|now|on youtube))*$")
+# Only music stops the music: not "turn off the lights", "shut up" or "stop the car"
+_MUSIC_OBJECT = re.compile(r"\b(?:music|song|songs|track|tune|playback|playing|player|audio)\b")
+# Liking a song is not asking for the next one
+_NEXT_REQUEST = re.compile(r"\b(?:skip|next|change|another|different)\b")
+_OPEN_REQUEST = re.compile(
+    r"^(?:(?:can|could|would|will) you |please )*(?:take me to|go to|launch|bring up|pull up|show me|start|load|"
+    r"open|visit|navigate to) (?:the )?(?P<site>\w+)(?: (?:website|site|page|app))?(?: (?:please|for me|now))*$")
+# News about one topic ("the world of cricket", "going on with bitcoin") is not the headlines
+_NEWS_TOPIC = re.compile(r"\b(?:world|field|scene) of\b|"
+                         r"\b(?:going on|happening|new) (?:with|in|about|on) (?!(?:the )?(?:world|india)\b)")
+_QUEUE_REQUEST = re.compile(
+    r"^(?:(?:can|could|would|will) you |please )*(?:add|put|stick|throw) (?:(?:some|a|an|the) )*(?P<query>.+?) "
+    r"(?:to|in|on|into|onto) (?:the |my )?(?:queue|playlist|list|up next)")
+
+def _rewrite_play(command):
+    found = _PLAY_REQUEST.match(normalize(command))
+    return f"play {found['query']}" if found else None
+
+def _rewrite_stop_music(command):
+    return "stop music" if _MUSIC_OBJECT.search(normalize(command)) else None
+
+def _rewrite_next_track(command):
+    return "next song" if _NEXT_REQUEST.search(normalize(command)) else None
+
+def _rewrite_queue(command):
+    found = _QUEUE_REQUEST.match(normalize(command))
+    return f"queue {found['query']}" if found else None
+
+def _rewrite_news(news_command):
+    def rewrite(command):
+        return None if _NEWS_TOPIC.search(normalize(command)) else news_command
+    return rewrite
+
+def _rewrite_open_website(command):
+    found = _OPEN_REQUEST.match(normalize(command))
+    return f"open {found['site']}" if found and found['site'] in WEBSITES else None
+
+INTENTS = [
+    Intent("play", [
+        "put on some lofi", "put on some jazz music", "i want to listen to taylor swift",
+        "can you play something relaxing", "throw on some rock music", "start playing arctic monkeys",
+        "let me hear bohemian rhapsody", "i would like to hear some classical music", "blast some metal",
+        "listen to lofi beats", "could you put on coldplay", "spin some old school hip hop",
+        "turn on some background music", "i wanna hear the weeknd", "could you play some music for me",
+        "id like to listen to some jazz", "put on some relaxing songs", "i wanna listen to some hindi songs",
+        "play some music", "put on some chill music please", "i want to hear some music", "let me hear some jazz",
+    ], _rewrite_play, threshold=PLAY_THRESHOLD),
+    Intent("queue", [
+        "add despacito to the queue", "put shape of you in the queue", "add some jazz to my playlist",
+        "can you add this song to the queue", "stick imagine dragons on the list",
+        "add blinding lights to the queue", "add some lofi to the list", "add hotel california to my queue",
+    ], _rewrite_queue, threshold=QUEUE_THRESHOLD),
+    Intent("stop_music", [
+        "shut up the music", "turn off the music", "kill the music", "stop the song", "pause the music",
+        "stop playing", "silence the music", "turn the music off", "enough music", "cut the music",
+        "make the music stop", "stop the playback", "switch off the song", "no more music",
+        "can you stop the music", "stop the music now",
+    ], _rewrite_stop_music, threshold=REQUEST_THRESHOLD),
+    Intent("next_track", [
+        "skip this song", "skip to the next one", "next one please", "go to the next track",
+        "change the song", "i dont like this song skip it", "move on to the next song", "another song please",
+        "skip this track",
+    ], _rewrite_next_track),
+    Intent("news_india", [
+        "whats happening in india", "latest headlines from india", "tell me the indian headlines",
+        "what is going on in india today", "india top stories", "headlines in india", "updates from india",
+        "what are the top stories in india",
+    ], _rewrite_news("indian news")),
+    Intent("news_international", [
+        "whats happening in the world", "world headlines", "give me the global headlines",
+        "top stories around the world", "whats going on in the world today", "breaking headlines",
+        "catch me up on world events", "what are the latest world updates",
+    ], _rewrite_news("international news")),
+    Intent("open_website", [
+        "take me to google", "launch youtube", "go to facebook", "bring up linkedin", "pull up youtube",
+        "show me google", "start facebook", "load linkedin", "take me to facebook",
+    ], _rewrite_open_website, threshold=REQUEST_THRESHOLD),
+    Intent("chat", [
+        "what is the capital of france", "tell me a joke", "how far away is the moon", "who wrote romeo and juliet",
+        "what is the weather like today", "explain quantum computing", "what time is it in tokyo",
+        "how do i make pasta", "what is your name", "can you help me with my homework", "what is the meaning of life",
+        "recommend a good book", "what kind of music do you like", "who is the most famous singer in india",
+        "what is the population of india", "tell me about the history of the world", "who won the world cup",
+        "how does the stock market work", "what should i cook tonight", "write a poem about the sea",
+        "why is the sky blue", "what is the best song ever written", "how do you say hello in spanish",
+        "what happened in world war two", "who invented the internet", "what is the latest iphone",
+        "what is new in technology", "what happened on this day in history",
+        # Near misses of the actions above
+        "listen to me carefully", "i want to listen to you", "can you hear me", "turn off the lights",
+        "turn on the fan", "stop talking", "shut up", "what is happening in the world of sports",
+        "whats new in the world of fashion", "what is going on in football", "i love this song",
+        "what song is playing", "take me through the steps", "i want to hear a joke", "tell me a story",
+    ]),
+]
+ROUTER.set_classifier(IntentClassifier(INTENTS))
 
 def process_command(command):
     """
     Processes the given command (voice or text) and executes the corresponding action.
     Returns a status string or 'exit_program'.
     """
-    command = command.lower()
-    
-    player = get_vlc_player()
-
-    # --- Core Commands ---
-    if "marco stop" in command:
-        stop_vlc_player() # This function now handles its own speak()
-        return "exit_program" # Signal to main.py (via GUI) to exit
-
-    # --- Web Browser Commands ---
-    elif "open google" in command:
-        webbrowser.open("https://www.google.com")
-        speak("Opening Google.") # Marco still announces
-        return "Opened Google."
-    elif "open facebook" in command:
-        webbrowser.open("https://www.facebook.com")
-        speak("Opening Facebook.")
-        return "Opened Facebook."
-    elif "open youtube" in command:
-        webbrowser.open("https://www.youtube.com")
-        speak("Opening YouTube.")
-        return "Opened YouTube."
-    elif "open linkedin" in command:
-        webbrowser.open("https://www.linkedin.com")
-        speak("Opening LinkedIn.")
-        return "Opened LinkedIn."
-
-    # --- Music Playback Commands ---
-    elif command.startswith("play"):
-        song_query = command.replace("play", "").strip()
-        play_youtube_audio(song_query) # This function handles its own speak()
-        return "Searching for and playing music."
-    elif "stop music" in command or "stop song" in command:
-        stop_vlc_player() # This function handles its own speak()
-        return "Music control command processed."
-
-    # --- News Commands ---
-    elif "news" in command:
-        if "indian news" in command or "india news" in command:
-            get_news(country='in') # This function handles its own speak()
-            return "Fetching Indian news."
-        elif "international news" in command or "global news" in command:
-            get_news(topic='breaking') # This function handles its own speak()
-            return "Fetching international news."
-        else:
-            speak("Specify desired news. Options are: 'Indian news' or 'International news'.")
-            return "Clarification needed for news."
-
-    # --- Program Exit Commands ---
-    elif "exit" in command or "quit" in command or "goodbye" in command:
-        stop_vlc_player() # Ensure music stops before exit (this calls speak internally)
-        return "exit_program" # Signal to main.py (via GUI) to exit
-
-    # --- Fallback to LLM for unhandled commands ---
-    else:
-        # LLM interaction module handles its own speaking
-        get_gemini_response(command)
-        return "LLM processed your request." # Generic status for LLM interaction
\ No newline at end of file
+    return ROUTER.dispatch(command.lower())
+
+def classify_command(command):
+    """Returns the (group, policy, preempt) scheduling hints of the route a command goes to."""
+    route = ROUTER.match(command.lower()).route
+    return route.group, route.policy, route.preempt
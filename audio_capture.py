@@ -0,0 +1,291 @@
+# audio_capture.py
+import threading
+import queue
+import time
+import math
+import wave
+from array import array
+from collections import deque
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2 # 16-bit mono PCM, the format sr.Microphone records in
+FRAME_MS = 30 # Audio is analysed in frames of this length
+
+RING_BUFFER_SECONDS = 5 # Most recent audio kept in memory regardless of voice activity
+PRE_ROLL_MS = 300 # Audio kept before the detected start of speech so the first syllable is not clipped
+SPEECH_START_MS = 90 # Consecutive loud audio needed to start an utterance
+HANGOVER_MS = 700 # Trailing silence that ends an utterance
+MAX_UTTERANCE_SECONDS = 8 # Longer phrases are cut off, like phrase_time_limit
+MIN_UTTERANCE_MS = 250 # Shorter blips (clicks, coughs) are discarded
+UTTERANCE_QUEUE_SIZE = 4 # Unconsumed utterances kept; older ones are dropped (e.g. heard while Marco spoke)
+
+SPEECH_RATIO = 3.0 # Frame is speech when its energy exceeds the noise floor by this factor
+MIN_ENERGY_THRESHOLD = 150 # Absolute floor for the speech threshold (RMS of 16-bit samples)
+NOISE_ADAPT_RATE = 0.05 # How quickly the noise floor follows the background level
+
+def frame_rms(frame):
+    """Returns the RMS energy of a frame of 16-bit little-endian mono PCM."""
+    samples = array('h', frame)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class Utterance:
+    """A segment of speech emitted by AudioCapture."""
+
+    def __init__(self, frame_data, sample_rate, sample_width, started_at):
+        self.frame_data = frame_data
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.started_at = started_at # Position in the stream, in seconds
+
+    @property
+    def duration(self):
+        return len(self.frame_data) / float(self.sample_rate * self.sample_width)
+
+    def to_audio_data(self):
+        """Converts the utterance to speech_recognition.AudioData for the recognizers."""
+        import speech_recognition as sr
+        return sr.AudioData(self.frame_data, self.sample_rate, self.sample_width)
+
+
+# --- Audio sources ---
+# A source provides open(), read(frames) -> bytes and close(). read() returns b"" when the source is exhausted.
+
+class MicrophoneSource:
+    """Keeps a single microphone input stream open for the lifetime of the capture."""
+
+    def __init__(self, device_index=None, sample_rate=SAMPLE_RATE):
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.sample_width = SAMPLE_WIDTH
+        self._microphone = None
+
+    def open(self):
+        import speech_recognition as sr
+        self._microphone = sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate)
+        self._microphone.__enter__()
+        self.sample_width = self._microphone.SAMPLE_WIDTH
+
+    def read(self, frames):
+        return self._microphone.stream.read(frames)
+
+    def close(self):
+        if self._microphone:
+            self._microphone.__exit__(None, None, None)
+            self._microphone = None
+
+
+class WavFileSource:
+    """Reads 16-bit mono audio from a WAV file. With realtime=True, reads are paced like a live device."""
+
+    def __init__(self, path, realtime=False):
+        self.path = path
+        self.realtime = realtime
+        self._wav = None
+        self.sample_rate = SAMPLE_RATE
+        self.sample_width = SAMPLE_WIDTH
+
+    def open(self):
+        self._wav = wave.open(self.path, 'rb')
+        if self._wav.getnchannels() != 1 or self._wav.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f"{self.path}: expected 16-bit mono audio")
+        self.sample_rate = self._wav.getframerate()
+
+    def read(self, frames):
+        data = self._wav.readframes(frames)
+        if self.realtime and data:
+            time.sleep(frames / float(self.sample_rate))
+        return data
+
+    def close(self):
+        if self._wav:
+            self._wav.close()
+            self._wav = None
+
+
+class SyntheticSource:
+    """
+    Generates audio from a list of (seconds, amplitude) segments: amplitude 0 is silence,
+    anything else a 220 Hz tone standing in for speech. Useful for exercising the capture without a microphone.
+    """
+
+    def __init__(self, segments, sample_rate=SAMPLE_RATE, noise=0, realtime=False):
+        self.segments = segments
+        self.sample_rate = sample_rate
+        self.sample_width = SAMPLE_WIDTH
+        self.noise = noise
+        self.realtime = realtime
+        self._samples = None
+        self._position = 0
+
+    def open(self):
+        import random
+        rng = random.Random(0)
+        samples = array('h')
+        for seconds, amplitude in self.segments:
+            for i in range(int(seconds * self.sample_rate)):
+                value = amplitude * math.sin(2 * math.pi * 220 * i / self.sample_rate)
+                if self.noise:
+                    value += rng.uniform(-self.noise, self.noise)
+                samples.append(max(-32768, min(32767, int(value))))
+        self._samples = samples
+        self._position = 0
+
+    def read(self, frames):
+        chunk = self._samples[self._position:self._position + frames]
+        self._position += len(chunk)
+        if self.realtime and chunk:
+            time.sleep(len(chunk) / float(self.sample_rate))
+        return chunk.tobytes()
+
+    def close(self):
+        self._samples = None
+
+
+class AudioCapture:
+    """
+    Reads a source continuously on a background thread into a ring buffer, tracks the background
+    noise floor, and segments speech into Utterances using energy-based voice activity detection.
+    """
+
+    def __init__(self, source=None, on_utterance=None):
+        self.source = source or MicrophoneSource()
+        self.on_utterance = on_utterance
+        self.utterances = queue.Queue(maxsize=UTTERANCE_QUEUE_SIZE)
+        self.dropped = 0 # Utterances discarded because nobody consumed them in time
+        self.noise_floor = None
+        self.finished = threading.Event() # Set when the source is exhausted or the capture stopped
+        self._running = False
+        self._thread = None
+        self._ring = deque()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Opens the source and starts the capture thread."""
+        if self._running:
+            return self
+        self.source.open()
+        self._frame_samples = int(self.source.sample_rate * FRAME_MS / 1000)
+        self._ring = deque(maxlen=int(RING_BUFFER_SECONDS * 1000 / FRAME_MS))
+        self.finished.clear()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="AudioCapture", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Stops capturing and closes the source."""
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def threshold(self):
+        floor = self.noise_floor or 0.0
+        return max(MIN_ENERGY_THRESHOLD, floor * SPEECH_RATIO)
+
+    def next_utterance(self, timeout=None):
+        """Returns the next detected Utterance, or None if none arrives within timeout."""
+        try:
+            return self.utterances.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        """Discards utterances that have been detected but not consumed yet."""
+        while True:
+            try:
+                self.utterances.get_nowait()
+            except queue.Empty:
+                return
+
+    def recent_audio(self, seconds):
+        """Returns the last seconds of raw audio from the ring buffer."""
+        frames = int(seconds * 1000 / FRAME_MS)
+        with self._lock:
+            return b"".join(list(self._ring)[-frames:])
+
+    def _emit(self, frames, started_at):
+        if len(frames) * FRAME_MS < MIN_UTTERANCE_MS:
+            return
+        utterance = Utterance(b"".join(frames), self.source.sample_rate, self.source.sample_width, started_at)
+        while True:
+            try:
+                self.utterances.put_nowait(utterance)
+                break
+            except queue.Full:
+                # Stale speech is worth less than what was just said, so the oldest one goes
+                try:
+                    self.utterances.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+        if self.on_utterance:
+            try:
+                self.on_utterance(utterance)
+            except Exception as e:
+                print(f"Utterance callback error: {e}")
+
+    def _run(self):
+        pre_roll_frames = PRE_ROLL_MS // FRAME_MS
+        start_frames = max(1, SPEECH_START_MS // FRAME_MS)
+        hangover_frames = HANGOVER_MS // FRAME_MS
+        max_frames = int(MAX_UTTERANCE_SECONDS * 1000 / FRAME_MS)
+        frame_bytes = self._frame_samples * self.source.sample_width
+
+        loud_run = 0
+        silent_run = 0
+        speech = None # Frames of the utterance in progress
+        started_at = 0.0
+        position = 0 # Frames read so far
+
+        try:
+            while self._running:
+                frame = self.source.read(self._frame_samples)
+                if not frame:
+                    break
+                if len(frame) < frame_bytes:
+                    frame += b"\x00" * (frame_bytes - len(frame))
+                position += 1
+                with self._lock:
+                    self._ring.append(frame)
+
+                energy = frame_rms(frame)
+                is_speech = energy > self.threshold
+
+                if speech is None:
+                    if is_speech:
+                        loud_run += 1
+                        if loud_run >= start_frames:
+                            with self._lock:
+                                speech = list(self._ring)[-(pre_roll_frames + loud_run):]
+                            started_at = (position - len(speech)) * FRAME_MS / 1000.0
+                            silent_run = 0
+                    else:
+                        loud_run = 0
+                        # Only background audio updates the noise floor
+                        if self.noise_floor is None:
+                            self.noise_floor = energy
+                        else:
+                            self.noise_floor += NOISE_ADAPT_RATE * (energy - self.noise_floor)
+                else:
+                    speech.append(frame)
+                    silent_run = 0 if is_speech else silent_run + 1
+                    if silent_run >= hangover_frames or len(speech) >= max_frames:
+                        self._emit(speech, started_at)
+                        speech = None
+                        loud_run = 0
+        except Exception as e:
+            print(f"Audio capture error: {e}")
+        finally:
+            if speech:
+                self._emit(speech, started_at)
+            self._running = False
+            self.source.close()
+            self.finished.set()
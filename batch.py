@@ -0,0 +1,187 @@
+# batch.py
+"""
+Runs a script of commands without the window, printing one JSON line per command in script order.
+
+    python main.py --batch morning.txt
+    echo "international news" | python main.py --batch - --speak
+
+Commands are pipelined: they are all submitted to the scheduler up front, so their network calls
+(news, YouTube, Gemini) run in parallel, while results are printed in order as soon as each one and
+all before it are done. Each command gets its own conversation store, so LLM questions run in parallel
+too instead of queueing behind each other; their turns are added to the saved conversation in script
+order. Commands that preempt (stop, exit) wait for everything before them and finish before anything
+after them starts, so a script behaves as if typed one line at a time.
+"""
+import sys
+import json
+import time
+import threading
+import contextlib
+import contextvars
+
+from command_scheduler import CommandScheduler, CANCELLED
+from assistant_actions import process_command, classify_command
+from conversation import ConversationStore, get_store, set_current_store, reset_current_store
+from tts_stt import speak, start_speech_worker, set_speech_sink, reset_speech_sink
+import tracing
+
+BATCH_WORKERS = 8 # Commands of a batch that run at the same time
+BATCH_CONVERSATION = "batch"
+# Groups whose commands only fetch and speak, so in a batch they run fully in parallel
+PARALLEL_GROUPS = ("news",)
+SPEECH_DRAIN_TIMEOUT = 120 # Seconds to wait for spoken results to finish at the end (with speak_results)
+
+# Bound while a command is submitted; the job's copy of the context tells _on_result which item it is
+_batch_item = contextvars.ContextVar("batch_item", default=None)
+
+
+def read_commands(source):
+    """Reads commands from a file path, or stdin for "-". Blank lines and lines starting with # are skipped."""
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+def classify_batch_command(command):
+    """
+    Scheduling hints for batch commands. Every line of a script is meant to run, so nothing is
+    superseded: groups with side effects (music) run in script order instead, and PARALLEL_GROUPS
+    run in parallel. Each command has its own conversation store, so the LLM group no longer has
+    to run serially either. Preemption is kept.
+    """
+    group, policy, preempt = classify_command(command)
+    if group in PARALLEL_GROUPS or policy == "serial":
+        policy = None
+    elif policy == "supersede":
+        policy = "serial"
+    return group, policy, preempt
+
+
+class BatchItem:
+    def __init__(self, index, command, store):
+        self.index = index
+        self.command = command
+        self.store = store
+        self.speech = []
+        self.job = None
+        self.submitted = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_json(self):
+        job = self.job
+        return {
+            "index": self.index,
+            "command": self.command,
+            "result": None if job.cancelled else job.result,
+            "speech": list(self.speech),
+            "cancelled": job.cancelled or job.result == CANCELLED,
+            "error": None if job.error is None else str(job.error),
+            "elapsed_ms": round((self.finished - self.submitted) * 1000, 3),
+        }
+
+
+class BatchRunner:
+    def __init__(self, out=None, speak_results=False, workers=BATCH_WORKERS):
+        self.out = out or sys.stdout
+        self.speak_results = speak_results
+        self.scheduler = CommandScheduler(process_command, self._on_result, classify=classify_batch_command,
+                                          max_workers=workers)
+        self._emitted = 0
+        self.exited = False
+
+    def run(self, commands):
+        """Runs the commands and writes their results. Returns the list of result dicts."""
+        shared = get_store()
+        persona = [msg for msg in shared.history if msg["role"] == "system"]
+        items = []
+        results = []
+        try:
+            for index, command in enumerate(commands):
+                _, _, preempt = classify_batch_command(command)
+                if preempt:
+                    results.extend(self._emit_until(items, len(items)))
+                    if self.exited:
+                        break
+                item = BatchItem(index, command, ConversationStore(list(persona)))
+                items.append(item)
+                self._submit(item)
+                if preempt:
+                    results.extend(self._emit_until(items, len(items)))
+                if self.exited:
+                    break
+            results.extend(self._emit_until(items, len(items)))
+        finally:
+            self.scheduler.shutdown()
+        return results
+
+    def _submit(self, item):
+        item_handle = _batch_item.set(item)
+        store_handle = set_current_store(item.store)
+        sink_handle = set_speech_sink(item.speech.append)
+        try:
+            with tracing.trace(source="batch"):
+                # The job copies this context, so its handlers see the command's own store and speech sink
+                item.submitted = time.perf_counter()
+                item.job = self.scheduler.submit(item.command, conversation=BATCH_CONVERSATION)
+        finally:
+            reset_speech_sink(sink_handle)
+            reset_current_store(store_handle)
+            _batch_item.reset(item_handle)
+
+    def _on_result(self, job):
+        # Called on a scheduler thread
+        item = job.context.get(_batch_item)
+        if item is not None:
+            item.finished = time.perf_counter()
+            item.done.set()
+
+    def _emit_until(self, items, end):
+        """Writes the results of items[emitted:end] in order, waiting for each one."""
+        emitted = []
+        while self._emitted < end:
+            item = items[self._emitted]
+            item.done.wait()
+            self._emitted += 1
+            result = item.to_json()
+            self.out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.out.flush()
+            emitted.append(result)
+
+            # Keep the saved conversation in script order
+            shared = get_store()
+            for msg in item.store.history:
+                if msg["role"] != "system":
+                    shared.append(msg["role"], msg["content"])
+            if self.speak_results:
+                for text in item.speech:
+                    speak(text)
+            if item.job.result == "exit_program":
+                self.exited = True
+                break
+        return emitted
+
+
+def run_batch(source, speak_results=False, workers=BATCH_WORKERS):
+    """
+    Runs the commands read from source (a path or "-") and prints their results as JSON lines on stdout.
+    Diagnostics printed by the subsystems go to stderr so stdout stays machine readable.
+    Returns the process exit code: 1 if any command failed.
+    """
+    commands = read_commands(source)
+    out = sys.stdout
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        results = BatchRunner(out, speak_results, workers).run(commands)
+        wall = time.perf_counter() - start
+        busy = sum(result["elapsed_ms"] for result in results) / 1000
+        print(f"Batch: {len(results)} of {len(commands)} commands in {wall:.2f}s "
+              f"(commands took {busy:.2f}s in total)")
+        if speak_results:
+            worker = start_speech_worker()
+            deadline = time.monotonic() + SPEECH_DRAIN_TIMEOUT
+            while worker.is_busy() and time.monotonic() < deadline:
+                time.sleep(0.05)
+    return 1 if any(result["error"] for result in results) else 0
@@ -0,0 +1,351 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmarks of the assistant with every external service replaced by the fakes in
+benchmarks/fakes.py, so results are repeatable and need no microphone, network or audio device.
+
+Scenarios:
+    process_command  commands run one after another through assistant_actions.process_command
+    scheduler        a burst of commands through the CommandScheduler, as the GUI submits them
+    voice            synthetic audio -> AudioCapture -> speech recognition -> wake word -> scheduler
+
+    python -m benchmarks.bench_pipeline --output results.json
+    python -m benchmarks.bench_pipeline --baseline baseline.json         # exits 1 on a regression
+    python -m benchmarks.bench_pipeline --fail llm=0.2 --latency-scale 0.5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+
+from benchmarks import fakes as fake_services
+
+COMMANDS = [
+    "open google",
+    "play lofi hip hop radio",
+    "queue chill jazz",
+    "next song",
+    "stop music",
+    "indian news",
+    "international news",
+    "what is the capital of australia",
+    "tell me a joke about programmers",
+    "news",
+]
+
+VOICE_TRANSCRIPTS = [
+    "marco what time is it in tokyo",
+    "marco play relaxing piano",
+    "marco stop music",
+    "marco international news",
+    "marco tell me something interesting",
+]
+
+REGRESSION_TOLERANCE = 0.10 # Relative change tolerated before a metric counts as a regression
+SPEECH_DRAIN_TIMEOUT = 30 # Seconds to wait for queued speech at the end of a scenario
+
+
+def latency_stats(seconds):
+    """Latency distribution in milliseconds."""
+    if not seconds:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    values = sorted(seconds)
+    last = len(values) - 1
+    stats = {f"p{p}": values[min(last, int(round(p / 100.0 * last)))] * 1000 for p in (50, 95, 99)}
+    stats["mean"] = sum(values) / len(values) * 1000
+    stats["max"] = values[-1] * 1000
+    return {name: round(value, 3) for name, value in stats.items()}
+
+
+class Harness:
+    """Installs the fakes and resets the application's shared state between scenarios."""
+
+    def __init__(self, fakes):
+        self.fakes = fakes
+        self.temp_dir = tempfile.mkdtemp(prefix="marco-bench-")
+
+        import tracing
+        tracing.TRACING_ENABLED = False # Keep the per-stage metrics, skip writing ~/.marco/traces.jsonl
+
+    def reset(self):
+        import config
+        import conversation
+        import news_api
+        import media_player
+        import stream_resolver
+        import response_cache
+        import history_db
+        import resilience
+        from tts_stt import set_recognition_chain
+        from stt_backends import RecognitionChain, GoogleBackend
+        import tracing
+
+        if media_player._play_queue is not None:
+            media_player._play_queue.shutdown()
+            media_player._play_queue = None
+        player = config.get_vlc_player()
+        if player is not None:
+            player.stop()
+        stream_resolver._resolver = stream_resolver.StreamResolver(
+            cache_path=os.path.join(self.temp_dir, "stream_cache.json"))
+        news_api._client = None
+        response_cache._cache = response_cache.ResponseCache(path=None) # In memory, starting empty
+        # Phrases stay cached across scenarios, like they would over a session
+        config.CONVERSATION_HISTORY = []
+        conversation._store = None
+        if history_db._db is not None:
+            history_db._db.close()
+        history_db._db = history_db.HistoryDB(":memory:") # Don't touch the user's saved history
+        set_recognition_chain(RecognitionChain([GoogleBackend()]))
+        resilience._dependencies.clear() # Fresh circuit breakers
+        tracing.METRICS.reset()
+        self.fakes.reset_stats()
+        self.fakes.transcripts.clear()
+
+    def drain_speech(self):
+        from tts_stt import start_speech_worker
+        worker = start_speech_worker()
+        deadline = time.monotonic() + SPEECH_DRAIN_TIMEOUT
+        while worker.is_busy() and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def run(self, name, scenario, **kwargs):
+        """Runs a scenario and returns its throughput, latency distribution, peak memory and stage latencies."""
+        import tracing
+        self.reset()
+        tracemalloc.start()
+        start = time.perf_counter()
+        latencies, errors = scenario(self, **kwargs)
+        wall = time.perf_counter() - start
+        self.drain_speech()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stages = {stage: {"count": stats["count"],
+                          **{p: None if stats[p] is None else round(stats[p] * 1000, 3) for p in ("p50", "p95", "p99")}}
+                  for stage, stats in tracing.METRICS.summary().items()}
+        return {
+            "count": len(latencies),
+            "errors": errors,
+            "wall_s": round(wall, 4),
+            "throughput_per_s": round(len(latencies) / wall, 3) if wall else None,
+            "latency_ms": latency_stats(latencies),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "stages_ms": stages,
+            "services": self.fakes.stats(),
+        }
+
+
+# --- Scenarios ---
+# Each returns (per-command latencies in seconds, number of commands that failed)
+
+def scenario_process_command(harness, iterations):
+    from assistant_actions import process_command
+    latencies, errors = [], 0
+    for i in range(iterations):
+        command = COMMANDS[i % len(COMMANDS)]
+        start = time.perf_counter()
+        try:
+            process_command(command)
+        except Exception as e:
+            errors += 1
+            print(f"process_command({command!r}) failed: {e}")
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+def scenario_scheduler(harness, iterations):
+    from assistant_actions import process_command, classify_command
+    from command_scheduler import CommandScheduler
+    import tracing
+
+    submitted = {}
+    latencies = []
+    errors = [0]
+    done = threading.Event()
+
+    def on_result(job):
+        latencies.append(time.perf_counter() - submitted[job.seq])
+        errors[0] += job.error is not None
+        if len(latencies) == iterations:
+            done.set()
+
+    scheduler = CommandScheduler(process_command, on_result, classify=classify_command)
+    for i in range(iterations):
+        with tracing.trace(source="benchmark"):
+            start = time.perf_counter()
+            job = scheduler.submit(COMMANDS[i % len(COMMANDS)])
+            submitted[job.seq] = start
+    done.wait(timeout=max(60, iterations * 5))
+    scheduler.shutdown()
+    return latencies, errors[0]
+
+def scenario_voice(harness, iterations):
+    from assistant_actions import process_command, classify_command
+    from command_scheduler import CommandScheduler
+    from audio_capture import AudioCapture, SyntheticSource
+    from tts_stt import recognize_speech
+    from wake_word import split_wake_word
+    import tracing
+
+    transcripts = [VOICE_TRANSCRIPTS[i % len(VOICE_TRANSCRIPTS)] for i in range(iterations)]
+    harness.fakes.script_transcripts(transcripts)
+    # One second of speech-level tone per command, separated by silence
+    segments = [(1.0, 0)]
+    for _ in transcripts:
+        segments += [(1.0, 6000), (1.0, 0)]
+    capture = AudioCapture(SyntheticSource(segments, noise=50)).start()
+
+    heard_at = {}
+    latencies = []
+    errors = [0]
+    all_done = threading.Event()
+    expected = [iterations]
+
+    def on_result(job):
+        latencies.append(time.perf_counter() - heard_at[job.seq])
+        errors[0] += job.error is not None
+        if len(latencies) >= expected[0]:
+            all_done.set()
+
+    scheduler = CommandScheduler(process_command, on_result, classify=classify_command)
+    for _ in transcripts:
+        utterance = capture.next_utterance(timeout=10)
+        if utterance is None:
+            print("Voice benchmark: capture produced fewer utterances than expected.")
+            break
+        with tracing.trace(source="benchmark-voice"):
+            start = time.perf_counter()
+            heard, command = split_wake_word(recognize_speech(utterance.to_audio_data()))
+            if not (heard and command):
+                errors[0] += 1
+                expected[0] -= 1
+                continue
+            job = scheduler.submit(command)
+            heard_at[job.seq] = start
+    capture.stop()
+    if len(latencies) < expected[0]:
+        all_done.wait(timeout=max(60, iterations * 5))
+    scheduler.shutdown()
+    return latencies, errors[0]
+
+SCENARIOS = {
+    "process_command": scenario_process_command,
+    "scheduler": scenario_scheduler,
+    "voice": scenario_voice,
+}
+
+
+# --- Baseline comparison ---
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares results with a baseline produced by an earlier run.
+    Returns a list of (scenario, metric, baseline value, current value, relative change, regressed).
+    """
+    rows = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        metrics = [("throughput_per_s", current["throughput_per_s"], previous["throughput_per_s"], False),
+                   ("peak_memory_kb", current["peak_memory_kb"], previous["peak_memory_kb"], True)]
+        metrics += [(f"latency_{p}_ms", current["latency_ms"][p], previous["latency_ms"][p], True)
+                    for p in ("p50", "p95", "p99")]
+        for metric, value, old, lower_is_better in metrics:
+            if value is None or not old:
+                continue
+            change = (value - old) / old
+            regressed = change > tolerance if lower_is_better else change < -tolerance
+            rows.append((name, metric, old, value, change, regressed))
+    return rows
+
+def print_results(results):
+    for name, stats in results["scenarios"].items():
+        latency = stats["latency_ms"]
+        print(f"{name}: {stats['count']} commands, {stats['errors']} errors, "
+              f"{stats['throughput_per_s']} commands/s, peak memory {stats['peak_memory_kb']} KB")
+        print(f"    latency ms  mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+              f"p99 {latency['p99']}  max {latency['max']}")
+
+def print_comparison(rows):
+    for name, metric, old, value, change, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{name:<16}{metric:<20}{old:>12.3f}{value:>12.3f}{change:>+9.1%}  {flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks of Marco with faked services")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--iterations", type=int, default=30, help="commands per scenario")
+    parser.add_argument("--latency-scale", type=float, default=0.1,
+                        help="multiplier for the fake services' default latencies (1.0 = realistic)")
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICE=SECONDS",
+                        help=f"override a service latency before scaling ({', '.join(fake_services.DEFAULT_LATENCIES)})")
+    parser.add_argument("--fail", action="append", default=[], metavar="SERVICE=RATE",
+                        help="fraction of calls to a service that fail, e.g. llm=0.1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with the results JSON of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="relative change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    def parse_pairs(pairs):
+        parsed = {}
+        for pair in pairs:
+            name, _, value = pair.partition("=")
+            if name not in fake_services.DEFAULT_LATENCIES:
+                parser.error(f"unknown service '{name}'")
+            parsed[name] = float(value)
+        return parsed
+
+    settings = {
+        "iterations": args.iterations,
+        "latency_scale": args.latency_scale,
+        "latencies": parse_pairs(args.latency),
+        "failure_rates": parse_pairs(args.fail),
+        "seed": args.seed,
+    }
+    fakes = fake_services.install(latency_scale=args.latency_scale, latencies=settings["latencies"],
+                                  failure_rates=settings["failure_rates"], seed=args.seed)
+    harness = Harness(fakes)
+
+    results = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        print(f"Running {name}...")
+        results["scenarios"][name] = harness.run(name, SCENARIOS[name], iterations=args.iterations)
+
+    from tts_stt import stop_speech_worker
+    stop_speech_worker()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print("Warning: the baseline was recorded with different settings, the comparison may be meaningless.")
+        rows = compare(results, baseline, args.tolerance)
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
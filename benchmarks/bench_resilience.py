@@ -0,0 +1,132 @@
+# benchmarks/bench_resilience.py
+"""
+Fault injection for the resilience layer (resilience.py), using the fakes in benchmarks/fakes.py.
+For each network dependency it checks that:
+
+    outage    once the breaker opens, commands fail fast with a spoken fallback
+    stall     a hung service is abandoned at the deadline instead of blocking the command
+    recovery  after the recovery timeout a trial call closes the breaker again
+
+Deadlines and recovery timeouts are shortened so the whole run takes a few seconds.
+
+    python -m benchmarks.bench_resilience
+    python -m benchmarks.bench_resilience --dependency gemini --output resilience.json
+"""
+import sys
+import json
+import time
+import argparse
+
+from benchmarks import fakes as fake_services
+from benchmarks.bench_pipeline import Harness, latency_stats
+
+# dependency -> (fake service that fails, command that uses it, another one not cached by then)
+TARGETS = {
+    "gemini": ("llm", "what is the capital of australia", "how far away is the moon"),
+    "gnews": ("news", "international news", "indian news"),
+    "youtube": ("youtube_search", "play lofi hip hop radio", "play relaxing piano"),
+}
+FAIL_FAST_MS = 50 # An open breaker must answer within this
+DEADLINE_SLACK = 0.3 # Seconds a stalled command may take beyond its deadline (retry backoff, speech)
+
+
+def run_command(command):
+    """Runs a command through process_command, returning (seconds, what it said)."""
+    from assistant_actions import process_command
+    from tts_stt import set_speech_sink, reset_speech_sink
+    speech = []
+    handle = set_speech_sink(speech.append)
+    try:
+        start = time.perf_counter()
+        process_command(command)
+        return time.perf_counter() - start, speech
+    finally:
+        reset_speech_sink(handle)
+
+def check_dependency(harness, name, deadline, recovery):
+    import resilience
+    service, command, uncached_command = TARGETS[name]
+    settings = resilience.DEPENDENCY_SETTINGS[name]
+    checks = {}
+    results = {}
+
+    # Outage: the first failures are paid in full, then the breaker opens and commands fail fast
+    harness.reset()
+    harness.fakes.outage(service)
+    latencies = []
+    for _ in range(settings["failure_threshold"] + 3):
+        seconds, speech = run_command(command)
+        latencies.append(seconds)
+    state = resilience.get_dependency(name).stats()
+    checks["outage_breaker_open"] = state["state"] == resilience.OPEN
+    checks["outage_fails_fast"] = latencies[-1] * 1000 <= FAIL_FAST_MS
+    checks["outage_spoken_fallback"] = bool(speech)
+    results["outage"] = {"latency_ms": latency_stats(latencies), "last_ms": round(latencies[-1] * 1000, 3),
+                         "last_speech": speech, "breaker": state}
+
+    # Recovery: service back, the trial call after the recovery timeout closes the breaker
+    harness.fakes.outage(service, down=False)
+    time.sleep(recovery)
+    seconds, speech = run_command(command)
+    state = resilience.get_dependency(name).stats()
+    checks["recovery_breaker_closed"] = state["state"] == resilience.CLOSED
+    results["recovery"] = {"ms": round(seconds * 1000, 3), "speech": speech, "breaker": state}
+
+    # Stall: every call hangs past the deadline, commands still return around the deadline
+    harness.reset()
+    harness.fakes.stall(service, deadline * 3)
+    latencies = []
+    for _ in range(2):
+        seconds, speech = run_command(uncached_command) # The stream cache outlives harness.reset()
+        latencies.append(seconds)
+    harness.fakes.stall(service, 0)
+    checks["stall_bounded_by_deadline"] = max(latencies) <= deadline + DEADLINE_SLACK
+    results["stall"] = {"latency_ms": latency_stats(latencies), "last_speech": speech,
+                        "breaker": resilience.get_dependency(name).stats()}
+
+    results["checks"] = checks
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fault injection for Marco's circuit breakers and deadlines")
+    parser.add_argument("--dependency", choices=sorted(TARGETS), action="append",
+                        help="dependency to check (default: all)")
+    parser.add_argument("--deadline", type=float, default=0.5, help="deadline per call, in seconds")
+    parser.add_argument("--recovery", type=float, default=0.5, help="breaker recovery timeout, in seconds")
+    parser.add_argument("--latency-scale", type=float, default=0.05)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    fakes = fake_services.install(latency_scale=args.latency_scale)
+    import resilience
+    import llm_interaction
+    for settings in resilience.DEPENDENCY_SETTINGS.values():
+        settings.update(deadline=args.deadline, recovery_timeout=args.recovery,
+                        base_delay=min(settings["base_delay"], args.deadline / 10))
+    llm_interaction.STREAM_CHUNK_TIMEOUT = args.deadline
+    harness = Harness(fakes)
+
+    report = {}
+    failed = []
+    for name in args.dependency or sorted(TARGETS):
+        print(f"Checking {name}...", file=sys.stderr)
+        report[name] = check_dependency(harness, name, args.deadline, args.recovery)
+        failed += [f"{name}: {check}" for check, ok in report[name]["checks"].items() if not ok]
+    harness.drain_speech()
+
+    for name, results in report.items():
+        outage, stall = results["outage"], results["stall"]
+        print(f"{name:<8} outage: breaker {outage['breaker']['state']}, fails fast in {outage['last_ms']} ms "
+              f"({outage['breaker']['rejected']} rejected)  stall: max {stall['latency_ms']['max']} ms  "
+              f"recovery: breaker {results['recovery']['breaker']['state']}")
+    for failure in failed:
+        print(f"FAILED {failure}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "dependencies": report}, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
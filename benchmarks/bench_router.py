@@ -0,0 +1,80 @@
+# benchmarks/bench_router.py
+"""
+Compares command routing throughput of the compiled CommandRouter with the original
+linear if/elif chain from process_command. Only routing is measured, no handler runs.
+The intent classifier that ROUTER.match consults for commands no trigger matches is timed
+separately: "compiled" runs with it switched off, "classifier" is its cost per command it sees,
+and "compiled+classifier" is ROUTER.match as the assistant runs it.
+
+    python -m benchmarks.bench_router
+    python -m benchmarks.bench_router --number 5000
+"""
+import sys
+import timeit
+import argparse
+
+from benchmarks import fakes as fake_services
+
+COMMANDS = [
+    "open google",
+    "play lofi hip hop radio beats to relax and study to",
+    "stop music",
+    "indian news",
+    "what is the capital of australia and how many people live there",
+    "tell me a joke about programmers",
+    "marco stop",
+    "goodbye",
+]
+
+def legacy_route(command):
+    """The routing decisions of the original if/elif chain in process_command."""
+    command = command.lower()
+    if "marco stop" in command:
+        return "marco_stop"
+    elif "open google" in command or "open facebook" in command or "open youtube" in command or "open linkedin" in command:
+        return "open_website"
+    elif command.startswith("play"):
+        return "play"
+    elif "stop music" in command or "stop song" in command:
+        return "stop_music"
+    elif "news" in command:
+        return "news"
+    elif "exit" in command or "quit" in command or "goodbye" in command:
+        return "exit"
+    else:
+        return "llm"
+
+def _time(func, commands, number):
+    seconds = timeit.timeit(lambda: [func(c) for c in commands], number=number)
+    routed = number * len(commands)
+    return {"commands_per_second": routed / seconds, "us_per_command": seconds / routed * 1e6}
+
+def run(number=20000):
+    """Times each router over COMMANDS. Needs config, so install the fakes first (see main)."""
+    from assistant_actions import ROUTER
+    classifier = ROUTER.classifier
+    classifier.ensure_fitted()
+    # The commands the classifier is consulted for: those no trigger matches
+    unmatched = [c for c in COMMANDS if ROUTER._match_triggers(c.lower()) is None]
+
+    results = {"legacy": _time(legacy_route, COMMANDS, number)}
+    ROUTER.set_classifier(None)
+    try:
+        results["compiled"] = _time(lambda c: ROUTER.match(c.lower()).route.name, COMMANDS, number)
+    finally:
+        ROUTER.set_classifier(classifier)
+    results["classifier"] = _time(lambda c: classifier.classify(c.lower()), unmatched, number)
+    results["compiled+classifier"] = _time(lambda c: ROUTER.match(c.lower()).route.name, COMMANDS, number)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Routing throughput of the command router")
+    parser.add_argument("--number", type=int, default=20000, help="passes over the command list")
+    args = parser.parse_args(argv)
+    fake_services.install(latency_scale=0) # assistant_actions imports config, the fakes stand in for it
+    for name, stats in run(args.number).items():
+        print(f"{name:>19}: {stats['commands_per_second']:>12,.0f} commands/s  {stats['us_per_command']:.2f} us/command")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
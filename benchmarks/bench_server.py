@@ -0,0 +1,184 @@
+# benchmarks/bench_server.py
+"""
+Load test of the headless server: many concurrent sessions, each sending commands one after another
+over HTTP (keep-alive) or a WebSocket, with every external service faked (see benchmarks/fakes.py).
+
+    python -m benchmarks.bench_server --sessions 200 --commands 5
+    python -m benchmarks.bench_server --protocol ws --audio --output server.json
+"""
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tracemalloc
+
+from benchmarks import fakes as fake_services
+from benchmarks.bench_pipeline import latency_stats
+
+COMMANDS = [
+    "what is the capital of australia",
+    "open youtube",
+    "international news",
+    "tell me a joke about programmers",
+    "how far away is the moon",
+]
+
+
+class HTTPClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def request(self, method, path, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.writer.write((f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                           f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        body = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(body) if body else None
+
+    def close(self):
+        self.writer.close()
+
+
+async def http_session(host, port, commands, audio, latencies, errors):
+    client = await HTTPClient(host, port).connect()
+    try:
+        status, created = await client.request("POST", "/sessions")
+        if status != 201:
+            errors.append(f"create session: {status}")
+            return
+        for command in commands:
+            start = time.perf_counter()
+            status, response = await client.request("POST", f"/sessions/{created['session']}/commands",
+                                                    {"command": command, "audio": audio})
+            latencies.append(time.perf_counter() - start)
+            if status != 200 or response.get("error"):
+                errors.append(f"{command!r}: {status} {response}")
+            elif audio and not all(response.get("audio") or []):
+                errors.append(f"{command!r}: missing audio")
+    finally:
+        client.close()
+
+async def ws_session(host, port, commands, audio, latencies, errors):
+    from server import read_frame, write_frame, OP_TEXT, OP_BINARY, OP_CLOSE
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(b"marco-benchmark!").decode("ascii")
+    writer.write((f"GET /ws HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    try:
+        await read_frame(reader, max_size=None) # {"type": "session"}
+        for command in commands:
+            start = time.perf_counter()
+            write_frame(writer, OP_TEXT, json.dumps({"command": command, "audio": audio}), mask=True)
+            await writer.drain()
+            speech = audio_frames = 0
+            while True:
+                opcode, payload = await read_frame(reader, max_size=None)
+                if opcode == OP_BINARY:
+                    audio_frames += 1
+                    continue
+                message = json.loads(payload)
+                if message["type"] == "speech":
+                    speech += 1
+                elif message["type"] == "result":
+                    break
+            # Audio follows its speech event, so wait for any still in flight
+            while audio and audio_frames < speech:
+                opcode, _ = await read_frame(reader, max_size=None)
+                audio_frames += opcode == OP_BINARY
+            latencies.append(time.perf_counter() - start)
+            if message.get("error"):
+                errors.append(f"{command!r}: {message['error']}")
+        write_frame(writer, OP_CLOSE, b"", mask=True)
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def run_load(sessions, commands_per_session, protocol, audio, workers):
+    from server import MarcoServer
+    server = await MarcoServer("127.0.0.1", 0, workers).start()
+    latencies, errors = [], []
+    client = http_session if protocol == "http" else ws_session
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            client("127.0.0.1", server.port,
+                   [COMMANDS[(i + j) % len(COMMANDS)] for j in range(commands_per_session)],
+                   audio, latencies, errors)
+            for i in range(sessions)))
+    finally:
+        wall = time.perf_counter() - start
+        await server.close()
+    return latencies, errors, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Marco server with faked services")
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent client sessions")
+    parser.add_argument("--commands", type=int, default=5, help="commands sent by each session")
+    parser.add_argument("--protocol", choices=("http", "ws"), default="http")
+    parser.add_argument("--audio", action="store_true", help="request rendered audio for every reply")
+    parser.add_argument("--workers", type=int, default=32, help="server command workers")
+    parser.add_argument("--latency-scale", type=float, default=0.1)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    fake_services.install(latency_scale=args.latency_scale)
+    import tracing
+    import response_cache
+    import history_db
+    tracing.TRACING_ENABLED = False
+    history_db.HISTORY_DB_ENABLED = False # Sessions keep their history in memory anyway
+    response_cache._cache = response_cache.ResponseCache(path=None) # Don't touch the user's cache file
+    tracemalloc.start()
+    latencies, errors, wall = asyncio.run(run_load(args.sessions, args.commands, args.protocol, args.audio, args.workers))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    from tts_stt import stop_speech_worker
+    stop_speech_worker()
+
+    results = {
+        "settings": vars(args),
+        "count": len(latencies),
+        "errors": len(errors),
+        "wall_s": round(wall, 4),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall else None,
+        "latency_ms": latency_stats(latencies),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+    for error in errors[:10]:
+        print(f"error: {error}")
+    latency = results["latency_ms"]
+    print(f"{args.sessions} sessions x {args.commands} commands over {args.protocol}: {results['count']} done, "
+          f"{results['errors']} errors, {results['throughput_per_s']} commands/s, peak memory {results['peak_memory_kb']} KB")
+    print(f"    latency ms  mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
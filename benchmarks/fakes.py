@@ -0,0 +1,507 @@
+# benchmarks/fakes.py
+"""
+Drop-in fakes for every external dependency Marco talks to, so the assistant can be driven
+headlessly and repeatably: speech_recognition (Google STT), pyttsx3, pyaudio (audio output), vlc,
+yt_dlp, requests (GNews), google.generativeai (Gemini) and webbrowser.open. Each fake sleeps for a configurable latency
+and can be told to fail a fraction of its calls, to be down entirely or to hang (see Fakes.outage/stall).
+
+    fakes = install(latency_scale=0.1, failure_rates={"llm": 0.05})
+    fakes.script_transcripts(["marco play lofi"])
+    ...  # import and drive assistant_actions, tts_stt, etc.
+
+install() must run before the application modules import their dependencies; since those are all
+imported lazily, installing before the first command is enough.
+"""
+import sys
+import time
+import wave
+import types
+import random
+import threading
+import webbrowser
+from collections import deque
+
+# Default latencies (seconds) of the real services, roughly what they take on a home connection
+DEFAULT_LATENCIES = {
+    "stt": 0.35, # Google speech recognition round trip
+    "llm": 0.6, # Gemini time to first chunk
+    "llm_chunk": 0.08, # Gemini time between streamed chunks
+    "news": 0.25, # GNews top-headlines request
+    "youtube_search": 0.5, # yt_dlp ytsearch1 query
+    "youtube_stream": 0.35, # yt_dlp stream URL extraction
+    "vlc": 0.02, # Starting playback of a media
+    "tts_word": 0.01, # pyttsx3 time per spoken word
+}
+
+LLM_REPLY = ("That is a good question. The short answer is that it depends on the context. "
+             "Let me know if you would like more detail.")
+HEADLINES = [f"Benchmark headline number {i}" for i in range(10)]
+
+
+class InjectedFailure(Exception):
+    """Raised by a fake when failure injection decides a call fails."""
+
+
+class FakeService:
+    """Latency and failure injection for one dependency."""
+
+    def __init__(self, name, latency, jitter=0.2, failure_rate=0.0, rng=None, rng_lock=None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.down = False # Outage: every call fails
+        self.stall = 0.0 # Extra seconds every call hangs for (not scaled), e.g. a degraded service
+        self.calls = 0
+        self.failures = 0
+        self._rng = rng or random.Random(0)
+        self._rng_lock = rng_lock or threading.Lock()
+        self._lock = threading.Lock()
+
+    def call(self, error=InjectedFailure):
+        """Sleeps for one call's latency, then raises error if this call was picked to fail."""
+        with self._rng_lock:
+            spread = self._rng.uniform(-self.jitter, self.jitter)
+            fail = self.down or self._rng.random() < self.failure_rate
+        with self._lock:
+            self.calls += 1
+            self.failures += fail
+        if self.latency > 0 or self.stall > 0:
+            time.sleep(self.latency * (1 + spread) + self.stall)
+        if fail:
+            raise error(f"injected {self.name} failure")
+
+    def stats(self):
+        return {"calls": self.calls, "failures": self.failures}
+
+
+class Fakes:
+    """The installed fakes; exposes the services for tuning and the call counters for reporting."""
+
+    def __init__(self, latency_scale=1.0, latencies=None, failure_rates=None, jitter=0.2, seed=0):
+        self.latency_scale = latency_scale
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        failure_rates = failure_rates or {}
+        self.services = {
+            name: FakeService(name, seconds * latency_scale, jitter, failure_rates.get(name, 0.0),
+                              self.rng, self.rng_lock)
+            for name, seconds in latencies.items()
+        }
+        self.transcripts = deque()
+        self.opened_urls = []
+        self._transcript_lock = threading.Lock()
+
+    def __getitem__(self, name):
+        return self.services[name]
+
+    def outage(self, name, down=True):
+        """Makes every call to a service fail (or recover, with down=False)."""
+        self.services[name].down = down
+
+    def stall(self, name, seconds):
+        """Makes every call to a service hang for the given extra seconds (0 to restore it)."""
+        self.services[name].stall = seconds
+
+    def script_transcripts(self, transcripts):
+        """Queues what the fake speech recognizer 'hears', one transcript per recognized utterance."""
+        with self._transcript_lock:
+            self.transcripts.extend(transcripts)
+
+    def next_transcript(self):
+        with self._transcript_lock:
+            return self.transcripts.popleft() if self.transcripts else None
+
+    def stats(self):
+        return {name: service.stats() for name, service in self.services.items() if service.calls}
+
+    def reset_stats(self):
+        for service in self.services.values():
+            service.calls = service.failures = 0
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    module.__fake__ = True
+    return module
+
+
+# --- speech_recognition ---
+
+def _speech_recognition(fakes):
+    class UnknownValueError(Exception):
+        pass
+
+    class RequestError(Exception):
+        pass
+
+    class WaitTimeoutError(Exception):
+        pass
+
+    class AudioData:
+        def __init__(self, frame_data, sample_rate, sample_width):
+            self.frame_data = frame_data
+            self.sample_rate = sample_rate
+            self.sample_width = sample_width
+
+    class Recognizer:
+        def __init__(self):
+            self.energy_threshold = 300
+            self.dynamic_energy_threshold = True
+            self.pause_threshold = 0.8
+
+        def _transcribe(self, service, show_all):
+            fakes[service].call(RequestError)
+            transcript = fakes.next_transcript()
+            if not transcript:
+                raise UnknownValueError()
+            if show_all:
+                return {"alternative": [{"transcript": transcript, "confidence": 0.92}], "final": True}
+            return transcript
+
+        def recognize_google(self, audio_data, show_all=False, **kwargs):
+            return self._transcribe("stt", show_all)
+
+        def recognize_whisper(self, audio_data, show_dict=False, **kwargs):
+            text = self._transcribe("stt", False)
+            return {"text": text, "segments": []} if show_dict else text
+
+        def recognize_sphinx(self, audio_data, **kwargs):
+            return self._transcribe("stt", False)
+
+        def adjust_for_ambient_noise(self, source, duration=1):
+            pass
+
+    return _module("speech_recognition", UnknownValueError=UnknownValueError, RequestError=RequestError,
+                   WaitTimeoutError=WaitTimeoutError, AudioData=AudioData, Recognizer=Recognizer)
+
+
+# --- pyttsx3 ---
+
+def _pyttsx3(fakes):
+    class Engine:
+        def __init__(self):
+            self._queue = []
+            self._callbacks = {}
+            self._stopped = False
+            self._properties = {"rate": 200, "volume": 1.0, "voice": None, "voices": []}
+            self.spoken = 0
+
+        def connect(self, topic, callback):
+            self._callbacks.setdefault(topic, []).append(callback)
+
+        def say(self, text, name=None):
+            self._queue.append((text, name, None))
+
+        def save_to_file(self, text, filename, name=None):
+            self._queue.append((text, name, filename))
+
+        def runAndWait(self):
+            self._stopped = False
+            queued, self._queue = self._queue, []
+            for text, name, filename in queued:
+                location = 0
+                for word in text.split():
+                    if self._stopped:
+                        return
+                    for callback in self._callbacks.get('started-word', ()):
+                        callback(name, location, len(word))
+                    location += len(word) + 1
+                    fakes["tts_word"].call()
+                if filename:
+                    # A quarter second of 22.05 kHz mono silence per word
+                    with wave.open(filename, "wb") as f:
+                        f.setnchannels(1)
+                        f.setsampwidth(2)
+                        f.setframerate(22050)
+                        f.writeframes(b"\0\0" * (22050 // 4) * max(1, len(text.split())))
+                self.spoken += 1
+
+        def stop(self):
+            self._stopped = True
+
+        def getProperty(self, name):
+            return self._properties.get(name)
+
+        def setProperty(self, name, value):
+            self._properties[name] = value
+
+    return _module("pyttsx3", init=lambda *args, **kwargs: Engine(), Engine=Engine)
+
+
+# --- vlc ---
+
+def _vlc(fakes):
+    class EventType:
+        MediaPlayerEndReached = "MediaPlayerEndReached"
+
+    class Media:
+        def __init__(self, mrl):
+            self.mrl = mrl
+
+    class EventManager:
+        def __init__(self):
+            self.callbacks = {}
+
+        def event_attach(self, event_type, callback, *args):
+            self.callbacks.setdefault(event_type, []).append(callback)
+
+        def fire(self, event_type):
+            for callback in self.callbacks.get(event_type, ()):
+                callback(types.SimpleNamespace(type=event_type))
+
+    class MediaPlayer:
+        def __init__(self):
+            self.media = None
+            self.playing = False
+            self._events = EventManager()
+
+        def set_media(self, media):
+            self.media = media
+
+        def get_media(self):
+            return self.media
+
+        def play(self):
+            fakes["vlc"].call()
+            self.playing = True
+            return 0
+
+        def stop(self):
+            self.playing = False
+
+        def is_playing(self):
+            return int(self.playing)
+
+        def event_manager(self):
+            return self._events
+
+        def end_of_media(self):
+            """Simulates the current song finishing."""
+            self.playing = False
+            self._events.fire(EventType.MediaPlayerEndReached)
+
+        def release(self):
+            pass
+
+    class Instance:
+        def __init__(self, *args):
+            pass
+
+        def media_new(self, mrl):
+            return Media(mrl)
+
+        def media_player_new(self):
+            return MediaPlayer()
+
+        def release(self):
+            pass
+
+    return _module("vlc", EventType=EventType, Instance=Instance, MediaPlayer=MediaPlayer, Media=Media)
+
+
+# --- yt_dlp ---
+
+def _yt_dlp(fakes):
+    class DownloadError(Exception):
+        pass
+
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=False):
+            if url.startswith("ytsearch"):
+                fakes["youtube_search"].call(DownloadError)
+                query = url.split(":", 1)[1]
+                video_id = f"vid{abs(hash(query)) % 10 ** 8:08d}"
+                return {"entries": [{"id": video_id, "title": query.title(), "url": video_id}]}
+            fakes["youtube_stream"].call(DownloadError)
+            video_id = url.rsplit("=", 1)[-1]
+            expire = int(time.time()) + 6 * 3600
+            return {"id": video_id, "title": f"Track {video_id}",
+                    "url": f"https://media.example/{video_id}.webm?expire={expire}"}
+
+    utils = _module("yt_dlp.utils", DownloadError=DownloadError)
+    return _module("yt_dlp", YoutubeDL=YoutubeDL, utils=utils, DownloadError=DownloadError), utils
+
+
+# --- requests ---
+
+def _requests(fakes):
+    class RequestException(Exception):
+        pass
+
+    class HTTPError(RequestException):
+        pass
+
+    class ConnectionError(RequestException):
+        pass
+
+    class Timeout(RequestException):
+        pass
+
+    class Response:
+        def __init__(self, payload, status_code=200):
+            self._payload = payload
+            self.status_code = status_code
+
+        def json(self):
+            return self._payload
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise HTTPError(f"{self.status_code} error")
+
+    class HTTPAdapter:
+        def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0, **kwargs):
+            self.max_retries = max_retries
+
+    class Session:
+        def __init__(self):
+            self.adapters = {}
+            self.headers = {}
+
+        def mount(self, prefix, adapter):
+            self.adapters[prefix] = adapter
+
+        def get(self, url, params=None, timeout=None, **kwargs):
+            fakes["news"].call(ConnectionError)
+            articles = [{"title": title, "url": f"https://news.example/{i}"} for i, title in enumerate(HEADLINES)]
+            return Response({"totalArticles": len(articles), "articles": articles})
+
+        def close(self):
+            pass
+
+    exceptions = _module("requests.exceptions", RequestException=RequestException, HTTPError=HTTPError,
+                         ConnectionError=ConnectionError, Timeout=Timeout)
+    adapters = _module("requests.adapters", HTTPAdapter=HTTPAdapter)
+    requests = _module("requests", Session=Session, Response=Response, exceptions=exceptions, adapters=adapters,
+                       RequestException=RequestException, HTTPError=HTTPError,
+                       ConnectionError=ConnectionError, Timeout=Timeout,
+                       get=lambda url, **kwargs: Session().get(url, **kwargs))
+    return requests, exceptions, adapters
+
+
+# --- pyaudio (playback of cached phrases) ---
+
+def _pyaudio(fakes):
+    class Stream:
+        def __init__(self, rate, channels, width):
+            self.bytes_per_second = rate * channels * width
+
+        def write(self, frames):
+            # Output blocks for as long as the audio plays
+            time.sleep(len(frames) / float(self.bytes_per_second) * fakes.latency_scale)
+
+        def stop_stream(self):
+            pass
+
+        def close(self):
+            pass
+
+    class PyAudio:
+        def get_format_from_width(self, width):
+            return width
+
+        def open(self, format=2, channels=1, rate=22050, output=False, **kwargs):
+            return Stream(rate, channels, format)
+
+        def terminate(self):
+            pass
+
+    return _module("pyaudio", PyAudio=PyAudio)
+
+
+# --- google.generativeai ---
+
+def _genai(fakes):
+    class GenerationConfig:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    class Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    class Response:
+        def __init__(self, text):
+            self.text = text
+
+    class GenerativeModel:
+        def __init__(self, model_name="gemini-pro", **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+            fakes["llm"].call()
+            if not stream:
+                return Response(LLM_REPLY)
+            return self._stream(LLM_REPLY)
+
+        def _stream(self, text):
+            words = text.split(" ")
+            for i in range(0, len(words), 4):
+                if i:
+                    fakes["llm_chunk"].call()
+                yield Chunk(" ".join(words[i:i + 4]) + " ")
+
+    genai_types = _module("google.generativeai.types", GenerationConfig=GenerationConfig)
+    genai = _module("google.generativeai", GenerativeModel=GenerativeModel, types=genai_types,
+                    configure=lambda **kwargs: None)
+    google = _module("google", generativeai=genai)
+    google.__path__ = []
+    return google, genai, genai_types
+
+
+def _fake_config(genai):
+    """Stands in for config.py when it cannot be imported (it holds the API keys and is not always present)."""
+    state = {}
+    module = _module("config", CONVERSATION_HISTORY=[], GNEWS_API_KEY="benchmark", genai=genai,
+                     GEMINI_MODEL=genai.GenerativeModel("gemini-pro"))
+    for name in ("engine", "recognizer", "vlc_player", "vlc_instance"):
+        module.__dict__[f"get_{name}"] = lambda name=name: state.get(name)
+        module.__dict__[f"set_{name}"] = lambda value, name=name: state.__setitem__(name, value)
+    return module
+
+
+def install(latency_scale=1.0, latencies=None, failure_rates=None, jitter=0.2, seed=0):
+    """
+    Puts the fake modules into sys.modules (replacing any real ones) and points config at the fake
+    Gemini model. Returns the Fakes controlling their latency, failures and scripted input.
+    """
+    fakes = Fakes(latency_scale, latencies, failure_rates, jitter, seed)
+    yt_dlp, yt_dlp_utils = _yt_dlp(fakes)
+    requests, requests_exceptions, requests_adapters = _requests(fakes)
+    google, genai, genai_types = _genai(fakes)
+    sys.modules.update({
+        "speech_recognition": _speech_recognition(fakes),
+        "pyttsx3": _pyttsx3(fakes),
+        "pyaudio": _pyaudio(fakes),
+        "vlc": _vlc(fakes),
+        "yt_dlp": yt_dlp,
+        "yt_dlp.utils": yt_dlp_utils,
+        "requests": requests,
+        "requests.exceptions": requests_exceptions,
+        "requests.adapters": requests_adapters,
+        "google": google,
+        "google.generativeai": genai,
+        "google.generativeai.types": genai_types,
+    })
+    webbrowser.open = lambda url, *args, **kwargs: fakes.opened_urls.append(url) or True
+
+    try:
+        import config
+    except ImportError:
+        config = sys.modules["config"] = _fake_config(genai)
+    config.genai = genai
+    config.GEMINI_MODEL = genai.GenerativeModel("gemini-pro")
+    config.GNEWS_API_KEY = "benchmark"
+    return fakes
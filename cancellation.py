@@ -0,0 +1,43 @@
+# cancellation.py
+import threading
+import contextvars
+
+
+class CommandCancelled(Exception):
+    """Raised by CancelToken.raise_if_cancelled() inside a command that has been cancelled."""
+
+
+class CancelToken:
+    """Cooperative cancellation flag for one command. Long-running handlers check it between steps."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CommandCancelled()
+
+
+_NEVER_CANCELLED = CancelToken() # Used outside the scheduler, e.g. when a handler is called directly
+_current_token = contextvars.ContextVar("cancel_token", default=_NEVER_CANCELLED)
+
+def current_token():
+    """Returns the CancelToken of the command running in this context."""
+    return _current_token.get()
+
+def is_cancelled():
+    return _current_token.get().cancelled
+
+def set_current_token(token):
+    """Binds token to the current context. Returns a reset handle for reset_current_token()."""
+    return _current_token.set(token)
+
+def reset_current_token(handle):
+    _current_token.reset(handle)
@@ -0,0 +1,40 @@
+# client_actions.py
+"""
+Host-side effects (opening a website, playing music) for commands whose client is somewhere else.
+
+The server binds an action sink for each session's commands (see server.py). While one is bound, the
+handlers describe what should happen instead of doing it on the host, and the client carries it out:
+
+    {"type": "open_url", "url": "https://www.google.com", "title": "Google"}
+    {"type": "play", "url": <stream URL>, "title": "...", "query": "lofi"}
+    {"type": "queue", "url": <stream URL>, "title": "...", "query": "lofi"}
+    {"type": "next"}
+    {"type": "stop"}
+
+Without a sink (the GUI and batch modes) the handlers use the host's browser and VLC player as before.
+"""
+import contextvars
+
+_action_sink = contextvars.ContextVar("action_sink", default=None)
+
+def set_action_sink(sink):
+    """
+    Sends the actions of commands run in the current context to sink(action) instead of performing
+    them on the host. Returns a reset handle for reset_action_sink().
+    """
+    return _action_sink.set(sink)
+
+def reset_action_sink(handle):
+    _action_sink.reset(handle)
+
+def client_handles_actions():
+    """True if the current command's client performs its actions itself."""
+    return _action_sink.get() is not None
+
+def send_action(kind, **fields):
+    """Hands an action to the current command's client. Returns False if there is no client to take it."""
+    sink = _action_sink.get()
+    if sink is None:
+        return False
+    sink(dict(type=kind, **fields))
+    return True
@@ -0,0 +1,197 @@
+# command_router.py
+import re
+
+import tracing
+
+_WORD = re.compile(r"\w+")
+
+
+class Route:
+    """A command handler and the trigger phrases/patterns that select it."""
+
+    def __init__(self, name, handler, priority, phrases=(), prefixes=(), patterns=(),
+                 group=None, policy=None, preempt=False):
+        self.name = name
+        self.handler = handler
+        self.priority = priority
+        # Scheduling hints, see command_scheduler.CommandScheduler
+        self.group = group
+        self.policy = policy
+        self.preempt = preempt
+        self.phrases = list(phrases)
+        self.prefixes = list(prefixes)
+        self.patterns = list(patterns)
+
+    def __repr__(self):
+        return f"Route({self.name!r}, priority={self.priority})"
+
+
+class RouteMatch:
+    """Result of routing a command: the chosen route, the command and the text after the trigger."""
+
+    def __init__(self, route, command, start=0, end=0, intent=None):
+        self.route = route
+        self.command = command
+        self.trigger = command[start:end]
+        self.argument = command[end:].strip()
+        self.intent = intent # IntentMatch when the intent classifier was consulted
+
+    def __repr__(self):
+        return f"RouteMatch({self.route.name!r}, argument={self.argument!r})"
+
+
+class CommandRouter:
+    """
+    Registry of command handlers. Handlers declare trigger phrases (whole words anywhere in the
+    command), prefixes (command must start with them) or raw regex patterns, plus a priority.
+    Phrases are indexed by their first word, so routing is a single pass over the words of the
+    input; patterns are compiled into one combined regex and prefixes into one anchored regex.
+    When several routes match, the highest priority wins and ties go to the earliest match.
+    Patterns may not define named groups, the combined regex uses group names to tell which
+    trigger matched. Commands no trigger matches can be handed to an intent classifier (see
+    intent_classifier.py), which may rewrite them into a command that does match, before they
+    go to the fallback.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.fallback = None
+        self.classifier = None
+        self._compiled = False
+        self._phrases = {} # First word -> [(phrase, route)], highest priority first
+        self._anywhere = None # Patterns, searched through the whole command
+        self._prefix = None # Prefixes, matched at the start only
+        self._top_priority = None
+        self._group_routes = {}
+
+    def register(self, name, handler, phrases=(), prefixes=(), patterns=(), priority=0, **scheduling):
+        """
+        Registers handler(match) for the given triggers. Returns the Route.
+        Optional scheduling hints (group, policy, preempt) are stored on the Route.
+        """
+        if not (phrases or prefixes or patterns):
+            raise ValueError(f"Route {name!r} needs at least one phrase, prefix or pattern")
+        for pattern in patterns:
+            if re.compile(pattern).groupindex:
+                raise ValueError(f"Pattern {pattern!r} of route {name!r} defines named groups, use (?:...) instead")
+        route = Route(name, handler, priority, phrases, prefixes, patterns, **scheduling)
+        self.routes.append(route)
+        self._compiled = False # Recompile on next use
+        return route
+
+    def route(self, name, phrases=(), prefixes=(), patterns=(), priority=0, **scheduling):
+        """Decorator form of register()."""
+        def decorator(handler):
+            self.register(name, handler, phrases, prefixes, patterns, priority, **scheduling)
+            return handler
+        return decorator
+
+    def set_fallback(self, name, handler, **scheduling):
+        """Handler used when no route matches (e.g. the LLM)."""
+        self.fallback = Route(name, handler, priority=float("-inf"), **scheduling)
+        return self.fallback
+
+    def set_classifier(self, classifier):
+        """Consulted for commands that would otherwise go to the fallback."""
+        self.classifier = classifier
+
+    def compile(self):
+        """Builds the combined matchers. Called automatically after routes change."""
+        patterns, prefixes = [], []
+        self._phrases = {}
+        self._group_routes = {}
+        # Highest priority first, so at any given position the most important trigger is tried first
+        ordered = sorted(self.routes, key=lambda r: -r.priority)
+        for route_index, route in enumerate(ordered):
+            odd_phrases = []
+            for phrase in route.phrases:
+                words = _WORD.findall(phrase)
+                # Phrases that start and end with a word are indexed by their first word, others become patterns
+                if words and phrase.startswith(words[0]) and phrase.endswith(words[-1]):
+                    self._phrases.setdefault(words[0], []).append((phrase, route))
+                else:
+                    odd_phrases.append(phrase)
+            triggers = (
+                (patterns, odd_phrases, lambda phrase: r"\b%s\b" % re.escape(phrase)),
+                (prefixes, route.prefixes, re.escape),
+                (patterns, route.patterns, lambda pattern: pattern),
+            )
+            for kind, (target, values, to_regex) in enumerate(triggers):
+                for value_index, value in enumerate(values):
+                    group = f"r{route_index}_{kind}_{value_index}"
+                    self._group_routes[group] = route
+                    target.append(f"(?P<{group}>{to_regex(value)})")
+
+        self._anywhere = re.compile("|".join(patterns)) if patterns else None
+        self._top_priority = ordered[0].priority if ordered else None
+        self._prefix = re.compile(r"\s*(?:%s)\b" % "|".join(prefixes)) if prefixes else None
+        self._compiled = True
+
+    def match(self, command):
+        """Returns the RouteMatch for a (lowercased) command, or a fallback match, or None."""
+        found = self._match_triggers(command)
+        if found is not None:
+            return RouteMatch(found[0], command, *found[1])
+
+        intent = None
+        if self.classifier is not None and command.strip():
+            intent = self.classifier.classify(command)
+            if intent is not None and intent.command:
+                found = self._match_triggers(intent.command)
+                if found is not None:
+                    return RouteMatch(found[0], intent.command, *found[1], intent=intent)
+        if self.fallback is not None:
+            return RouteMatch(self.fallback, command, intent=intent)
+        return None
+
+    def _match_triggers(self, command):
+        """Returns (route, trigger span) of the best trigger in command, or None."""
+        if not self._compiled:
+            self.compile()
+
+        best = None
+        best_span = None
+        if self._prefix is not None:
+            found = self._prefix.match(command)
+            if found:
+                best = self._group_routes[found.lastgroup]
+                best_span = found.span(found.lastgroup)
+        if self._phrases and (best is None or best.priority < self._top_priority):
+            for word in _WORD.finditer(command):
+                candidates = self._phrases.get(word.group())
+                if candidates is None:
+                    continue
+                start = word.start()
+                for phrase, route in candidates:
+                    if best is not None and route.priority <= best.priority:
+                        break # The rest rank lower still
+                    end = start + len(phrase)
+                    # The phrase has to end at a word boundary too: "stop music" is not in "stop musicals"
+                    if command.startswith(phrase, start) and not _WORD.match(command, end):
+                        best = route
+                        best_span = (start, end)
+                        break
+        if self._anywhere is not None and (best is None or best.priority < self._top_priority):
+            for found in self._anywhere.finditer(command):
+                route = self._group_routes[found.lastgroup]
+                if best is None or route.priority > best.priority or (
+                        route.priority == best.priority and found.start(found.lastgroup) < best_span[0]):
+                    best = route
+                    best_span = found.span(found.lastgroup)
+
+        return (best, best_span) if best is not None else None
+
+    def dispatch(self, command):
+        """Routes the command and runs its handler. Returns the handler's result."""
+        with tracing.span("route") as route_span:
+            match = self.match(command)
+            route_span.set(route=match.route.name if match else None)
+            if match is not None and match.intent is not None:
+                route_span.set(intent=match.intent.intent.name, intent_score=round(match.intent.score, 3))
+        if match is None:
+            return None
+        if match.intent is not None and match.route is not self.fallback:
+            print(f"Understood '{command}' as '{match.command}' (intent {match.intent.intent.name}, "
+                  f"score {match.intent.score:.2f}).")
+        with tracing.span(f"handler.{match.route.name}"):
+            return match.route.handler(match)
@@ -0,0 +1,228 @@
+# command_scheduler.py
+import threading
+import itertools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancelToken, CommandCancelled, set_current_token, reset_current_token
+import tracing
+
+MAX_CONCURRENT_COMMANDS = 4
+CANCELLED = "Command cancelled." # Result delivered for jobs that were cancelled
+
+
+class Job:
+    """One submitted command and its scheduling state."""
+
+    def __init__(self, seq, command, conversation, group=None, policy=None, preempt=False):
+        self.seq = seq
+        self.command = command
+        self.conversation = conversation
+        self.group = group
+        self.policy = policy
+        self.preempt = preempt
+        self.token = CancelToken()
+        self.result = None
+        self.error = None
+        self.started = False
+        self.delivered = False
+        # Runs in a copy of the submitter's context, so the trace started for the command carries over
+        self.context = contextvars.copy_context()
+        self.span = tracing.start_span("command", command=command, group=group)
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    @property
+    def group_key(self):
+        # Groups are per conversation: one session's music request never cancels another's
+        return (self.conversation, self.group)
+
+    def __repr__(self):
+        return f"Job({self.seq}, {self.command!r}, group={self.group})"
+
+
+class CommandScheduler:
+    """
+    Runs commands concurrently on a thread pool instead of one at a time.
+
+    - Commands are classified by classify(command) -> (group, policy, preempt).
+    - "serial" groups (e.g. the LLM conversation) run one job at a time, in order.
+    - "supersede" groups (e.g. music) cancel the older job of the group when a new one arrives.
+    - Preempting commands (stop/exit) cancel all in-flight and queued work and run on their own thread,
+      so they never wait behind a busy pool.
+    - Groups and preemption only affect jobs of the same conversation.
+    - on_result(job) is called with the results of each conversation in submission order.
+      Cancelled jobs are delivered straight away so they never hold up later results, from the
+      delivery thread: submit() and cancel() never call on_result themselves, so the GUI can submit
+      from the Tk thread while on_result posts back to it.
+    Cancellation is cooperative: handlers check cancellation.current_token() between steps.
+    """
+
+    def __init__(self, process, on_result, classify=None, max_workers=MAX_CONCURRENT_COMMANDS):
+        self.process = process
+        self.on_result = on_result
+        self.classify = classify or (lambda command: (None, None, False))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command")
+        self._delivery = ThreadPoolExecutor(max_workers=1, thread_name_prefix="command-delivery")
+        self._closed = False
+        self._lock = threading.RLock()
+        self._seq = itertools.count()
+        self._active = {} # seq -> Job, submitted and not yet delivered
+        self._group_queues = {} # (conversation, serial group) -> deque of waiting jobs
+        self._group_running = {} # (conversation, group) -> running Job
+        self._pending = {} # conversation -> {seq: Job} finished, waiting for earlier results
+        self._order = {} # conversation -> deque of seqs in submission order
+        self._outbox = {} # conversation -> deque of Jobs in order, waiting for on_result
+        self._delivering = set() # conversations whose outbox a thread is draining
+
+    def submit(self, command, conversation="default"):
+        """Schedules a command and returns its Job."""
+        group, policy, preempt = self.classify(command)
+        # Cancel what this command replaces before it is queued, so its result is not held up by them
+        if preempt:
+            self.cancel_all(conversation=conversation)
+        elif group is not None and policy == "supersede":
+            self.cancel_group(group, conversation)
+
+        with self._lock:
+            job = Job(next(self._seq), command, conversation, group, policy, preempt)
+            self._active[job.seq] = job
+            self._order.setdefault(conversation, deque()).append(job.seq)
+
+            if preempt:
+                threading.Thread(target=job.context.run, args=(self._run, job), name="command-preempt", daemon=True).start()
+                return job
+
+            if group is not None and policy == "serial":
+                if self._group_running.get(job.group_key) is not None:
+                    self._group_queues.setdefault(job.group_key, deque()).append(job)
+                    return job
+            if group is not None:
+                self._group_running[job.group_key] = job
+
+            self._executor.submit(job.context.run, self._run, job)
+            return job
+
+    def cancel(self, job):
+        """Cancels a job; its result is delivered as CANCELLED right away, on the delivery thread."""
+        with self._lock:
+            if job.delivered or job.cancelled:
+                return
+            job.token.cancel()
+            job.result = CANCELLED
+            queued = self._group_queues.get(job.group_key)
+            if queued and job in queued:
+                queued.remove(job)
+            if not self._closed:
+                self._delivery.submit(self._finish, job)
+                return
+        self._finish(job) # Shut down: nothing else will deliver it
+
+    def cancel_group(self, group, conversation="default"):
+        with self._lock:
+            jobs = [job for job in self._active.values() if job.group_key == (conversation, group)]
+        for job in jobs:
+            self.cancel(job)
+
+    def cancel_all(self, exclude=None, conversation=None):
+        """Cancels every in-flight and queued job, or only those of one conversation."""
+        with self._lock:
+            jobs = [job for job in self._active.values()
+                    if job is not exclude and (conversation is None or job.conversation == conversation)]
+        for job in jobs:
+            self.cancel(job)
+
+    def in_flight(self):
+        with self._lock:
+            return [job for job in self._active.values() if not job.cancelled]
+
+    def shutdown(self):
+        self.cancel_all()
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False)
+        self._delivery.shutdown(wait=False) # The cancelled results queued so far are still delivered
+
+    def _run(self, job):
+        handle = set_current_token(job.token)
+        try:
+            if not job.cancelled:
+                job.started = True
+                job.span.set(queue_ms=round(job.span.duration * 1000, 3))
+                with tracing.activate(job.span), tracing.span("command.run"):
+                    result = self.process(job.command)
+                if not job.cancelled: # A cancelled job keeps the CANCELLED result it was given
+                    job.result = result
+        except CommandCancelled:
+            job.result = CANCELLED
+        except Exception as e:
+            job.error = e
+            print(f"Error while processing '{job.command}': {e}")
+        finally:
+            reset_current_token(handle)
+            self._start_next_in_group(job)
+            self._finish(job) # No-op if the job was cancelled and already delivered
+
+    def _start_next_in_group(self, job):
+        with self._lock:
+            if job.group is None or self._group_running.get(job.group_key) is not job:
+                return
+            queued = self._group_queues.get(job.group_key)
+            next_job = queued.popleft() if queued else None
+            if next_job is None:
+                # Drop the empty entries, there can be one per group for every session that ever ran
+                del self._group_running[job.group_key]
+                self._group_queues.pop(job.group_key, None)
+            else:
+                self._group_running[job.group_key] = next_job
+                self._executor.submit(next_job.context.run, self._run, next_job)
+
+    def _finish(self, job):
+        """Marks a job done and delivers every result of its conversation that is now in order."""
+        with self._lock:
+            if job.delivered:
+                return
+            pending = self._pending.setdefault(job.conversation, {})
+            if job.seq in pending:
+                return
+            pending[job.seq] = job
+            order = self._order[job.conversation]
+            outbox = self._outbox.setdefault(job.conversation, deque())
+            while order and order[0] in pending:
+                done = pending.pop(order.popleft())
+                done.delivered = True
+                self._active.pop(done.seq, None)
+                outbox.append(done)
+            if not order:
+                # Nothing left in flight for this conversation
+                del self._order[job.conversation]
+                del self._pending[job.conversation]
+            if job.conversation in self._delivering:
+                return # The thread delivering this conversation's results picks these up too
+            self._delivering.add(job.conversation)
+        self._deliver(job.conversation)
+
+    def _deliver(self, conversation):
+        """
+        Calls on_result for a conversation's outbox in order. Only one thread at a time delivers a
+        conversation, and no lock is held while on_result runs, so it may submit, cancel or shut down.
+        """
+        while True:
+            with self._lock:
+                outbox = self._outbox.get(conversation)
+                if not outbox:
+                    self._outbox.pop(conversation, None)
+                    self._delivering.discard(conversation)
+                    return
+                done = outbox.popleft()
+            done.span.set(cancelled=done.cancelled)
+            if done.error is not None:
+                done.span.error = f"{type(done.error).__name__}: {done.error}"
+            done.span.finish()
+            try:
+                self.on_result(done)
+            except Exception as e:
+                print(f"Error delivering result of '{done.command}': {e}")
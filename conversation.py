@@ -0,0 +1,292 @@
+# conversation.py
+import threading
+import contextvars
+from collections import deque
+
+import config # For CONVERSATION_HISTORY and GEMINI_MODEL
+import resilience # Summaries go through the same Gemini circuit breaker as replies
+from history_db import get_history_db, HISTORY_STARTUP_WINDOW, HISTORY_PAGE_SIZE
+
+MAX_CONTEXT_TOKENS = 2000 # Approximate token budget for the history sent to Gemini with each request
+CHARS_PER_TOKEN = 4 # Rough estimate, good enough for budgeting without a tokenizer round trip
+SUMMARY_MAX_OUTPUT_TOKENS = 200
+MAX_HISTORY_IN_MEMORY = 1000 # Raw entries kept in RAM when the history is saved to disk; older ones are paged from there
+
+def estimate_tokens(text):
+    """Cheap token estimate for budgeting purposes."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def to_gemini_message(msg):
+    """Converts a raw history entry ({"role", "content"}) to the Gemini chat message format."""
+    # System messages are treated as a user prompt for the model, assistant turns map to 'model'
+    role = 'model' if msg["role"] == "assistant" else 'user'
+    return {'role': role, 'parts': [msg["content"]]}
+
+def gemini_summarizer(previous_summary, messages):
+    """
+    Asks Gemini to fold the given (oldest) messages into a running summary.
+    Returns the new summary text.
+    """
+    transcript = "\n".join(f"{m['role']}: {m['parts'][0]}" for m in messages)
+    prompt = (
+        "Summarize the following conversation between a user and the assistant Marco in a few sentences. "
+        "Keep names, facts and preferences that may matter later.\n"
+    )
+    if previous_summary:
+        prompt += f"Summary so far: {previous_summary}\n"
+    prompt += f"Conversation:\n{transcript}"
+
+    response = resilience.call(
+        "gemini", config.GEMINI_MODEL.generate_content,
+        prompt,
+        generation_config=config.genai.types.GenerationConfig(
+            max_output_tokens=SUMMARY_MAX_OUTPUT_TOKENS,
+            temperature=0.2
+        )
+    )
+    return response.text.strip()
+
+
+class ConversationStore:
+    """
+    Keeps the raw conversation history alongside the Gemini-format messages so nothing is
+    reconverted per turn. The messages sent to the model are kept within a token budget:
+    the oldest turns are dropped from the window and folded into a summary in the background.
+    With a HistoryDB (see history_db.py) every turn is also saved to disk, and the raw history list
+    only keeps the most recent entries; positions in it are counted from the start of the session
+    (see history_since) so trimming does not disturb the display. The summary is saved too, with the
+    id of the newest turn it covers, and passed back in as summary on the next start.
+    """
+
+    def __init__(self, history=None, max_tokens=MAX_CONTEXT_TOKENS, summarizer=gemini_summarizer,
+                 db=None, conversation="default", max_history=MAX_HISTORY_IN_MEMORY, summary=None):
+        self.history = history if history is not None else []
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.db = db
+        self.conversation = conversation
+        self.max_history = max_history
+        self._trimmed = 0 # Entries dropped from the front of self.history so far
+        self._lock = threading.RLock()
+        self._pinned = [] # System messages (persona), never dropped
+        self._window = deque() # (gemini_message, tokens, entry) for the most recent turns
+        self._window_tokens = 0
+        self._summary = None
+        self._summary_message = None
+        self._summary_through = None # Row id of the newest saved turn the summary covers
+        self._dropped = [] # (message, entry) waiting to be folded into the summary
+        self._summarizing = False
+        if summary:
+            self._set_summary(*summary)
+
+        for msg in self.history:
+            self._add(msg)
+        self._enforce_budget()
+
+    def append(self, role, content):
+        """Appends a turn to the history and to the model window, enforcing the token budget."""
+        msg = {"role": role, "content": content}
+        with self._lock:
+            self.history.append(msg)
+            self._add(msg)
+            self._enforce_budget()
+            if self.db is not None:
+                self.db.append(msg, self.conversation)
+                self._trim_history()
+        return msg
+
+    def discard_last_user_message(self):
+        """Removes the most recent turn if it is an unanswered user message (e.g. after an LLM error)."""
+        with self._lock:
+            if self.history and self.history[-1]["role"] == "user":
+                msg = self.history.pop()
+                if self.db is not None:
+                    self.db.retract(msg)
+                if self._window:
+                    _, tokens, _ = self._window.pop()
+                    self._window_tokens -= tokens
+
+    def history_since(self, position):
+        """
+        Returns (entries, position): the raw entries added after position, and the position to pass
+        next time. Positions count every entry of the session, including those trimmed from memory.
+        """
+        with self._lock:
+            end = self._trimmed + len(self.history)
+            if position >= end:
+                return [], end # Nothing new, or entries were discarded since
+            return self.history[max(0, position - self._trimmed):], end
+
+    def older_turns(self, before_id, limit=HISTORY_PAGE_SIZE):
+        """Pages saved turns older than the given row id from the database, oldest first."""
+        if self.db is None or before_id is None:
+            return []
+        return self.db.page(before_id, limit, conversation=self.conversation)
+
+    def newer_turns(self, after_id, limit=HISTORY_PAGE_SIZE):
+        """Pages saved turns newer than the given row id, oldest first. Turns still queued are written first."""
+        if self.db is None or after_id is None:
+            return []
+        self.db.flush()
+        return self.db.page_after(after_id, limit, conversation=self.conversation)
+
+    def latest_turns(self, limit=HISTORY_PAGE_SIZE):
+        """Returns the most recent turns, oldest first: from the database when there is one, else from memory."""
+        if self.db is None:
+            with self._lock:
+                return list(self.history[-limit:])
+        self.db.flush()
+        return self.db.page(None, limit, conversation=self.conversation)
+
+    def _trim_history(self):
+        """Drops the oldest raw entries (they are on disk) once there are more than max_history."""
+        excess = len(self.history) - self.max_history
+        if excess <= 0:
+            return
+        excess = max(excess, self.max_history // 4) # Trim in chunks rather than on every append
+        # Keep the pinned system messages at the front
+        first = 0
+        while first < len(self.history) and self.history[first]["role"] == "system":
+            first += 1
+        excess = min(excess, len(self.history) - first - 1)
+        if excess > 0:
+            del self.history[first:first + excess]
+            self._trimmed += excess
+
+    def messages(self):
+        """Returns the Gemini chat messages for the next request: persona, summary, then recent turns."""
+        with self._lock:
+            messages = list(self._pinned)
+            if self._summary_message:
+                messages.append(self._summary_message)
+            messages.extend(message for message, _, _ in self._window)
+            return messages
+
+    def stable_messages(self):
+        """Returns the persona and the summary in Gemini format, without the turns that change every exchange."""
+        with self._lock:
+            messages = list(self._pinned)
+            if self._summary_message:
+                messages.append(self._summary_message)
+            return messages
+
+    def pinned_messages(self):
+        """Returns the pinned system messages (the persona) in Gemini format."""
+        with self._lock:
+            return list(self._pinned)
+
+    @property
+    def summary(self):
+        return self._summary
+
+    def token_count(self):
+        with self._lock:
+            pinned = sum(estimate_tokens(m['parts'][0]) for m in self._pinned)
+            summary = estimate_tokens(self._summary) if self._summary else 0
+            return pinned + summary + self._window_tokens
+
+    def _add(self, msg):
+        message = to_gemini_message(msg)
+        if msg["role"] == "system":
+            self._pinned.append(message)
+        else:
+            tokens = estimate_tokens(msg["content"])
+            self._window.append((message, tokens, msg))
+            self._window_tokens += tokens
+
+    def _enforce_budget(self):
+        dropped = []
+        # Always keep the newest turn, even if it alone exceeds the budget
+        while self._window_tokens > self.max_tokens and len(self._window) > 1:
+            dropped.append(self._pop_oldest())
+            # Keep the window starting on a user turn so the model sees whole exchanges
+            while len(self._window) > 1 and self._window[0][0]['role'] == 'model':
+                dropped.append(self._pop_oldest())
+
+        if dropped and self.summarizer:
+            self._dropped.extend(dropped)
+            if not self._summarizing:
+                self._summarizing = True
+                threading.Thread(target=self._summarize_dropped, daemon=True).start()
+
+    def _pop_oldest(self):
+        message, tokens, msg = self._window.popleft()
+        self._window_tokens -= tokens
+        return message, msg
+
+    def _set_summary(self, summary, through_id=None):
+        self._summary = summary
+        self._summary_message = {
+            'role': 'user',
+            'parts': [f"Summary of our earlier conversation: {summary}"]
+        }
+        if through_id is not None:
+            self._summary_through = through_id
+
+    def _summarize_dropped(self):
+        """Runs in a background thread so the next request is never blocked on summarization."""
+        while True:
+            with self._lock:
+                batch, self._dropped = self._dropped, []
+                previous = self._summary
+                if not batch:
+                    self._summarizing = False
+                    return
+            try:
+                summary = self.summarizer(previous, [message for message, _ in batch])
+            except Exception as e:
+                print(f"Conversation summary error: {e}")
+                continue # The dropped turns are simply forgotten
+            if summary:
+                # Turns of this session have an id once the history database has written them
+                if self.db is not None:
+                    self.db.flush()
+                ids = [msg["id"] for _, msg in batch if "id" in msg]
+                with self._lock:
+                    self._set_summary(summary, max(ids) if ids else None)
+                    through_id = self._summary_through
+                if self.db is not None and through_id is not None:
+                    self.db.save_summary(summary, through_id, self.conversation)
+                print(f"Conversation summary updated: {summary}")
+
+
+_store = None
+_store_lock = threading.Lock()
+# Set by the server so each session's commands use that session's store instead of the shared one
+_session_store = contextvars.ContextVar("conversation_store", default=None)
+
+def get_store():
+    """
+    Returns the conversation store of the current session if one is bound (see set_current_store),
+    otherwise the store wrapping config.CONVERSATION_HISTORY, creating it on first use.
+    The shared store is saved to the history database; on first use the saved summary and the most
+    recent window of saved turns it does not cover are loaded, after the persona in config.CONVERSATION_HISTORY.
+    """
+    global _store
+    session_store = _session_store.get()
+    if session_store is not None:
+        return session_store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                db = get_history_db()
+                summary = None
+                if db is not None:
+                    try:
+                        summary = db.load_summary()
+                        turns = db.recent(HISTORY_STARTUP_WINDOW)
+                        if summary is not None:
+                            # Already folded into the summary, so not summarized again on every start
+                            turns = [turn for turn in turns if turn["id"] > summary[1]]
+                        config.CONVERSATION_HISTORY.extend(turns)
+                    except Exception as e:
+                        print(f"Could not load conversation history: {e}")
+                _store = ConversationStore(config.CONVERSATION_HISTORY, db=db, summary=summary)
+    return _store
+
+def set_current_store(store):
+    """Binds a session's store to the current context. Returns a reset handle for reset_current_store()."""
+    return _session_store.set(store)
+
+def reset_current_store(handle):
+    _session_store.reset(handle)
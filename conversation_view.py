@@ -0,0 +1,139 @@
+# conversation_view.py
+"""
+The part of the conversation shown in the GUI's display: a window of at most MAX_DISPLAY_LINES lines.
+
+Lines pushed out at the top by new turns, or at the bottom by scrolling back, are dropped rather than
+kept around. With a history database they are paged back in by turn id: older turns before the oldest
+one shown, newer turns after the newest one shown. Kept free of Tk so the paging can be tested on its own.
+"""
+
+MAX_DISPLAY_LINES = 500 # Lines kept in the conversation widget; the rest is reloaded from the history database
+SCROLLBACK_CHUNK = 100 # Turns paged in at a time when scrolling past either end
+
+def format_turn(entry):
+    role = "You" if entry["role"] == "user" else "Marco"
+    return f"{role}: {entry['content']}"
+
+def line_count(text):
+    return text.count("\n") + 1
+
+
+class ConversationView:
+    """
+    Entries shown in the display, oldest first, each {"text", "turn"}. turn is the conversation entry
+    the text shows, whose "id" the history database fills in once it is written (None for text that is
+    not a turn yet, see attach_turn). detached is True while newer turns exist than the ones shown,
+    i.e. after scrolling back far enough for the newest ones to be dropped.
+    """
+
+    def __init__(self, store, max_lines=MAX_DISPLAY_LINES, chunk=SCROLLBACK_CHUNK):
+        self.store = store
+        self.max_lines = max_lines
+        self.chunk = chunk
+        self.entries = []
+        self.lines = 0
+        self.detached = False
+        self._older_exhausted = False
+
+    def texts(self):
+        return [entry["text"] for entry in self.entries]
+
+    def oldest_turn_id(self):
+        return next((entry["turn"]["id"] for entry in self.entries if entry["turn"] and "id" in entry["turn"]), None)
+
+    def newest_turn_id(self):
+        return next((entry["turn"]["id"] for entry in reversed(self.entries)
+                     if entry["turn"] and "id" in entry["turn"]), None)
+
+    @property
+    def has_older(self):
+        return not self._older_exhausted and self.oldest_turn_id() is not None
+
+    def append(self, texts_and_turns):
+        """
+        Adds (text, turn) pairs at the bottom, dropping entries at the top past max_lines.
+        Returns (texts added, lines dropped at the top). Turns already shown are skipped.
+        """
+        newest = self.newest_turn_id()
+        added = []
+        for text, turn in texts_and_turns:
+            if newest is not None and turn and turn.get("id", newest + 1) <= newest:
+                continue # Already paged in from the database
+            self.entries.append({"text": text, "turn": turn})
+            self.lines += line_count(text)
+            added.append(text)
+        return added, self._trim_top()
+
+    def attach_turn(self, text, turn):
+        """Links text shown ahead of its turn (a command echoed on submit) to the turn, once it exists."""
+        for entry in reversed(self.entries):
+            if entry["turn"] is None and entry["text"] == text:
+                entry["turn"] = turn
+                return True
+        return False
+
+    def page_older(self):
+        """Pages in the turns before the oldest one shown. Returns the lines added at the top (0 if none)."""
+        before_id = self.oldest_turn_id()
+        if before_id is None or self._older_exhausted:
+            return 0
+        turns = self._load(self.store.older_turns, before_id)
+        if not turns:
+            self._older_exhausted = True # Reached the beginning
+            return 0
+        entries = [{"text": format_turn(turn), "turn": turn} for turn in turns]
+        self.entries[:0] = entries
+        added = sum(line_count(entry["text"]) for entry in entries)
+        self.lines += added
+        if self._trim_bottom():
+            self.detached = True
+        return added
+
+    def page_newer(self):
+        """
+        Pages in the turns after the newest one shown, while detached. Returns the lines dropped at
+        the top (0 if none). Reaching the latest turn attaches the view again.
+        """
+        after_id = self.newest_turn_id()
+        if not self.detached or after_id is None:
+            self.detached = False
+            return 0
+        turns = self._load(self.store.newer_turns, after_id)
+        if len(turns) < self.chunk:
+            self.detached = False
+        _, dropped = self.append((format_turn(turn), turn) for turn in turns)
+        return dropped
+
+    def jump_to_latest(self):
+        """Replaces the window with the most recent turns."""
+        turns = self._load(lambda _, limit: self.store.latest_turns(limit), None, self.max_lines)
+        self.entries = [{"text": format_turn(turn), "turn": turn} for turn in turns]
+        self.lines = sum(line_count(entry["text"]) for entry in self.entries)
+        self.detached = False
+        self._older_exhausted = False
+        self._trim_top()
+
+    def _load(self, read, turn_id, limit=None):
+        try:
+            return read(turn_id, limit or self.chunk)
+        except Exception as e:
+            print(f"Could not load conversation history: {e}")
+            return []
+
+    def _trim_top(self):
+        dropped = 0
+        while self.lines > self.max_lines and len(self.entries) > 1:
+            lines = line_count(self.entries.pop(0)["text"])
+            self.lines -= lines
+            dropped += lines
+        if dropped:
+            self._older_exhausted = False
+        return dropped
+
+    def _trim_bottom(self):
+        dropped = 0
+        while self.lines > self.max_lines and len(self.entries) > 1:
+            lines = line_count(self.entries.pop()["text"])
+            self.lines -= lines
+            dropped += lines
+        return dropped
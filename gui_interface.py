@@ -2,14 +2,19 @@
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
 import threading
-import queue
-import time # For slight delays to make UI updates smoother
-import speech_recognition as sr # <--- This line is essential for sr.Microphone() and sr exceptions
+from collections import deque
 
 # Import functions/data from your existing modules
-from tts_stt import speak, recognize_speech
-from assistant_actions import process_command
-import config # To access CONVERSATION_HISTORY and manage shared state
+from tts_stt import speak, recognize_speech, flush_speech, get_recognizer
+from assistant_actions import process_command, classify_command
+from command_scheduler import CommandScheduler, CANCELLED
+from audio_capture import AudioCapture
+from wake_word import get_wake_word_detector, split_wake_word
+from ui_dispatch import TkDispatcher
+import tracing
+from resilience import breaker_states
+from conversation import get_store # Conversation history shown in the display
+from conversation_view import ConversationView, format_turn
 
 
 class MarcoGUI:
@@ -19,11 +24,19 @@ class MarcoGUI:
         master.geometry("800x600") # Increased size for better appearance
         master.resizable(False, False) # Make window non-resizable for fixed layout
 
-        self.command_queue = queue.Queue() # To send commands to processing thread
-        self.response_queue = queue.Queue() # To receive responses from processing thread
+        # Background threads never touch widgets directly; they post updates to the main thread
+        self.dispatcher = TkDispatcher(master)
 
         self.current_input_mode = "text" # Default to text input
+
+        # Conversation display state: the bounded window of turns shown (paged from the history
+        # database past either end) and the conversation store position rendered up to
+        self.view = ConversationView(get_store())
+        self._history_rendered = 0
+        self._paging = False
+        self._echoed_commands = deque(maxlen=20) # Commands already shown as "You: ..." when submitted
         self.listening_for_activation = True # For voice activation in GUI
+        self.audio_capture = None # Always-open microphone stream, started in voice mode
 
         # --- Styling ---
         master.tk_setPalette(background='#36454F', foreground='white',
@@ -35,13 +48,9 @@ class MarcoGUI:
         # --- Widgets ---
         self.create_widgets()
         
-        # --- Start a background thread for AI processing ---
-        self.processing_thread = threading.Thread(target=self.process_commands_from_queue, daemon=True)
-        self.processing_thread.start()
+        # --- Commands run concurrently; stop/exit preempt whatever is in flight ---
+        self.scheduler = CommandScheduler(process_command, self._on_command_result, classify=classify_command)
 
-        # --- Start a periodic check for responses ---
-        self.master.after(100, self.check_response_queue)
-        
         # Display initial conversation history
         self.update_display_with_history()
 
@@ -88,20 +97,56 @@ class MarcoGUI:
         self.display_text = scrolledtext.ScrolledText(self.master, wrap=tk.WORD, font=self.font_medium,
                                                      bg='#2F4F4F', fg='white', insertbackground='white',
                                                      state='disabled', padx=10, pady=10)
+        self.display_text.config(yscrollcommand=self._on_display_scroll)
         self.display_text.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         # --- Status Bar ---
         self.status_label = tk.Label(self.master, text="Ready.", bd=1, relief=tk.SUNKEN, anchor=tk.W,
                                      font=('Arial', 9), bg='#36454F', fg='lightgray')
         self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_label.bind("<Double-Button-1>", self.show_latency_metrics) # Double-click for per-stage latencies
 
     def on_mode_change(self, *args):
         self.current_input_mode = self.mode_var.get().lower()
         self.update_input_widgets()
         self.status_label.config(text=f"Switched to {self.current_input_mode} mode.")
         if self.current_input_mode == "voice":
-            speak("Switched to voice input mode. Say 'Marco' to activate.")
+            speak("Switched to voice input mode. Say 'Marco' to activate.", cache=True)
             self.listening_for_activation = True # Reset activation for voice mode
+            self._start_audio_capture()
+        else:
+            self._stop_audio_capture() # Release the microphone while typing
+
+    def _start_audio_capture(self):
+        """Opens the microphone once and keeps it streaming in the background."""
+        if self.audio_capture is None or not self.audio_capture.running:
+            try:
+                self.audio_capture = AudioCapture().start()
+            except Exception as e:
+                self.audio_capture = None
+                self.status_label.config(text=f"Could not open microphone: {e}")
+        return self.audio_capture
+
+    def _stop_audio_capture(self):
+        if self.audio_capture is not None:
+            self.audio_capture.stop()
+            self.audio_capture = None
+
+    def _wait_for_utterance(self, timeout):
+        """
+        Returns the next Utterance from the microphone stream.
+        Raises sr.WaitTimeoutError if nothing is said within timeout seconds.
+        """
+        import speech_recognition as sr
+        capture = self.audio_capture
+        if capture is None or not capture.running:
+            raise RuntimeError("Microphone stream is not running.")
+        with tracing.span("capture") as capture_span:
+            utterance = capture.next_utterance(timeout=timeout)
+            capture_span.set(speech_s=round(utterance.duration, 3) if utterance else None)
+        if utterance is None:
+            raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+        return utterance
 
     def update_input_widgets(self):
         if self.current_input_mode == "text":
@@ -114,20 +159,87 @@ class MarcoGUI:
             self.voice_button.config(state='normal')
 
     def update_display(self, message):
+        self._append_display_lines([(message, None)])
+
+    def update_display_with_history(self):
+        """Appends only the conversation entries added since the last render."""
+        entries, self._history_rendered = get_store().history_since(self._history_rendered)
+
+        lines = []
+        for entry in entries:
+            if entry["role"] == "user" and entry["content"].lower() in self._echoed_commands:
+                # Already shown when the command was submitted
+                self._echoed_commands.remove(entry["content"].lower())
+                self.view.attach_turn(format_turn(entry), entry)
+                continue
+            lines.append((format_turn(entry), entry))
+
+        if lines:
+            self._append_display_lines(lines)
+
+    def _echo_command(self, command):
+        self._echoed_commands.append(command.lower())
+        self.update_display(f"You: {command}")
+
+    def _append_display_lines(self, lines):
+        if self.view.detached:
+            # Scrolled back past the newest turns: show the latest ones again before adding more
+            self.view.jump_to_latest()
+            self._render_display()
+        added, dropped = self.view.append(lines)
         self.display_text.config(state='normal')
-        self.display_text.insert(tk.END, message + "\n")
+        if added:
+            self.display_text.insert(tk.END, "\n".join(added) + "\n")
+        if dropped:
+            self.display_text.delete('1.0', f'{dropped + 1}.0')
         self.display_text.see(tk.END) # Scroll to the bottom
         self.display_text.config(state='disabled')
 
-    def update_display_with_history(self):
+    def _render_display(self, top_line=None, see_line=None):
+        """Redraws the widget from the view, with top_line (1-based) at the top, see_line in view, or the bottom shown."""
+        texts = self.view.texts()
         self.display_text.config(state='normal')
-        self.display_text.delete(1.0, tk.END) # Clear existing text
-        for entry in config.CONVERSATION_HISTORY:
-            role = "You" if entry["role"] == "user" else "Marco"
-            self.display_text.insert(tk.END, f"{role}: {entry['content']}\n")
-        self.display_text.see(tk.END)
+        self.display_text.delete('1.0', tk.END)
+        if texts:
+            self.display_text.insert('1.0', "\n".join(texts) + "\n")
+        if top_line is not None:
+            self.display_text.yview(f'{max(1, top_line)}.0')
+        else:
+            self.display_text.see(tk.END if see_line is None else f'{max(1, see_line)}.0')
         self.display_text.config(state='disabled')
 
+    def _on_display_scroll(self, first, last):
+        self.display_text.vbar.set(first, last)
+        if self._paging:
+            return
+        if float(first) <= 0.0 and self.view.has_older:
+            self._paging = True
+            self.master.after_idle(self._load_older_lines)
+        elif float(last) >= 1.0 and self.view.detached:
+            self._paging = True
+            self.master.after_idle(self._load_newer_lines)
+
+    def _load_older_lines(self):
+        """Pages in the turns before the oldest one shown when the user scrolls past the top."""
+        try:
+            added = self.view.page_older()
+            if added:
+                # Keep the line the user was looking at in place
+                self._render_display(top_line=added + 1)
+        finally:
+            self._paging = False
+
+    def _load_newer_lines(self):
+        """Pages the newer turns back in when the user scrolls past the bottom after scrolling back."""
+        try:
+            lines_before = self.view.lines
+            dropped = self.view.page_newer()
+            if self.view.lines != lines_before or dropped:
+                # Keep the last line the user was looking at in view
+                self._render_display(see_line=lines_before - dropped)
+        finally:
+            self._paging = False
+
     def send_text_command(self, event=None):
         if self.current_input_mode != "text":
             messagebox.showwarning("Input Mode Error", "Please switch to 'Text' input mode to type commands.")
@@ -136,9 +248,11 @@ class MarcoGUI:
         command = self.command_entry.get()
         self.command_entry.delete(0, tk.END)
         if command:
-            self.update_display(f"You: {command}")
+            self._echo_command(command)
             self.status_label.config(text="Processing typed command...")
-            self.command_queue.put(command) # Put command into queue for background processing
+            flush_speech() # Barge-in: a new command cuts off whatever Marco is still saying
+            with tracing.trace(source="text"):
+                self.scheduler.submit(command) # Processed in the background
         else:
             self.status_label.config(text="No command entered.")
 
@@ -148,6 +262,10 @@ class MarcoGUI:
             return
             
         self.status_label.config(text="Listening for voice...")
+        flush_speech() # Stop talking so Marco does not hear itself
+        if not self._start_audio_capture():
+            return
+        self.audio_capture.clear() # Drop anything heard before the button was pressed
         # Disable voice button while listening to prevent multiple threads
         self.voice_button.config(state='disabled')
         self.master.update_idletasks() # Force UI update immediately
@@ -156,124 +274,156 @@ class MarcoGUI:
         threading.Thread(target=self._listen_for_voice_command, daemon=True).start()
 
     def _listen_for_voice_command(self):
-        r = config.get_recognizer()
+        import speech_recognition as sr # Only voice sessions pay for loading it
+        r = get_recognizer()
         if not r:
-            self.response_queue.put("Recognizer not initialized.")
+            self.post_status("Recognizer not initialized.")
+            self._voice_input_done()
             return
 
-        try:
-            with sr.Microphone() as source:
-                r.adjust_for_ambient_noise(source, duration=0.5)
-
+        with tracing.trace(source="voice"): # Capture, recognition and the command share one trace
+            try:
                 if self.listening_for_activation:
-                    self.status_label.config(text="Say 'Marco' to activate...")
-                    audio_data = r.listen(source, timeout=10, phrase_time_limit=7)
-                    word = recognize_speech(audio_data)
-                    self.update_display(f"Heard activation attempt: '{word}'")
+                    self._set_status("Say 'Marco' to activate...")
+                    utterance = self._wait_for_utterance(timeout=10)
+
+                    # Spot the wake word locally first so unrelated speech never reaches the cloud recognizer
+                    detector = get_wake_word_detector()
+                    if detector and not detector.detect(utterance):
+                        heard, command = False, ""
+                        self.dispatcher.post(self.update_display, "Heard activation attempt: wake word not detected")
+                    else:
+                        # A single recognition covers both the wake word and the command ("Marco, play lofi")
+                        transcript = recognize_speech(utterance.to_audio_data())
+                        self.dispatcher.post(self.update_display, f"Heard activation attempt: '{transcript}'")
+                        heard, command = split_wake_word(transcript)
 
-                    if "marco" in word:
-                        self.response_queue.put("The Chosen One is Active. Your command, please.")
+                    if heard and command:
+                        self.listening_for_activation = False
+                        self._submit_voice_command(command)
+                        self._voice_input_done()
+                    elif heard:
+                        self.post_status("The Chosen One is Active. Your command, please.")
                         self.listening_for_activation = False
                         # Now listen for the actual command
                         self._listen_for_actual_command()
                     else:
-                        self.response_queue.put("Activation word not detected. Say 'Marco' again or switch mode.")
-                        self.master.after(10, lambda: self.voice_button.config(state='normal')) # Re-enable button safely
-                        self.master.after(10, lambda: self.status_label.config(text="Ready. (Voice Mode)"))
+                        self.post_status("Activation word not detected. Say 'Marco' again or switch mode.")
+                        self._voice_input_done()
                         self.listening_for_activation = True # Keep listening for activation
                 else:
                     # Already activated, listen for command directly
                     self._listen_for_actual_command()
 
-        except sr.UnknownValueError:
-            self.response_queue.put("Voice command not clearly understood. Please try again.")
-            self.listening_for_activation = False # Assume it's a command after activation
-            self.master.after(10, lambda: self.voice_button.config(state='normal'))
-            self.master.after(10, lambda: self.status_label.config(text="Ready. (Voice Mode)"))
-        except sr.WaitTimeoutError:
-            self.response_queue.put("No speech detected within the timeout. Say 'Marco' to activate or give command.")
-            self.listening_for_activation = True # Go back to activation state
-            self.master.after(10, lambda: self.voice_button.config(state='normal'))
-            self.master.after(10, lambda: self.status_label.config(text="Ready. (Voice Mode)"))
-        except Exception as e:
-            self.response_queue.put(f"An unexpected error during voice input: {e}")
-            self.master.after(10, lambda: self.voice_button.config(state='normal'))
-            self.master.after(10, lambda: self.status_label.config(text="Ready. (Voice Mode)"))
+            except sr.UnknownValueError:
+                self.post_status("Voice command not clearly understood. Please try again.")
+                self.listening_for_activation = False # Assume it's a command after activation
+                self._voice_input_done()
+            except sr.WaitTimeoutError:
+                self.post_status("No speech detected within the timeout. Say 'Marco' to activate or give command.")
+                self.listening_for_activation = True # Go back to activation state
+                self._voice_input_done()
+            except Exception as e:
+                self.post_status(f"An unexpected error during voice input: {e}", fixed=False)
+                self._voice_input_done()
 
 
     def _listen_for_actual_command(self):
-        r = config.get_recognizer()
+        import speech_recognition as sr
         try:
-            self.status_label.config(text="Listening for command...")
-            
-            # --- FIX APPLIED HERE ---
-            with sr.Microphone() as source:
-                r.adjust_for_ambient_noise(source, duration=0.5) 
-                audio_data = r.listen(source, timeout=10, phrase_time_limit=8)
-            # --- END FIX ---
+            self._set_status("Listening for command...")
+            # The stream is already open and calibrated, just wait for the next phrase
+            audio_data = self._wait_for_utterance(timeout=10).to_audio_data()
 
             command = recognize_speech(audio_data)
-            self.update_display(f"You: {command}")
-
+            heard, rest = split_wake_word(command)
+            if heard and rest:
+                command = rest # "Marco, ..." said again while already active
             if command:
-                self.status_label.config(text="Processing voice command...")
-                self.command_queue.put(command) # Put command into queue
+                self._submit_voice_command(command)
             else:
-                self.response_queue.put("Command not recognized. Please try again.")
+                self.dispatcher.post(self._echo_command, command)
+                self.post_status("Command not recognized. Please try again.")
 
         except sr.UnknownValueError:
-            self.response_queue.put("Command not clearly understood. Please try again.")
+            self.post_status("Command not clearly understood. Please try again.")
         except sr.WaitTimeoutError:
-            self.response_queue.put("No command received. Returning to activation state.")
+            self.post_status("No command received. Returning to activation state.")
             self.listening_for_activation = True
         except Exception as e:
-            self.response_queue.put(f"An error occurred while getting command: {e}")
+            self.post_status(f"An error occurred while getting command: {e}", fixed=False)
         finally:
-            self.master.after(10, lambda: self.voice_button.config(state='normal')) # Re-enable button safely
-            self.master.after(10, lambda: self.status_label.config(text="Ready. (Voice Mode)"))
+            self._voice_input_done()
 
 
-    def process_commands_from_queue(self):
+    def _voice_input_done(self):
+        """Re-enables the Speak button once a voice interaction is over. Safe from any thread."""
+        self.dispatcher.post(self.voice_button.config, state='normal')
+        self._set_status("Ready. (Voice Mode)")
+
+    def _set_status(self, text):
+        """Updates the status bar from any thread."""
+        self.dispatcher.post(self.status_label.config, text=text)
+
+    def post_status(self, message, fixed=True):
         """
-        Runs in a separate thread to process commands from the command_queue.
+        Shows (and speaks) a status message from any thread.
+        Fixed messages are replayed from the phrase cache; pass fixed=False for ones with variable text.
         """
-        while True:
-            try:
-                command = self.command_queue.get(timeout=1.0) # Wait for a command
-                if command:
-                    # Call the core processing function
-                    result = process_command(command)
-                    if result == "exit_program":
-                        self.master.quit() # Exit Tkinter application
-                        break # Stop this thread
-
-                    # After command processing, ensure display is updated with Marco's response
-                    # This is crucial for LLM responses and direct actions
-                    self.master.after(100, self.update_display_with_history) # Schedule update on main thread
-                    self.response_queue.put("Command processed.") # Indicate completion
-                self.command_queue.task_done()
-            except queue.Empty:
-                time.sleep(0.1) # Small sleep if queue is empty to avoid busy-waiting
-            except Exception as e:
-                self.response_queue.put(f"Error in processing thread: {e}")
-                self.command_queue.task_done()
+        self.dispatcher.post(self._show_status, message, fixed)
+
+    def _submit_voice_command(self, command):
+        if command == "stop":
+            command = "marco stop" # "Marco, stop" had its wake word split off but is still the stop command
+        self.dispatcher.post(self._echo_command, command)
+        self._set_status("Processing voice command...")
+        flush_speech() # Barge-in: a new command cuts off whatever Marco is still saying
+        self.scheduler.submit(command)
+
+    def _on_command_result(self, job):
+        """Called by the scheduler, in submission order, when a command finishes or is cancelled."""
+        if job.result == "exit_program":
+            self.dispatcher.post(self._exit_program) # Shut down from the Tk thread, never from inside a delivery
+            return
+
+        # After command processing, ensure display is updated with Marco's response
+        # This is crucial for LLM responses and direct actions
+        self.dispatcher.post(self.update_display_with_history)
+        if job.error is not None:
+            self.post_status(f"Error in processing thread: {job.error}", fixed=False)
+        elif job.result != CANCELLED:
+            self.post_status("Command processed.") # Indicate completion
 
-    def check_response_queue(self):
+    def _exit_program(self):
+        self.scheduler.shutdown()
+        self.master.quit() # Exit Tkinter application
+
+    def show_latency_metrics(self, event=None):
+        """
+        Shows rolling p50/p95/p99 latencies per stage for the commands traced this session,
+        followed by the circuit breaker state of each network dependency.
+        """
+        lines = tracing.format_summary(tracing.METRICS.summary())
+        breakers = breaker_states()
+        if breakers:
+            lines.append("")
+            for name, state in sorted(breakers.items()):
+                lines.append(f"{name:<10} {state['state']:<10} failures {state['consecutive_failures']}  "
+                             f"trips {state['trips']}  rejected {state['rejected']}  retries {state['retries']}")
+        window = tk.Toplevel(self.master)
+        window.title("Latency per stage (ms)")
+        text = tk.Text(window, font=('Courier New', 9), width=max(map(len, lines)) + 2, height=len(lines) + 1)
+        text.insert(tk.END, "\n".join(lines) if len(lines) > 1 else "No commands traced yet.")
+        text.config(state='disabled')
+        text.pack(fill=tk.BOTH, expand=True)
+
+    def _show_status(self, message, fixed=True):
         """
-        Checks the response queue periodically and updates the GUI.
+        Updates the status bar with a message posted by a background thread.
         Runs in the main Tkinter thread.
         """
-        try:
-            message = self.response_queue.get_nowait()
-            if message == "Command processed.":
-                self.status_label.config(text="Ready.")
-            else:
-                self.status_label.config(text=message)
-                speak(message) # Speak the status messages from the queue too
-            self.response_queue.task_done()
-        except queue.Empty:
-            pass # No message in queue
-        except Exception as e:
-            print(f"Error checking response queue: {e}")
-        finally:
-            self.master.after(100, self.check_response_queue) # Check again after 100ms
\ No newline at end of file
+        if message == "Command processed.":
+            self.status_label.config(text="Ready.")
+        else:
+            self.status_label.config(text=message)
+            speak(message, cache=fixed) # Speak the status messages too (queued, does not block the UI)
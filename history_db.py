@@ -0,0 +1,313 @@
+# history_db.py
+"""
+Durable conversation history: an append-only SQLite log in WAL mode.
+
+Turns are queued by append() and written in batches by a background thread, so neither the UI thread
+nor the command workers wait on disk. Reads open their own connection per thread (WAL lets them run
+alongside the writer) and are always paged: the most recent window at startup, older pages on
+scroll-back, and a full-text search over everything.
+
+    python history_db.py --search "capital of australia"
+    python history_db.py --stats
+"""
+import os
+import sys
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+
+HISTORY_DB_ENABLED = True
+HISTORY_DB_PATH = os.path.join(os.path.expanduser("~"), ".marco", "history.db")
+HISTORY_STARTUP_WINDOW = 200 # Most recent turns loaded into memory at startup
+HISTORY_PAGE_SIZE = 100 # Turns read at a time when scrolling back
+WRITE_BATCH_SIZE = 64 # Turns written per transaction at most
+WRITE_FLUSH_INTERVAL = 0.5 # Seconds the writer waits to gather a batch once a turn is queued
+DEFAULT_CONVERSATION = "default"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    retracted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation, id);
+CREATE TABLE IF NOT EXISTS summaries (
+    conversation TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    through_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(content, content='turns', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+
+def _row_to_turn(row):
+    return {"id": row[0], "role": row[1], "content": row[2], "created_at": row[3]}
+
+
+class HistoryDB:
+    """
+    Append-only store of conversation turns. Turns are never updated, except for the retracted flag
+    set when an unanswered message is discarded (see ConversationStore.discard_last_user_message),
+    which hides it from every read.
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local() # Read connection per thread
+        self._queue = queue.Queue()
+        self._closed = False
+        self.written = 0
+        self.batches = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        else:
+            # Every connection to ":memory:" is a separate database, share one instead
+            self.path = f"file:marco-history-{id(self)}?mode=memory&cache=shared"
+        self._writer_connection = self._connect()
+        self._writer_connection.executescript(_SCHEMA)
+        try:
+            self._writer_connection.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            self.full_text = False # SQLite built without FTS5, search falls back to LIKE
+        self._writer_connection.commit()
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, uri=self.path.startswith("file:"), check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL") # Durable across crashes of the app, not of the OS
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    # --- Writes (batched on the writer thread) ---
+
+    def append(self, turn, conversation=DEFAULT_CONVERSATION):
+        """
+        Queues a history entry ({"role", "content"}) for writing. Once written, its row id is stored
+        in turn["id"], which is how a later retract() finds it.
+        """
+        if not self._closed:
+            self._queue.put(("append", conversation, turn, time.time()))
+
+    def retract(self, turn):
+        """Hides a turn queued by append(), e.g. a question the LLM never answered."""
+        if not self._closed:
+            self._queue.put(("retract", None, turn, None))
+
+    def save_summary(self, summary, through_id, conversation=DEFAULT_CONVERSATION):
+        """
+        Queues the running summary of a conversation, covering its turns up to row id through_id,
+        so the next startup loads it instead of summarizing those turns again.
+        """
+        if not self._closed:
+            self._queue.put(("summary", conversation, (summary, through_id), time.time()))
+
+    def flush(self, timeout=5.0):
+        """Blocks until everything queued so far has been written. Returns False on timeout."""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", None, done, None))
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Writes what is still queued and stops the writer."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Gather whatever else arrives shortly after, so a burst of turns is one transaction
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] != "flush":
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+                if batch[-1] is None:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            self._write_batch(batch)
+            if stop:
+                break
+        self._writer_connection.close()
+
+    def _write_batch(self, batch):
+        waiting = []
+        try:
+            with self._writer_connection:
+                cursor = self._writer_connection.cursor()
+                for kind, conversation, turn, created_at in batch:
+                    if kind == "append":
+                        cursor.execute(
+                            "INSERT INTO turns (conversation, role, content, created_at) VALUES (?, ?, ?, ?)",
+                            (conversation, turn["role"], turn["content"], created_at))
+                        turn["id"] = cursor.lastrowid
+                        self.written += 1
+                    elif kind == "retract" and "id" in turn:
+                        cursor.execute("UPDATE turns SET retracted = 1 WHERE id = ?", (turn["id"],))
+                    elif kind == "summary":
+                        cursor.execute(
+                            "INSERT OR REPLACE INTO summaries (conversation, summary, through_id, updated_at) "
+                            "VALUES (?, ?, ?, ?)", (conversation, turn[0], turn[1], created_at))
+                    elif kind == "flush":
+                        waiting.append(turn)
+            self.batches += 1
+        except sqlite3.Error as e:
+            print(f"Could not write conversation history: {e}")
+        for done in waiting:
+            done.set()
+
+    # --- Reads (paged) ---
+
+    def recent(self, limit=HISTORY_STARTUP_WINDOW, conversation=DEFAULT_CONVERSATION):
+        """Returns the most recent turns of a conversation, oldest first."""
+        return self.page(None, limit, conversation)
+
+    def page(self, before_id=None, limit=HISTORY_PAGE_SIZE, conversation=DEFAULT_CONVERSATION):
+        """Returns up to limit turns older than before_id (the newest ones if None), oldest first."""
+        query = "SELECT id, role, content, created_at FROM turns WHERE conversation = ? AND retracted = 0"
+        params = [conversation]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        rows = self._reader().execute(query, params).fetchall()
+        return [_row_to_turn(row) for row in reversed(rows)]
+
+    def load_summary(self, conversation=DEFAULT_CONVERSATION):
+        """Returns (summary, through_id) saved by save_summary(), or None."""
+        row = self._reader().execute("SELECT summary, through_id FROM summaries WHERE conversation = ?",
+                                     (conversation,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def page_after(self, after_id, limit=HISTORY_PAGE_SIZE, conversation=DEFAULT_CONVERSATION):
+        """Returns up to limit turns newer than after_id, oldest first (paging forward again after scroll-back)."""
+        rows = self._reader().execute(
+            "SELECT id, role, content, created_at FROM turns WHERE conversation = ? AND retracted = 0 AND id > ? "
+            "ORDER BY id LIMIT ?", (conversation, after_id, limit)).fetchall()
+        return [_row_to_turn(row) for row in rows]
+
+    def search(self, text, limit=20, conversation=None):
+        """Returns the turns matching text, most recent first."""
+        params = []
+        if self.full_text:
+            # Quote every word so user input is never parsed as FTS5 query syntax
+            words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+            if not words:
+                return []
+            query = ("SELECT t.id, t.role, t.content, t.created_at FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid "
+                     "WHERE turns_fts MATCH ? AND t.retracted = 0")
+            params.append(" ".join(words))
+        else:
+            query = "SELECT id, role, content, created_at FROM turns t WHERE content LIKE ? AND retracted = 0"
+            params.append(f"%{text}%")
+        if conversation is not None:
+            query += " AND t.conversation = ?"
+            params.append(conversation)
+        query += " ORDER BY t.id DESC LIMIT ?"
+        params.append(limit)
+        return [_row_to_turn(row) for row in self._reader().execute(query, params).fetchall()]
+
+    def count(self, conversation=DEFAULT_CONVERSATION):
+        return self._reader().execute("SELECT COUNT(*) FROM turns WHERE conversation = ? AND retracted = 0",
+                                      (conversation,)).fetchone()[0]
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'turns': self._reader().execute("SELECT COUNT(*) FROM turns WHERE retracted = 0").fetchone()[0],
+            'full_text': self.full_text,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+        }
+
+
+_db = None
+_db_lock = threading.Lock()
+
+def get_history_db():
+    """Returns the shared HistoryDB, or None if persistence is disabled or the database cannot be opened."""
+    global _db
+    if not HISTORY_DB_ENABLED:
+        return None
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                try:
+                    _db = HistoryDB()
+                except (sqlite3.Error, OSError) as e:
+                    print(f"Could not open conversation history database, history will not be saved: {e}")
+                    return None
+    return _db
+
+def close_history_db():
+    """Writes out the turns still queued. Called at exit."""
+    if _db is not None:
+        _db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the saved conversation history")
+    parser.add_argument("--search", help="words to look for in past turns")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--stats", action="store_true", help="print the number of saved turns")
+    parser.add_argument("--file", default=HISTORY_DB_PATH)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.file):
+        print(f"No conversation history at {args.file}")
+        return 1
+    db = HistoryDB(args.file)
+    try:
+        if args.stats or not args.search:
+            for name, value in db.stats().items():
+                print(f"{name}: {value}")
+        if args.search:
+            for turn in db.search(args.search, args.limit):
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(turn["created_at"]))
+                role = "You" if turn["role"] == "user" else "Marco"
+                print(f"[{when}] {role}: {turn['content']}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# intent_classifier.py
+"""
+Local intent classifier for commands the router's trigger phrases miss ("put on some lofi",
+"shut up the music"), so they run the matching action instead of making a Gemini round trip.
+
+Each intent has example utterances. Examples and input are turned into character n-gram TF-IDF
+vectors (robust to typos, contractions and word order) and the input takes the intent of its most
+similar example, if the cosine similarity clears the threshold and beats the runner-up intent by a
+margin. Intents without a rewrite (e.g. general questions) only serve as negative examples: inputs
+closest to them stay with the LLM. NumPy is used for the similarity when installed, otherwise an
+inverted index over the n-grams does the same in pure Python; both take well under a millisecond.
+"""
+import re
+import math
+import threading
+from collections import Counter
+
+INTENT_THRESHOLD = 0.55 # Minimum cosine similarity to the nearest example
+INTENT_MARGIN = 0.05 # Required lead over the best example of any other intent
+NGRAM_MIN = 2
+NGRAM_MAX = 4
+USE_NUMPY = True # Vectorized scoring when numpy is importable
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+def normalize(text):
+    """Lowercases, drops apostrophes and punctuation, and collapses whitespace."""
+    return " ".join(_NON_WORD.sub(" ", text.lower().replace("'", "")).split())
+
+def char_ngrams(text, n_min=NGRAM_MIN, n_max=NGRAM_MAX):
+    """Counts the character n-grams of normalized text, padded so word starts and ends are n-grams too."""
+    padded = f" {normalize(text)} "
+    return Counter(padded[i:i + n] for n in range(n_min, n_max + 1) for i in range(len(padded) - n + 1))
+
+
+class Intent:
+    """
+    An intent, its example utterances and rewrite(command), which returns the command to run
+    instead (e.g. "play lofi"), or None when the command lacks what the action needs.
+    threshold overrides the classifier's, e.g. lower for intents whose rewrite checks the phrasing itself.
+    """
+
+    def __init__(self, name, examples, rewrite=None, threshold=None):
+        if not examples:
+            raise ValueError(f"Intent {name!r} needs at least one example")
+        self.name = name
+        self.examples = list(examples)
+        self.rewrite = rewrite
+        self.threshold = threshold
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, {len(self.examples)} examples)"
+
+
+class IntentMatch:
+    def __init__(self, intent, score, runner_up, command=None):
+        self.intent = intent
+        self.score = score
+        self.runner_up = runner_up
+        self.command = command # The rewritten command, None if the input stays with the LLM
+
+    def __repr__(self):
+        return f"IntentMatch({self.intent.name!r}, score={self.score:.3f}, command={self.command!r})"
+
+
+class IntentClassifier:
+    """Nearest-example classifier over character n-gram TF-IDF vectors. Built lazily on first use."""
+
+    def __init__(self, intents, threshold=INTENT_THRESHOLD, margin=INTENT_MARGIN, use_numpy=USE_NUMPY):
+        self.intents = list(intents)
+        self.threshold = threshold
+        self.margin = margin
+        self.use_numpy = use_numpy
+        self._fitted = False
+        self._lock = threading.Lock()
+        self._np = None
+
+    def ensure_fitted(self):
+        if not self._fitted:
+            with self._lock:
+                if not self._fitted:
+                    self.fit()
+
+    def fit(self):
+        """Computes the IDF weights and the normalized example vectors."""
+        labels, counts = [], []
+        for intent_index, intent in enumerate(self.intents):
+            for example in intent.examples:
+                labels.append(intent_index)
+                counts.append(char_ngrams(example))
+
+        document_frequency = Counter()
+        for grams in counts:
+            document_frequency.update(grams.keys())
+        total = len(counts)
+        self._idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+        self._vocabulary = {gram: index for index, gram in enumerate(self._idf)}
+        self._labels = labels
+        vectors = [self._weights(grams) for grams in counts]
+
+        np = None
+        if self.use_numpy:
+            try:
+                import numpy as np
+            except ImportError:
+                np = None
+        self._np = np
+        if np is not None:
+            # Vocabulary x examples, so a query gathers the rows of its n-grams and takes one dot product
+            matrix = np.zeros((len(self._vocabulary), total), dtype=np.float32)
+            for example_index, vector in enumerate(vectors):
+                for gram, weight in vector.items():
+                    matrix[self._vocabulary[gram], example_index] = weight
+            self._matrix = matrix
+            # Examples are grouped by intent, so each intent's best score is one reduceat segment
+            self._starts = np.searchsorted(np.array(labels), np.arange(len(self.intents)))
+        else:
+            self._postings = {}
+            for example_index, vector in enumerate(vectors):
+                for gram, weight in vector.items():
+                    self._postings.setdefault(gram, []).append((example_index, weight))
+        self._fitted = True
+
+    def _weights(self, grams):
+        """L2-normalized sublinear TF-IDF weights of the n-grams known to the vocabulary."""
+        weights = {gram: (1 + math.log(count)) * self._idf[gram] for gram, count in grams.items() if gram in self._idf}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {gram: w / norm for gram, w in weights.items()} if norm else {}
+
+    def _example_scores(self, text):
+        """Cosine similarity of text to every example."""
+        query = self._weights(char_ngrams(text))
+        if self._np is not None:
+            if not query:
+                return self._np.zeros(len(self._labels), dtype=self._np.float32)
+            rows = [self._vocabulary[gram] for gram in query]
+            weights = self._np.fromiter(query.values(), dtype=self._np.float32, count=len(query))
+            return weights @ self._matrix[rows]
+        scores = [0.0] * len(self._labels)
+        for gram, weight in query.items():
+            for example_index, example_weight in self._postings[gram]:
+                scores[example_index] += weight * example_weight
+        return scores
+
+    def scores(self, text):
+        """Returns {intent name: similarity of its nearest example}."""
+        self.ensure_fitted()
+        example_scores = self._example_scores(text)
+        if self._np is not None:
+            best = self._np.maximum.reduceat(example_scores, self._starts).tolist()
+        else:
+            best = [0.0] * len(self.intents)
+            for label, score in zip(self._labels, example_scores):
+                if score > best[label]:
+                    best[label] = score
+        return {intent.name: score for intent, score in zip(self.intents, best)}
+
+    def classify(self, command):
+        """
+        Returns the IntentMatch of the most similar intent, with .command set to the command to run
+        instead if the match is confident and the intent can rewrite it. Returns None for empty input.
+        An intent whose rewrite gives up on the command is ruled out, and the next most similar intent
+        is considered instead ("add this song to the queue" can be closest to a "play" example).
+        """
+        scores = self.scores(command)
+        ranked = sorted(zip(scores.values(), range(len(self.intents))), reverse=True)
+        if not ranked or ranked[0][0] <= 0:
+            return None
+        lowered = command.lower()
+        for position, (score, index) in enumerate(ranked):
+            intent = self.intents[index]
+            rewritten = None if intent.rewrite is None else intent.rewrite(lowered)
+            if intent.rewrite is not None and rewritten is None:
+                continue
+            runner_up = ranked[position + 1][0] if position + 1 < len(ranked) else 0.0
+            match = IntentMatch(intent, score, runner_up)
+            threshold = self.threshold if intent.threshold is None else intent.threshold
+            if rewritten is not None and score >= threshold and score - runner_up >= self.margin:
+                match.command = rewritten
+            return match
+        score, index = ranked[0]
+        return IntentMatch(self.intents[index], score, ranked[1][0] if len(ranked) > 1 else 0.0)
@@ -1,49 +1,158 @@
 # llm_interaction.py
-import config # To access GEMINI_MODEL and CONVERSATION_HISTORY
+import re
+import config # To access GEMINI_MODEL
+from conversation import get_store # Conversation history and the token-budgeted Gemini messages
+from cancellation import current_token, CommandCancelled
+import tracing
+import response_cache # Answers to repeated questions
+import resilience # Deadline, retries and circuit breaker for Gemini
+from resilience import CircuitOpen, DeadlineExceeded
 from tts_stt import speak # For speaking LLM responses
 
-def get_gemini_response(user_input):
+STREAM_RESPONSES = True # Speak Gemini replies sentence by sentence while they are still being generated
+MIN_SENTENCE_CHARS = 20 # Very short fragments ("Yes.", "Dr.") are merged into the next sentence
+STREAM_CHUNK_TIMEOUT = 10 # Seconds to wait for the next chunk of a streamed reply before giving up
+
+# A sentence ends at . ! or ? (optionally followed by closing quotes/brackets) and then whitespace
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+def iter_sentences(chunks):
+    """
+    Yields complete sentences from an iterable of text chunks as soon as they are available.
+    Whatever is left when the chunks run out is yielded as the final sentence.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            if match.end() - start < MIN_SENTENCE_CHARS:
+                continue # Too short to speak on its own, keep it with the next sentence
+            sentence = buffer[start:match.end()].strip()
+            start = match.end()
+            if sentence:
+                yield sentence
+        buffer = buffer[start:]
+
+    tail = buffer.strip()
+    if tail:
+        yield tail
+
+def _chunk_texts(response, collected):
+    """Yields the text of each streamed response chunk, recording it in collected."""
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            continue # Chunk carried no text (e.g. only safety metadata)
+        collected.append(text)
+        yield text
+
+def _speak_streamed_response(response):
+    """
+    Speaks a streamed Gemini response one sentence at a time.
+    Returns the full response text once the stream is complete.
+    """
+    collected = []
+    llm_span = tracing.current_span()
+    chunks = resilience.iter_with_deadline(response, STREAM_CHUNK_TIMEOUT, "gemini")
+    for sentence in iter_sentences(_chunk_texts(chunks, collected)):
+        current_token().raise_if_cancelled() # Stop reading the stream once the command is cancelled
+        if llm_span is not None and "first_sentence_ms" not in llm_span.attrs:
+            llm_span.set(first_sentence_ms=round(llm_span.duration * 1000, 3))
+        speak(sentence)
+    return "".join(collected)
+
+def _response_cache_key(store, user_input):
+    """Returns the response cache key for user_input, or None if its answer should not be cached."""
+    if not response_cache.RESPONSE_CACHE_ENABLED or response_cache.is_time_sensitive(user_input):
+        return None
+    # Self-contained questions only depend on the persona and the summary, so they are answered again
+    # after unrelated turns. Follow-ups ("why?", "tell me more") are only reused when the whole
+    # conversation so far is the same.
+    if response_cache.is_context_dependent(user_input):
+        context = store.messages()
+    else:
+        context = store.stable_messages()
+    model = getattr(config.GEMINI_MODEL, "model_name", None)
+    return response_cache.cache_key(user_input, response_cache.context_fingerprint([model, context]))
+
+def _speak_cached_response(text):
+    for sentence in iter_sentences([text]):
+        current_token().raise_if_cancelled()
+        speak(sentence)
+
+def get_gemini_response(user_input, stream=None, use_cache=True):
     """
     Sends user input to the Gemini model and processes the response.
-    Manages conversation history using config.CONVERSATION_HISTORY.
+    Manages conversation history through the conversation store (config.CONVERSATION_HISTORY).
+    When streaming, each sentence is spoken as soon as it has been generated.
+    Repeated questions are answered from the response cache unless use_cache is False.
     """
+    if stream is None:
+        stream = STREAM_RESPONSES
+
+    store = get_store()
+    key = _response_cache_key(store, user_input) if use_cache else None # Before this turn joins the context
     # Append user input to conversation history
-    config.CONVERSATION_HISTORY.append({"role": "user", "content": user_input})
+    store.append("user", user_input)
 
     try:
-        print("Sending command to Gemini Pro LLM...")
-
-        # Prepare chat messages for Gemini
-        gemini_chat_messages = []
-        for msg in config.CONVERSATION_HISTORY:
-            if msg["role"] == "user":
-                gemini_chat_messages.append({'role': 'user', 'parts': [msg["content"]]})
-            elif msg["role"] == "assistant":
-                gemini_chat_messages.append({'role': 'model', 'parts': [msg["content"]]})
-            elif msg["role"] == "system":
-                # System messages are typically handled by defining the model's persona
-                # For this specific structure, we'll treat it as a user prompt for the model
-                gemini_chat_messages.append({'role': 'user', 'parts': [msg["content"]]})
-
-
-        response = config.GEMINI_MODEL.generate_content(
-            gemini_chat_messages,
-            generation_config=config.genai.types.GenerationConfig( # Access genai from config
-                max_output_tokens=150,
-                temperature=0.7
-            )
-        )
-
-        llm_response = response.text
-        print(f"LLM Response: {llm_response}")
-        speak(llm_response)
+        cached = None
+        if key is not None:
+            with tracing.span("llm.cache") as cache_span:
+                cached = response_cache.get_response_cache().get(key)
+                cache_span.set(hit=cached is not None)
+
+        if cached is not None:
+            print(f"LLM Response (from cache): {cached}")
+            _speak_cached_response(cached)
+            llm_response = cached
+        else:
+            print("Sending command to Gemini Pro LLM...")
+
+            # Messages are converted once when appended and kept within the token budget
+            gemini_chat_messages = store.messages()
+
+            with tracing.span("llm.generate", stream=stream, context_tokens=store.token_count()):
+                # Retried (before anything is spoken) and failed fast while Gemini is down
+                response = resilience.call(
+                    "gemini", config.GEMINI_MODEL.generate_content,
+                    gemini_chat_messages,
+                    generation_config=config.genai.types.GenerationConfig( # Access genai from config
+                        max_output_tokens=150,
+                        temperature=0.7
+                    ),
+                    stream=stream
+                )
+
+                if stream:
+                    llm_response = _speak_streamed_response(response)
+                    print(f"LLM Response: {llm_response}")
+                else:
+                    llm_response = response.text
+                    print(f"LLM Response: {llm_response}")
+                    speak(llm_response)
+
+            if key is not None and llm_response.strip():
+                response_cache.get_response_cache().put(key, llm_response)
 
         # Append assistant's response to conversation history
-        config.CONVERSATION_HISTORY.append({"role": "assistant", "content": llm_response})
+        store.append("assistant", llm_response)
 
+    except CommandCancelled:
+        store.discard_last_user_message()
+        raise
+    except CircuitOpen as e:
+        speak("My AI model is unavailable at the moment. Please try again in a little while.", cache=True)
+        print(f"Gemini LLM unavailable: {e}")
+        store.discard_last_user_message()
+    except DeadlineExceeded as e:
+        speak("My AI model is taking too long to respond. Please try again.", cache=True)
+        print(f"Gemini LLM timeout: {e}")
+        store.discard_last_user_message()
     except Exception as e:
-        speak("I am unable to process that request with my AI model at this moment. An anomaly has occurred.")
+        speak("I am unable to process that request with my AI model at this moment. An anomaly has occurred.", cache=True)
         print(f"Gemini LLM Error: {e}")
         # If an error occurs, remove the last user message to avoid polluting history
-        if config.CONVERSATION_HISTORY and config.CONVERSATION_HISTORY[-1]["role"] == "user":
-            config.CONVERSATION_HISTORY.pop()
\ No newline at end of file
+        store.discard_last_user_message()
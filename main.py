@@ -1,32 +1,128 @@
 # main.py
-import tkinter as tk
-import speech_recognition as sr
-import pyttsx3
+import startup # Imported first so the startup clock starts as early as possible
 import sys
+import argparse
 
-# Import custom modules
-import config
-from media_player import init_vlc # Only need this for initial setup
-from gui_interface import MarcoGUI # Import your new GUI class
+WARM_UP_IN_BACKGROUND = True # Initialize speech, VLC and yt_dlp on a background thread once the window is shown
 
-def main():
-    # --- GLOBAL INITIALIZATIONS ---
-    # Initialize pyttsx3 engine and store its instance in config
-    # This must be done on the main thread
-    engine = pyttsx3.init()
-    config.set_engine(engine)
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Marco AI Assistant")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print per-module import and initialization times once startup has finished")
+    parser.add_argument("--server", action="store_true",
+                        help="run headless, serving commands over HTTP/WebSocket instead of opening the window")
+    parser.add_argument("--host", default=None, help="address the server listens on (with --server)")
+    parser.add_argument("--port", type=int, default=None, help="port the server listens on (with --server)")
+    parser.add_argument("--batch", metavar="FILE", default=None,
+                        help="run the commands in FILE (or - for stdin) without the window, printing JSON lines")
+    parser.add_argument("--speak", action="store_true", help="speak the results aloud (with --batch)")
+    parser.add_argument("--keep-playing", action="store_true",
+                        help="with --batch, wait for music started by the commands to finish before exiting")
+    return parser.parse_args(argv)
 
-    # Initialize SpeechRecognizer and store its instance in config
-    r = sr.Recognizer()
-    config.set_recognizer(r)
+def warm_up_tasks():
+    """Subsystems that are otherwise initialized on first use, in the order they are warmed up."""
+    from tts_stt import start_speech_worker, get_recognizer, prerender_phrases
+    from media_player import init_vlc
+    from news_api import start_news_prefetch
+    from stream_resolver import get_stream_resolver
+    from assistant_actions import ROUTER
+    return [
+        ("speech worker (pyttsx3)", lambda: start_speech_worker().wait_ready()),
+        ("speech recognizer", get_recognizer),
+        ("phrase cache", prerender_phrases), # Renders on the speech worker when it is idle
+        ("vlc", init_vlc),
+        ("stream resolver (yt_dlp)", get_stream_resolver),
+        ("intent classifier", ROUTER.classifier.ensure_fitted),
+        # Keep the common news feeds warm in the background (no-op unless news_api.PREFETCH_ENABLED)
+        ("news prefetch", start_news_prefetch),
+    ]
 
-    # Initialize VLC player and store its instances in config
-    # This must also be done on the main thread (or its own dedicated thread if Vlc is problematic)
-    init_vlc()
+def on_window_shown(profile):
+    startup.PROFILER.mark("window shown")
+
+    def finished():
+        startup.PROFILER.mark("warm-up finished")
+        if profile:
+            startup.PROFILER.disable_import_timing()
+            startup.PROFILER.report()
+
+    if WARM_UP_IN_BACKGROUND:
+        startup.run_in_background(warm_up_tasks(), on_done=finished)
+    else:
+        finished()
+
+def run_server(args):
+    with startup.timed("import server"):
+        import server
+    # The speech worker renders audio for clients, warm it up while the server starts
+    startup.run_in_background(warm_up_tasks()[:2], on_done=lambda: startup.PROFILER.mark("warm-up finished"))
+    server.serve(args.host or server.SERVER_HOST, args.port or server.SERVER_PORT)
+
+    from tts_stt import stop_speech_worker
+    stop_speech_worker()
+    from history_db import close_history_db
+    close_history_db()
+    from response_cache import flush_response_cache
+    flush_response_cache()
+    from stream_resolver import flush_stream_cache
+    flush_stream_cache()
+    import tracing
+    tracing.flush()
+
+def run_batch_mode(args):
+    import time
+    import batch
+    code = batch.run_batch(args.batch, speak_results=args.speak)
+
+    import config
+    player = config.get_vlc_player()
+    if player and player.is_playing():
+        if args.keep_playing:
+            print("Music is playing, press Ctrl+C to stop.", file=sys.stderr)
+            try:
+                while player.is_playing():
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                pass
+        player.stop()
+
+    from tts_stt import stop_speech_worker
+    stop_speech_worker()
+    from history_db import close_history_db
+    close_history_db()
+    from response_cache import flush_response_cache
+    flush_response_cache()
+    from stream_resolver import flush_stream_cache
+    flush_stream_cache()
+    import tracing
+    tracing.flush()
+    return code
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.profile_startup:
+        startup.PROFILER.enable()
+
+    if args.server:
+        run_server(args)
+        return
+    if args.batch:
+        return run_batch_mode(args)
+
+    # --- Imports ---
+    # Heavy libraries (pyttsx3, speech_recognition, vlc, yt_dlp, requests) are only imported
+    # by the subsystems that need them, on first use or during the background warm-up
+    with startup.timed("import gui"):
+        import tkinter as tk
+        import config
+        from gui_interface import MarcoGUI # Import your new GUI class
 
     # --- GUI Setup ---
-    root = tk.Tk()
-    app = MarcoGUI(root)
+    with startup.timed("create window"):
+        root = tk.Tk()
+        app = MarcoGUI(root)
+    root.after_idle(on_window_shown, args.profile_startup)
 
     # --- Start Tkinter event loop ---
     root.mainloop()
@@ -38,8 +134,23 @@ def main():
     # You might also want to release the vlc instance if necessary
     # config.get_vlc_instance().release() # Uncomment if you need explicit release
 
+    from tts_stt import stop_speech_worker
+    stop_speech_worker()
+
+    from history_db import close_history_db
+    close_history_db() # Write out the conversation turns still queued
+
+    from response_cache import flush_response_cache
+    flush_response_cache() # Write out the answers cached since the last save
+
+    from stream_resolver import flush_stream_cache
+    flush_stream_cache() # And the streams resolved since then
+
+    import tracing
+    tracing.flush() # Write out the spans still queued for the trace log
+
     print("Marco AI Assistant application closed.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
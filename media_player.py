@@ -1,73 +1,152 @@
 # media_player.py
-import vlc
-import yt_dlp
+import threading
 from tts_stt import speak # For speaking feedback
 import config # For global VLC instance/player access
+from cancellation import is_cancelled
+from stream_resolver import get_stream_resolver
+from play_queue import PlayQueue, VlcPlayerAdapter
+from resilience import CircuitOpen, DeadlineExceeded
+from client_actions import client_handles_actions, send_action # Server sessions play music on the client
+
+_play_queue = None
+_vlc_lock = threading.Lock()
 
 def init_vlc():
-    """Initializes the global VLC instance and player and stores them in config."""
-    vlc_instance = vlc.Instance()
-    player = vlc_instance.media_player_new()
-    config.set_vlc_instance(vlc_instance)
-    config.set_vlc_player(player)
+    """Initializes the global VLC instance and player (once) and stores them in config."""
+    with _vlc_lock:
+        if config.get_vlc_player() is not None:
+            return
+        import vlc # Imported on first use, libvlc is slow to load
+        vlc_instance = vlc.Instance()
+        player = vlc_instance.media_player_new()
+        config.set_vlc_instance(vlc_instance)
+        config.set_vlc_player(player)
 
 def get_vlc_player():
-    """Returns the globally initialized VLC player instance from config."""
+    """Returns the global VLC player, initializing VLC on first use."""
+    if config.get_vlc_player() is None:
+        try:
+            init_vlc()
+        except Exception as e:
+            print(f"VLC initialization error: {e}")
     return config.get_vlc_player()
 
+def get_play_queue():
+    """Returns the music queue driving the VLC player, creating it on first use."""
+    global _play_queue
+    if _play_queue is None:
+        get_vlc_player()
+        adapter = VlcPlayerAdapter(config.get_vlc_instance(), config.get_vlc_player())
+        _play_queue = PlayQueue(adapter, get_stream_resolver(),
+                                on_track_start=lambda item: speak(f"Now playing {item.title}."))
+    return _play_queue
+
+def _resolve_track(song_query):
+    """Searches YouTube for song_query and returns its ResolvedTrack, or None (after saying why) if it can't be played."""
+    try:
+        # Reuses one extractor and caches query -> video and video -> stream URL
+        track = get_stream_resolver().resolve(song_query)
+    except CircuitOpen as e:
+        speak("YouTube is not reachable at the moment. Please try again in a little while.", cache=True)
+        print(f"Music playback error: {e}")
+        return None
+    except DeadlineExceeded as e:
+        speak("YouTube is taking too long to respond. Please try again later.", cache=True)
+        print(f"Music playback error: {e}")
+        return None
+    except Exception as e:
+        speak(f"An error occurred during music playback. Kindly verify your internet connection or select an alternative track.")
+        print(f"Music playback error: {e}")
+        return None
+
+    if is_cancelled():
+        return None # Stopped or replaced by another request while searching
+    if track is None:
+        speak(f"Sorry, I could not find any song matching {song_query} on YouTube or the search yielded no valid results.")
+        return None
+    if not track.stream_url:
+        speak(f"Could not find a direct streamable link for {song_query}. The video might be geo-restricted or unavailable for direct streaming.")
+        return None
+    return track
+
 def play_youtube_audio(song_query):
     """
     Searches for and plays audio from YouTube using yt_dlp and VLC.
+    A remote client (server mode) gets the stream link to play itself instead.
     """
-    player = config.get_vlc_player()
-    if not player:
-        speak("VLC player not initialized. Cannot play music.")
+    client = client_handles_actions()
+    if not client and not get_vlc_player():
+        speak("VLC player not initialized. Cannot play music.", cache=True)
         return
 
     if not song_query:
-        speak("Please specify the audio required for playback.")
+        speak("Please specify the audio required for playback.", cache=True)
         return
 
     speak(f"Searching for {song_query} on YouTube.")
+    track = _resolve_track(song_query)
+    if track is None:
+        return
     try:
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'quiet': True,
-            'extract_flat': False,
-            'force_generic_extractor': True,
-            'default_search': 'ytsearch',
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(f"{song_query}", download=False)
-
-            if 'entries' in info_dict and info_dict['entries']:
-                video_info = info_dict['entries'][0]
-                stream_url = video_info.get('url')
-
-                if stream_url:
-                    if player.is_playing():
-                        player.stop()
-
-                    media = config.get_vlc_instance().media_new(stream_url)
-                    player.set_media(media)
-                    player.play()
-                    speak(f"Playing {video_info.get('title', song_query)}.")
-                else:
-                    speak(f"Could not find a direct streamable link for {song_query}. The video might be geo-restricted or unavailable for direct streaming.")
-            else:
-                speak(f"Sorry, I could not find any song matching {song_query} on YouTube or the search yielded no valid results.")
-
+        if client:
+            send_action("play", url=track.stream_url, title=track.title or song_query, query=song_query)
+        else:
+            # Played through the queue so queued songs follow when this one ends
+            get_play_queue().play_now(track, song_query)
+        speak(f"Playing {track.title or song_query}.")
     except Exception as e:
         speak(f"An error occurred during music playback. Kindly verify your internet connection or select an alternative track.")
         print(f"Music playback error: {e}")
 
+def queue_youtube_audio(song_query):
+    """
+    Adds a song to the play queue; its stream is resolved in the background before it is due.
+    A remote client keeps its own queue, so it gets the resolved stream link straight away.
+    """
+    client = client_handles_actions()
+    if not client and not get_vlc_player():
+        speak("VLC player not initialized. Cannot play music.", cache=True)
+        return
+    if not song_query:
+        speak("Please specify the audio to add to the queue.", cache=True)
+        return
+
+    if client:
+        track = _resolve_track(song_query)
+        if track is not None:
+            send_action("queue", url=track.stream_url, title=track.title or song_query, query=song_query)
+            speak(f"Added {song_query} to the queue.")
+        return
+    position = get_play_queue().enqueue(song_query)
+    if position == 0:
+        speak(f"Nothing is playing, starting {song_query}.")
+    else:
+        speak(f"Added {song_query} to the queue at position {position}.")
+
+def play_next_track():
+    """Skips to the next queued song."""
+    if send_action("next"):
+        speak("Skipping to the next song.", cache=True)
+        return
+    if not get_vlc_player():
+        speak("VLC player not initialized. Cannot play music.", cache=True)
+        return
+    if not get_play_queue().skip():
+        speak("The queue is empty.", cache=True)
+
 def stop_vlc_player():
-    """Stops the currently playing audio."""
-    player = config.get_vlc_player()
-    if player and player.is_playing():
+    """Stops the currently playing audio (the client's, for a remote client)."""
+    if send_action("stop"):
+        speak("Music playback terminated.", cache=True)
+        return
+    player = config.get_vlc_player() # Not get_vlc_player(): no need to start VLC just to find nothing playing
+    active = bool(player and player.is_playing())
+    if _play_queue is not None:
+        # Always, so a handoff to the next song that is still resolving is cancelled too
+        active = _play_queue.stop() or active
+    elif active:
         player.stop()
-        speak("Music playback terminated.")
+    if active:
+        speak("Music playback terminated.", cache=True)
     else:
-        speak("No audio is currently active.")
\ No newline at end of file
+        speak("No audio is currently active.", cache=True)
@@ -1,42 +1,243 @@
 # news_api.py
-import requests
+import time
+import threading
+from collections import deque
+
 import config # To access GNEWS_API_KEY
 from tts_stt import speak # For speaking news headlines
+from cancellation import is_cancelled
+import tracing
+import resilience # Deadline, retries and circuit breaker for GNews
+from resilience import CircuitOpen, DeadlineExceeded
+
+NEWS_API_BASE_URL = "https://gnews.io/api/v4"
+NEWS_TIMEOUT = (3.05, 10) # Connect and read timeouts in seconds
+NEWS_CACHE_TTL = 300 # Headlines younger than this are served from memory without a request
+NEWS_STALE_TTL = 3600 # Older entries are still served (and refreshed in the background) up to this age
+PREFETCH_ENABLED = False # Keep the PREFETCH_FEEDS warm from a background thread
+PREFETCH_FEEDS = ({'country': 'in'}, {'topic': 'breaking'})
+PREFETCH_INTERVAL = 240 # Seconds between prefetch rounds, a little under the TTL
+MAX_HEADLINES = 5 # Limiting to 5 articles for brevity
+LATENCY_WINDOW = 100 # Recent fetch latencies kept for stats
+
+
+class NewsClient:
+    """
+    GNews client with a persistent HTTP session and an in-memory TTL cache per country/topic.
+    Expired entries are served stale while a background refresh fetches fresh headlines.
+    """
+
+    def __init__(self, api_key=None, base_url=NEWS_API_BASE_URL, ttl=NEWS_CACHE_TTL, stale_ttl=NEWS_STALE_TTL,
+                 timeout=NEWS_TIMEOUT, session=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.session = session or self._new_session()
+        self._cache = {} # (country, topic) -> (fetched_at, articles)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._prefetch_stop = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.fetch_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @staticmethod
+    def _new_session():
+        import requests # Imported on first use to keep startup fast
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_articles(self, country=None, topic=None):
+        """
+        Returns (articles, source) where source is 'hit', 'stale' or 'miss'.
+        Raises requests.exceptions.RequestException if a miss cannot be fetched.
+        """
+        key = (country, topic)
+        refresh = False
+        with self._lock:
+            entry = self._cache.get(key)
+            age = time.monotonic() - entry[0] if entry else None
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                return entry[1], 'hit'
+            if age is not None and age < self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    refresh = True
+            else:
+                self.misses += 1
+                expired, entry = entry, None
+
+        if entry:
+            if refresh:
+                threading.Thread(target=self._background_refresh, args=(key,), daemon=True).start()
+            return entry[1], 'stale'
+        try:
+            return self.refresh(country, topic), 'miss'
+        except Exception as e:
+            if expired is None:
+                raise
+            # Old headlines beat no headlines while GNews is down
+            print(f"News fetch failed ({e}), serving expired headlines.")
+            return expired[1], 'expired'
+
+    def refresh(self, country=None, topic=None):
+        """Fetches headlines from the API and stores them in the cache. Returns the articles."""
+        articles = self._fetch(country, topic)
+        with self._lock:
+            self._cache[(country, topic)] = (time.monotonic(), articles)
+        return articles
+
+    def _background_refresh(self, key):
+        try:
+            self.refresh(*key)
+        except Exception as e:
+            print(f"News background refresh error: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _fetch(self, country, topic):
+        params = {'lang': 'en', 'token': self.api_key or config.GNEWS_API_KEY}
+        if country:
+            params['country'] = country
+        if topic:
+            params['topic'] = topic
+
+        def request():
+            r = self.session.get(f"{self.base_url}/top-headlines", params=params, timeout=self.timeout)
+            r.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+            return r.json().get('articles', [])
+
+        start = time.monotonic()
+        failed = True
+        try:
+            with tracing.span("news.fetch", country=country, topic=topic):
+                articles = resilience.call("gnews", request, retry_if=_worth_retrying)
+            failed = False
+        finally:
+            # Fetches run on command threads, background refreshes and the prefetcher at once
+            with self._lock:
+                self.fetches += 1
+                self.fetch_errors += failed
+                self.fetch_latencies.append(time.monotonic() - start)
+        return articles
+
+    def start_prefetch(self, feeds=PREFETCH_FEEDS, interval=PREFETCH_INTERVAL):
+        """Keeps the given feeds warm by refreshing them from a background thread."""
+        if self._prefetch_stop is not None:
+            return
+        self._prefetch_stop = threading.Event()
+        threading.Thread(target=self._prefetch_loop, args=(feeds, interval, self._prefetch_stop),
+                         name="NewsPrefetch", daemon=True).start()
+
+    def stop_prefetch(self):
+        if self._prefetch_stop is not None:
+            self._prefetch_stop.set()
+            self._prefetch_stop = None
+
+    def _prefetch_loop(self, feeds, interval, stop):
+        while not stop.is_set():
+            for feed in feeds:
+                try:
+                    self.refresh(feed.get('country'), feed.get('topic'))
+                except Exception as e:
+                    print(f"News prefetch error for {feed}: {e}")
+            stop.wait(interval)
+
+    def stats(self):
+        """Cache hit ratio and fetch latency figures."""
+        with self._lock:
+            hits, stale_hits, misses = self.hits, self.stale_hits, self.misses
+            fetches, fetch_errors = self.fetches, self.fetch_errors
+            latencies = sorted(self.fetch_latencies)
+        lookups = hits + stale_hits + misses
+        return {
+            'lookups': lookups,
+            'hits': hits,
+            'stale_hits': stale_hits,
+            'misses': misses,
+            'hit_ratio': (hits + stale_hits) / lookups if lookups else None,
+            'fetches': fetches,
+            'fetch_errors': fetch_errors,
+            'fetch_p50': latencies[len(latencies) // 2] if latencies else None,
+            'fetch_p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        }
+
+
+def _worth_retrying(error):
+    """Client errors (bad API key or parameters) fail the same way every time; rate limits and 5xx may not."""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_news_client():
+    """Returns the shared NewsClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = NewsClient()
+    return _client
+
+def start_news_prefetch():
+    """Starts background prefetching of the common feeds if PREFETCH_ENABLED is set."""
+    if PREFETCH_ENABLED:
+        get_news_client().start_prefetch()
 
 def get_news(country=None, topic=None):
     """
     Fetches and reads top news headlines based on country or topic using the GNews API.
     """
-    api_url = ""
+    import requests
+
     if country:
-        speak(f"Fetching top headlines from {country.upper()}.")
-        api_url = f"https://gnews.io/api/v4/top-headlines?lang=en&country={country}&token={config.GNEWS_API_KEY}"
+        speak(f"Fetching top headlines from {country.upper()}.", cache=True) # Only a handful of variants
     elif topic:
-        speak(f"Fetching top {topic} headlines.")
-        api_url = f"https://gnews.io/api/v4/top-headlines?lang=en&topic={topic}&token={config.GNEWS_API_KEY}"
+        speak(f"Fetching top {topic} headlines.", cache=True)
     else:
-        speak("Error: No country or topic specified for news.")
+        speak("Error: No country or topic specified for news.", cache=True)
         return
 
     try:
-        r = requests.get(api_url, timeout=30)
-        r.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-
-        data = r.json()
-        articles = data.get('articles', [])
+        with tracing.span("news.lookup") as lookup_span:
+            articles, source = get_news_client().get_articles(country=country, topic=topic)
+            lookup_span.set(source=source, articles=len(articles))
+        print(f"News headlines served from {source}.")
 
         if not articles:
-            speak("No relevant news articles found at the moment.")
+            speak("No relevant news articles found at the moment.", cache=True)
         else:
-            speak("Presenting the top headlines.")
-            for i, article in enumerate(articles[:5]): # Limiting to 5 articles for brevity
+            speak("Presenting the top headlines.", cache=True)
+            for i, article in enumerate(articles[:MAX_HEADLINES]):
+                if is_cancelled():
+                    return # A newer command replaced this one
                 news_title = article.get('title', 'No title available')
                 print(f"{i+1}. {news_title}")
                 speak(news_title)
 
+    except CircuitOpen as e:
+        speak("The news service is not responding at the moment. Please try again in a little while.", cache=True)
+        print(f"News API unavailable: {e}")
+    except DeadlineExceeded as e:
+        speak("The news service is taking too long to respond. Please try again later.", cache=True)
+        print(f"News API timeout: {e}")
     except requests.exceptions.RequestException as e:
-        speak("Unable to access news feeds due to network issues or an API error. Verify internet connection or API key.")
+        speak("Unable to access news feeds due to network issues or an API error. Verify internet connection or API key.", cache=True)
         print(f"News API error: {e}")
     except Exception as e:
-        speak("An unexpected anomaly occurred during news fetching.")
-        print(f"General news error: {e}")
\ No newline at end of file
+        speak("An unexpected anomaly occurred during news fetching.", cache=True)
+        print(f"General news error: {e}")
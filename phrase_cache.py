@@ -0,0 +1,189 @@
+# phrase_cache.py
+import io
+import wave
+import threading
+from collections import OrderedDict
+
+PHRASE_CACHE_ENABLED = True
+PHRASE_CACHE_MAX_ENTRIES = 200
+PHRASE_CACHE_MAX_BYTES = 32 * 1024 * 1024 # Raw PCM; a short phrase is roughly 100-200 KB at 22 kHz
+PLAYBACK_CHUNK_FRAMES = 1024 # Cached audio is written in chunks this size so barge-in can cut it off
+
+# Rendered in the background at startup, so they play from the cache the first time they are needed
+PRERENDER_PHRASES = (
+    "Switched to voice input mode. Say 'Marco' to activate.",
+    "Music playback terminated.",
+    "No audio is currently active.",
+    "Presenting the top headlines.",
+    "Command not recognized. Please try again.",
+    "No speech detected within the timeout. Say 'Marco' to activate or give command.",
+    # One per site in assistant_actions.WEBSITES
+    "Opening Google.",
+    "Opening Facebook.",
+    "Opening YouTube.",
+    "Opening LinkedIn.",
+    # The news the news route asks for (Indian and international)
+    "Fetching top headlines from IN.",
+    "Fetching top breaking headlines.",
+)
+
+
+class AudioClip:
+    """PCM audio rendered by the TTS engine, kept in memory for playback."""
+
+    __slots__ = ("frames", "sample_rate", "sample_width", "channels")
+
+    def __init__(self, frames, sample_rate, sample_width, channels=1):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+
+    @classmethod
+    def from_wav(cls, path):
+        with wave.open(path, 'rb') as f:
+            return cls(f.readframes(f.getnframes()), f.getframerate(), f.getsampwidth(), f.getnchannels())
+
+    @property
+    def size(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        return len(self.frames) / float(self.sample_rate * self.sample_width * self.channels)
+
+    def to_wav_bytes(self):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(self.sample_width)
+            f.setframerate(self.sample_rate)
+            f.writeframes(self.frames)
+        return buffer.getvalue()
+
+
+def phrase_key(text, voice_settings):
+    """Cache key for text spoken with the given voice settings (voice id, rate, volume)."""
+    return (" ".join(text.split()), tuple(voice_settings))
+
+
+class PhraseCache:
+    """LRU cache of rendered phrases, bounded by entry count and total audio bytes."""
+
+    def __init__(self, max_entries=PHRASE_CACHE_MAX_ENTRIES, max_bytes=PHRASE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clips = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is None:
+                self.misses += 1
+                return None
+            self._clips.move_to_end(key)
+            self.hits += 1
+            return clip
+
+    def put(self, key, clip):
+        if clip.size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._clips:
+                self._bytes -= self._clips.pop(key).size
+            self._clips[key] = clip
+            self._bytes += clip.size
+            while len(self._clips) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return True
+
+    def __contains__(self, key):
+        return key in self._clips
+
+    def __len__(self):
+        return len(self._clips)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._clips), 'bytes': self._bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+# --- Playback ---
+
+class PyAudioPlayer:
+    """Plays clips through PyAudio (already needed for the microphone), a chunk at a time."""
+
+    def __init__(self):
+        import pyaudio
+        self._pyaudio = pyaudio.PyAudio()
+
+    def play(self, clip, should_stop=None):
+        stream = self._pyaudio.open(format=self._pyaudio.get_format_from_width(clip.sample_width),
+                                    channels=clip.channels, rate=clip.sample_rate, output=True)
+        try:
+            step = PLAYBACK_CHUNK_FRAMES * clip.sample_width * clip.channels
+            for start in range(0, len(clip.frames), step):
+                if should_stop and should_stop():
+                    break
+                stream.write(clip.frames[start:start + step])
+        finally:
+            stream.stop_stream()
+            stream.close()
+
+
+class WinsoundPlayer:
+    """Fallback for Windows without PyAudio. Playback from memory cannot be interrupted."""
+
+    def __init__(self):
+        import winsound
+        self._winsound = winsound
+
+    def play(self, clip, should_stop=None):
+        if should_stop and should_stop():
+            return
+        self._winsound.PlaySound(clip.to_wav_bytes(), self._winsound.SND_MEMORY)
+
+
+_player = None
+_player_checked = False
+_player_lock = threading.Lock()
+
+def get_player():
+    """Returns the audio output used for cached phrases, or None if no backend is available."""
+    global _player, _player_checked
+    if not _player_checked:
+        with _player_lock:
+            if not _player_checked:
+                for backend in (PyAudioPlayer, WinsoundPlayer):
+                    try:
+                        _player = backend()
+                        break
+                    except Exception:
+                        continue
+                if _player is None:
+                    print("No audio output for cached phrases, all speech will be synthesized live.")
+                _player_checked = True
+    return _player
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_phrase_cache():
+    """Returns the shared PhraseCache, or None if phrase caching is disabled."""
+    global _cache
+    if not PHRASE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PhraseCache()
+    return _cache
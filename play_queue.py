@@ -0,0 +1,210 @@
+# play_queue.py
+import threading
+from collections import deque
+
+LOOKAHEAD = 2 # Upcoming tracks whose stream URLs are resolved before they are needed
+
+
+class QueuedTrack:
+    """A requested song; track is filled in by the resolver before it plays."""
+
+    def __init__(self, query, track=None):
+        self.query = query
+        self.track = track
+        self.media = None # Player-specific media prepared ahead of the handoff
+        self.error = None
+
+    @property
+    def title(self):
+        return (self.track.title if self.track else None) or self.query
+
+    @property
+    def resolved(self):
+        return self.error is not None or (self.track is not None and self.track.is_fresh())
+
+    def __repr__(self):
+        return f"QueuedTrack({self.query!r})"
+
+
+class VlcPlayerAdapter:
+    """Adapts a VLC instance/player pair to the small interface PlayQueue uses."""
+
+    def __init__(self, instance, player):
+        import vlc
+        self.instance = instance
+        self.player = player
+        self._vlc = vlc
+
+    def prepare(self, stream_url):
+        return self.instance.media_new(stream_url)
+
+    def play(self, media):
+        if self.player.is_playing():
+            self.player.stop()
+        self.player.set_media(media)
+        self.player.play()
+
+    def stop(self):
+        self.player.stop()
+
+    def is_playing(self):
+        return self.player.is_playing()
+
+    def on_end(self, callback):
+        # VLC calls this from its own thread, where calling back into libvlc can deadlock,
+        # so callback must only hand the work over to another thread
+        events = self.player.event_manager()
+        events.event_attach(self._vlc.EventType.MediaPlayerEndReached, lambda event: callback())
+
+
+class PlayQueue:
+    """
+    Music queue with look-ahead resolution. A background worker resolves the stream URLs of the
+    next LOOKAHEAD tracks (and prepares their media) while the current one plays, and hands off to
+    the next track as soon as the player reports the end of the current one.
+    Works with any player exposing prepare/play/stop/is_playing/on_end and any resolver with resolve(query).
+    """
+
+    def __init__(self, player, resolver, lookahead=LOOKAHEAD, on_track_start=None):
+        self.player = player
+        self.resolver = resolver
+        self.lookahead = lookahead
+        self.on_track_start = on_track_start
+        self.current = None
+        self._queue = deque()
+        self._advance_requests = 0
+        self._starting = None # Item taken off the queue and being resolved for playback
+        self._generation = 0 # Bumped by stop() and play_now(), so a handoff in progress gives up
+        self._running = True
+        self._cond = threading.Condition()
+        player.on_end(self._on_end_of_media)
+        self._thread = threading.Thread(target=self._run, name="PlayQueue", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, query):
+        """
+        Adds a song to the end of the queue and returns its position, or 0 if nothing is playing
+        and it starts right away.
+        """
+        with self._cond:
+            self._queue.append(QueuedTrack(query))
+            starts = False
+            if self.current is None and self._starting is None and not self.player.is_playing():
+                self._advance_requests += 1
+                starts = len(self._queue) == 1
+            self._cond.notify()
+            return 0 if starts else len(self._queue)
+
+    def play_now(self, track, query=None):
+        """Plays an already resolved track immediately; the queue continues after it."""
+        item = QueuedTrack(query or track.title, track)
+        item.media = self.player.prepare(track.stream_url)
+        with self._cond:
+            self._generation += 1
+            self._advance_requests = 0
+            self.current = item
+            self.player.play(item.media)
+            self._cond.notify()
+
+    def skip(self):
+        """Moves on to the next queued track. Returns False if the queue is empty."""
+        with self._cond:
+            if not self._queue:
+                return False
+            self._advance_requests += 1
+            self._cond.notify()
+            return True
+
+    def stop(self):
+        """
+        Stops playback, including a handoff to the next track that is still resolving; queued tracks
+        are kept. Returns True if anything was playing or about to.
+        """
+        with self._cond:
+            active = (self.current is not None or self._starting is not None or bool(self._advance_requests)
+                      or self.player.is_playing())
+            self._generation += 1
+            self.current = None
+            self._advance_requests = 0
+            self.player.stop()
+            return active
+
+    def clear(self):
+        with self._cond:
+            self._queue.clear()
+
+    def upcoming(self):
+        with self._cond:
+            return list(self._queue)
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _on_end_of_media(self):
+        with self._cond:
+            self.current = None
+            if self._queue:
+                self._advance_requests += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._advance_requests and self._next_unresolved() is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                if self._advance_requests:
+                    self._advance_requests = 0
+                    item = self._queue.popleft() if self._queue else None
+                    self._starting = item
+                    generation = self._generation
+                    to_resolve = None
+                else:
+                    item = None
+                    to_resolve = self._next_unresolved()
+
+            if item is not None:
+                self._start(item, generation)
+            elif to_resolve is not None:
+                self._resolve(to_resolve)
+
+    def _next_unresolved(self):
+        for item in list(self._queue)[:self.lookahead]:
+            if not item.resolved:
+                return item
+        return None
+
+    def _resolve(self, item):
+        try:
+            track = self.resolver.resolve(item.query)
+            if track is None or not track.stream_url:
+                item.error = LookupError(f"No stream found for {item.query}")
+                return
+            item.track = track
+            item.media = self.player.prepare(track.stream_url)
+        except Exception as e:
+            print(f"Could not resolve queued track '{item.query}': {e}")
+            item.error = e
+
+    def _start(self, item, generation):
+        if not item.resolved:
+            self._resolve(item) # Not looked ahead in time (or its URL expired), resolve it now
+        with self._cond:
+            self._starting = None
+            if generation != self._generation:
+                # Stopped (or another track started) while this one was resolving: put it back instead
+                if item.error is None:
+                    self._queue.appendleft(item)
+                return
+            if item.error is not None:
+                print(f"Skipping '{item.query}': {item.error}")
+                if self._queue:
+                    self._advance_requests += 1
+                return
+            self.current = item
+            self.player.play(item.media)
+        if self.on_track_start:
+            self.on_track_start(item)
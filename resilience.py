@@ -0,0 +1,333 @@
+# resilience.py
+"""
+Fail-fast wrappers for the network dependencies (Gemini, GNews, YouTube via yt_dlp).
+
+Every call goes through its dependency's Dependency.call(), which
+- enforces a deadline: the call runs on a helper thread and the caller gives up when it expires
+  (a hung request keeps its thread, never the command),
+- retries idempotent calls with jittered exponential backoff while the deadline allows,
+- and trips a circuit breaker after repeated failed calls (a call that fails after its retries
+  counts once), so while a dependency is down calls fail instantly with CircuitOpen and the caller
+  can speak a fallback straight away.
+
+    from resilience import call, CircuitOpen, DeadlineExceeded
+    articles = call("gnews", fetch, country)
+
+breaker_states() reports every breaker, for the server's /health route and the GUI metrics view.
+"""
+import time
+import queue
+import random
+import threading
+import contextvars
+
+from cancellation import current_token, CommandCancelled
+import tracing
+
+# Per dependency: deadline for the whole call (retries included), attempts, backoff, breaker settings
+DEPENDENCY_SETTINGS = {
+    "gemini": {"deadline": 20.0, "attempts": 2, "base_delay": 0.5, "max_delay": 2.0,
+               "failure_threshold": 3, "recovery_timeout": 30.0},
+    "gnews": {"deadline": 8.0, "attempts": 3, "base_delay": 0.25, "max_delay": 2.0,
+              "failure_threshold": 5, "recovery_timeout": 60.0},
+    "youtube": {"deadline": 15.0, "attempts": 2, "base_delay": 0.5, "max_delay": 2.0,
+                "failure_threshold": 4, "recovery_timeout": 60.0},
+}
+DEFAULT_SETTINGS = {"deadline": 10.0, "attempts": 1, "base_delay": 0.25, "max_delay": 2.0,
+                    "failure_threshold": 5, "recovery_timeout": 30.0}
+CANCEL_POLL_INTERVAL = 0.1 # How often a caller waiting on a deadline checks whether its command was cancelled
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a dependency call does not finish within its deadline."""
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} is unavailable (circuit open, retrying in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through, consecutive failures are counted.
+    Open: after failure_threshold consecutive failures, calls are rejected for recovery_timeout seconds.
+    Half open: then a single trial call is let through; success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.trips = 0
+        self.rejected = 0
+        self.last_error = None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Returns True if a call may go ahead, otherwise raises CircuitOpen."""
+        with self._lock:
+            if self._state == OPEN:
+                remaining = self.recovery_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, remaining)
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._trial_running:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, 0)
+                self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"Circuit for {self.name} closed, the service is responding again.")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self.last_error = None if error is None else f"{type(error).__name__}: {error}"
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                    print(f"Circuit for {self.name} opened after {self._failures} failures, "
+                          f"failing fast for {self.recovery_timeout:.0f}s.")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self):
+        """Ends a half-open trial that neither succeeded nor failed (e.g. the command was cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'retry_in': round(retry_in, 1),
+                'last_error': self.last_error,
+            }
+
+
+def backoff_delay(attempt, base_delay, max_delay, rng=random):
+    """Full jitter: a random delay between 0 and the exponential backoff for this retry, capped at max_delay."""
+    return rng.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def run_with_deadline(fn, timeout, *args, **kwargs):
+    """
+    Runs fn on a helper thread and returns its result, raising DeadlineExceeded if it takes longer than
+    timeout seconds. The helper runs in a copy of the caller's context (trace span, cancel token, speech
+    sink). While waiting the caller's cancel token is polled, so a cancelled command stops waiting at once.
+    """
+    context = contextvars.copy_context()
+    done = threading.Event()
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = context.run(fn, *args, **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            done.set()
+
+    # Daemon thread: a call that never returns must not keep the process alive at exit
+    threading.Thread(target=target, name="deadline-call", daemon=True).start()
+    token = current_token()
+    deadline = time.monotonic() + timeout
+    while not done.wait(min(CANCEL_POLL_INTERVAL, max(0.0, deadline - time.monotonic()))):
+        token.raise_if_cancelled()
+        if time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"no response within {timeout:.1f}s")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
+
+
+class Dependency:
+    """A remote service: its circuit breaker plus the deadline and retry policy applied to every call."""
+
+    def __init__(self, name, deadline, attempts, base_delay, max_delay, failure_threshold, recovery_timeout):
+        self.name = name
+        self.deadline = deadline
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        self._lock = threading.Lock() # Calls come from several scheduler threads at once
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    def call(self, fn, *args, idempotent=True, deadline=None, retry_if=None, **kwargs):
+        """
+        Calls fn(*args, **kwargs) under this dependency's deadline, retries and circuit breaker.
+        Only idempotent calls are retried. retry_if(error) can rule out errors that a retry will not fix
+        (e.g. a bad API key); those are raised straight away and do not count against the breaker.
+        Raises CircuitOpen, DeadlineExceeded or the call's own exception.
+        """
+        self.breaker.allow()
+        with self._lock:
+            self.calls += 1
+        timeout = self.deadline if deadline is None else deadline
+        deadline_at = time.monotonic() + timeout
+        attempts = self.attempts if idempotent else 1
+        span = tracing.current_span()
+        attempt = 0
+        try:
+            while True:
+                remaining = deadline_at - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise DeadlineExceeded(f"no response within {timeout:.1f}s")
+                    result = run_with_deadline(fn, remaining, *args, **kwargs)
+                except CommandCancelled:
+                    self.breaker.release_trial()
+                    raise
+                except Exception as e:
+                    if retry_if is not None and not retry_if(e):
+                        self.breaker.release_trial()
+                        raise
+                    if isinstance(e, DeadlineExceeded):
+                        with self._lock:
+                            self.timeouts += 1
+                    attempt += 1
+                    delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                    # Other calls may have opened the breaker meanwhile, then retrying is pointless too
+                    if (attempt >= attempts or isinstance(e, DeadlineExceeded)
+                            or time.monotonic() + delay >= deadline_at or self.breaker.state == OPEN):
+                        self.breaker.record_failure(e) # Once per call, however many attempts it took
+                        raise
+                    with self._lock:
+                        self.retries += 1
+                    print(f"{self.name} call failed ({e}), retrying in {delay:.2f}s.")
+                    try:
+                        current_token().raise_if_cancelled()
+                    except CommandCancelled:
+                        self.breaker.release_trial()
+                        raise
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            if span is not None:
+                span.set(**{f"{self.name}_attempts": attempt + 1})
+
+    def stats(self):
+        stats = self.breaker.stats()
+        with self._lock:
+            stats.update(calls=self.calls, retries=self.retries, timeouts=self.timeouts)
+        return stats
+
+
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+def get_dependency(name):
+    """Returns the shared Dependency for name, configured from DEPENDENCY_SETTINGS."""
+    dependency = _dependencies.get(name)
+    if dependency is None:
+        with _dependencies_lock:
+            dependency = _dependencies.get(name)
+            if dependency is None:
+                dependency = _dependencies[name] = Dependency(name, **DEPENDENCY_SETTINGS.get(name, DEFAULT_SETTINGS))
+    return dependency
+
+def call(name, fn, *args, **kwargs):
+    """Shortcut for get_dependency(name).call(fn, *args, **kwargs)."""
+    return get_dependency(name).call(fn, *args, **kwargs)
+
+def iter_with_deadline(iterable, timeout, name=None):
+    """
+    Yields from iterable, raising DeadlineExceeded if the next item takes longer than timeout seconds
+    (for streamed responses, whose chunks arrive long after the call itself returned). A stalled stream
+    counts as a failure of the named dependency. One reader thread (in a copy of the caller's context)
+    pulls the whole stream into a queue; it stops at the next item once the caller stops iterating.
+    """
+    context = contextvars.copy_context()
+    items = queue.Queue()
+    finished = object()
+    stopped = threading.Event()
+
+    def reader():
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    return
+                items.put((item, None))
+        except BaseException as e:
+            items.put((finished, e))
+        else:
+            items.put((finished, None))
+
+    # Daemon thread: a stream that never ends must not keep the process alive at exit
+    threading.Thread(target=context.run, args=(reader,), name="deadline-stream", daemon=True).start()
+    token = current_token()
+    try:
+        while True:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    item, error = items.get(timeout=min(CANCEL_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+                    break
+                except queue.Empty:
+                    token.raise_if_cancelled()
+                    if time.monotonic() >= deadline:
+                        e = DeadlineExceeded(f"no response within {timeout:.1f}s")
+                        if name is not None:
+                            get_dependency(name).breaker.record_failure(e)
+                        raise e
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+def breaker_states():
+    """Returns {dependency: stats} for every dependency used so far."""
+    with _dependencies_lock:
+        dependencies = list(_dependencies.values())
+    return {dependency.name: dependency.stats() for dependency in dependencies}
+
+def reset_breakers():
+    with _dependencies_lock:
+        for dependency in _dependencies.values():
+            dependency.breaker.reset()
@@ -0,0 +1,198 @@
+# response_cache.py
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".marco", "response_cache.json") # None keeps it in memory only
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 # Total size of the cached response texts (UTF-8)
+RESPONSE_CACHE_TTL = 24 * 3600 # Seconds a cached answer stays valid
+RESPONSE_CACHE_SAVE_DELAY = 2.0 # Seconds put() waits before writing, so a burst of answers is one write
+
+# Answers to these change from one moment to the next, so they are never cached
+_TIME_SENSITIVE = re.compile(r"\b(?:now|today|tonight|tomorrow|yesterday|current(?:ly)?|latest|recent|"
+                             r"weather|forecast|score|price|news|this (?:week|month|year)|what time is it|"
+                             r"what(?:'s| is) the (?:time(?! zone| difference)|date(?! of))|what day is (?:it|today))\b")
+# Follow-ups that only make sense together with the previous turns ("why?", "tell me more about it")
+_CONTEXT_DEPENDENT = re.compile(r"\b(?:it|its|that|this|those|these|he|him|his|she|her|they|them|their|"
+                                r"more|again|else|previous|last one|above)\b|^(?:and|but|so|why|how come|what about)\b")
+
+def normalize_prompt(prompt):
+    """Lowercases and strips punctuation and extra whitespace, so trivially different phrasings share an entry."""
+    return " ".join(re.sub(r"[^\w\s']", " ", prompt.lower()).split())
+
+def is_time_sensitive(prompt):
+    return bool(_TIME_SENSITIVE.search(normalize_prompt(prompt)))
+
+def is_context_dependent(prompt):
+    return bool(_CONTEXT_DEPENDENT.search(normalize_prompt(prompt)))
+
+def context_fingerprint(messages):
+    """Short stable hash of a list of Gemini chat messages."""
+    digest = hashlib.sha1(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def cache_key(prompt, fingerprint):
+    return f"{fingerprint}:{normalize_prompt(prompt)}"
+
+
+class ResponseCache:
+    """
+    LRU cache of LLM answers bounded by entry count and total bytes, with a TTL per entry.
+    Keys combine the normalized prompt with a fingerprint of the context that can change the answer
+    (model, persona and conversation summary; the whole conversation for follow-ups). Entries are persisted to disk in LRU
+    order so the cache survives restarts; put() only schedules the write, flush() does it at exit.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 ttl=RESPONSE_CACHE_TTL, path=RESPONSE_CACHE_PATH, save_delay=RESPONSE_CACHE_SAVE_DELAY):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self.save_delay = save_delay
+        self._save_timer = None
+        self._entries = OrderedDict() # key -> (response, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.load()
+
+    def get(self, key):
+        """Returns the cached response for key, or None if there is none or it has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, response, ttl=None):
+        """Caches response under key and evicts the least recently used entries to stay within the bounds."""
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return False # Would evict everything else
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (response, time.time() + (self.ttl if ttl is None else ttl), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        self._schedule_save()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self.save()
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def load(self):
+        """Loads the entries persisted by save(), skipping those that have expired."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            with self._lock:
+                for key, response, expires_at in data.get('entries', []):
+                    if expires_at > now:
+                        size = len(response.encode("utf-8"))
+                        self._entries[key] = (response, expires_at, size)
+                        self._bytes += size
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Could not load response cache: {e}")
+
+    def _schedule_save(self):
+        """Saves in the background after save_delay, unless a save is already scheduled."""
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return # The scheduled save writes this entry too
+            self._save_timer = threading.Timer(self.save_delay, self.save)
+            self._save_timer.daemon = True # flush() writes whatever is left at exit
+            self._save_timer.start()
+
+    def flush(self):
+        """Writes a pending scheduled save now. Called at exit."""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    def save(self):
+        """Writes the cache to disk atomically, in LRU order."""
+        if not self.path:
+            return
+        with self._lock:
+            self._save_timer = None
+            data = {'entries': [[key, response, expires_at] for key, (response, expires_at, _) in self._entries.items()]}
+        try:
+            with self._save_lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = self.path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save response cache: {e}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the shared ResponseCache, loading it from disk on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def flush_response_cache():
+    """Writes out the answers cached since the last save. Called at exit."""
+    if _cache is not None:
+        _cache.flush()
@@ -0,0 +1,473 @@
+# server.py
+"""
+Headless server mode: exposes process_command to many clients at once over HTTP and WebSocket.
+
+Every session has its own conversation history; the command handlers, the scheduler and the
+(single) TTS engine are shared. Speech is returned to the client as text and, on request, as WAV
+audio rendered by the speech worker instead of being played on the host. Likewise nothing opens a
+browser or plays music on the host: websites and songs are returned to the client as actions
+(see client_actions.py), and stop/next only apply to the session's own client.
+
+    python main.py --server [--host 127.0.0.1] [--port 8765]
+
+HTTP (JSON bodies):
+    POST   /sessions                     -> {"session": id}
+    POST   /sessions/<id>/commands       {"command": "...", "audio": false}
+                                         -> {"session", "result", "error", "cancelled", "speech": [...], "actions": [...],
+                                             "audio": [base64 WAV]}
+    GET    /sessions/<id>/history        -> {"history": [...], "summary": ...}
+    DELETE /sessions/<id>
+    GET    /health                       -> {"sessions": n, "in_flight": n, "dependencies": {name: breaker state}}
+
+WebSocket: GET /ws (new session) or /sessions/<id>/ws
+    client: {"command": "...", "audio": true} or just the command as text
+    server: {"type": "session", "session": id}, then per command {"type": "speech", "text": ...} as each
+            sentence is spoken (followed by a binary WAV frame if audio was requested), {"type": "action",
+            "action": {...}} for what the client should open or play, and {"type": "result", ...}
+"""
+import re
+import json
+import time
+import uuid
+import base64
+import asyncio
+import hashlib
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from command_scheduler import CommandScheduler, CANCELLED
+from conversation import ConversationStore, set_current_store, reset_current_store
+from tts_stt import set_speech_sink, reset_speech_sink, render_speech
+from client_actions import set_action_sink, reset_action_sink
+import tracing
+from resilience import breaker_states
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_WORKERS = 32 # Commands processed concurrently across all sessions
+MAX_SESSIONS = 1000
+SESSION_IDLE_TIMEOUT = 30 * 60 # Seconds before an idle session and its history are dropped
+SESSION_SWEEP_INTERVAL = 60
+MAX_REQUEST_BYTES = 64 * 1024
+RENDER_WORKERS = 4 # Threads waiting on the speech worker for rendered audio
+RENDER_TIMEOUT = 30
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+_REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or _REASONS.get(status, ""))
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON.")
+
+
+class Session:
+    """One client's conversation."""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.store = ConversationStore([])
+        self.last_active = time.monotonic()
+        self.busy = 0 # Commands in flight; busy sessions are never expired
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+
+# --- HTTP/WebSocket wire format ---
+
+async def read_request(reader):
+    """Reads one HTTP/1.1 request, or returns None when the client has closed the connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_REQUEST_BYTES:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), urlsplit(target).path.rstrip("/") or "/", headers, body)
+
+def write_response(writer, status, payload=None, keep_alive=True):
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+def websocket_accept(key):
+    return base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode("latin-1")).digest()).decode("latin-1")
+
+async def read_frame(reader, max_size=MAX_REQUEST_BYTES):
+    """Reads one WebSocket frame. Returns (opcode, payload); masked (client) frames are unmasked."""
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), "big")
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), "big")
+    if max_size is not None and length > max_size:
+        raise HTTPError(413)
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+def write_frame(writer, opcode, payload, mask=False):
+    """Writes one unfragmented WebSocket frame. Servers send unmasked frames, clients must mask."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += length.to_bytes(2, "big")
+    else:
+        header.append(mask_bit | 127)
+        header += length.to_bytes(8, "big")
+    if mask:
+        key = uuid.uuid4().bytes[:4]
+        header += key
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    writer.write(bytes(header) + payload)
+
+
+class MarcoServer:
+    """
+    asyncio front end for the command pipeline. Commands run on a shared CommandScheduler, each with
+    its session's conversation store and a speech sink bound through contextvars, so the handlers
+    need no knowledge of sessions.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS, process=None, classify=None):
+        if process is None:
+            from assistant_actions import process_command, classify_command
+            process, classify = process_command, classify_command
+        self.host = host
+        self.port = port
+        self.sessions = {}
+        self.scheduler = CommandScheduler(process, self._on_result, classify=classify, max_workers=workers)
+        self._render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+        self._waiters = {} # job seq -> future resolved with the finished Job
+        self._connections = set()
+        self._server = None
+        self._sweeper = None
+        self.loop = None
+        self.commands = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1] # Resolves port 0 to the one picked
+        self._sweeper = asyncio.ensure_future(self._sweep_sessions())
+        print(f"Marco server listening on http://{self.host}:{self.port}")
+        return self
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._server:
+            self._server.close()
+            for connection in list(self._connections):
+                connection.cancel()
+            await self._server.wait_closed()
+        self.scheduler.shutdown()
+        self._render_executor.shutdown(wait=False)
+
+    # --- Sessions ---
+
+    def create_session(self):
+        if len(self.sessions) >= MAX_SESSIONS:
+            raise HTTPError(503, "Too many sessions.")
+        session = Session(uuid.uuid4().hex)
+        self.sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, "Unknown session.")
+        session.touch()
+        return session
+
+    def close_session(self, session_id):
+        if self.sessions.pop(session_id, None) is not None:
+            self.scheduler.cancel_all(conversation=session_id)
+
+    async def _sweep_sessions(self):
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+            cutoff = time.monotonic() - SESSION_IDLE_TIMEOUT
+            for session in list(self.sessions.values()):
+                if not session.busy and session.last_active < cutoff:
+                    self.close_session(session.id)
+
+    # --- Commands ---
+
+    async def run_command(self, session, command, on_speech, on_action=None):
+        """
+        Runs command for session and returns the finished Job. on_speech(text) and on_action(action)
+        are called on the event loop for everything the command says and asks the client to do,
+        in order and before the result.
+        """
+        loop = self.loop
+        future = loop.create_future()
+        store_handle = set_current_store(session.store)
+        sink_handle = set_speech_sink(lambda text: loop.call_soon_threadsafe(on_speech, text))
+        def forward_action(action):
+            if on_action is not None:
+                loop.call_soon_threadsafe(on_action, action)
+        # Always bound, so a command never acts on the host, even if the caller ignores the actions
+        action_handle = set_action_sink(forward_action)
+        try:
+            with tracing.trace(source="server"):
+                # The job copies this context, so its handlers see the session's store and sinks
+                job = self.scheduler.submit(command, conversation=session.id)
+        finally:
+            reset_action_sink(action_handle)
+            reset_speech_sink(sink_handle)
+            reset_current_store(store_handle)
+        # Results are handed over with call_soon_threadsafe, so none can arrive before this is registered
+        self._waiters[job.seq] = future
+        self.commands += 1
+        session.busy += 1
+        try:
+            return await future
+        finally:
+            session.busy -= 1
+            session.touch()
+
+    def _on_result(self, job):
+        # Called on a scheduler thread
+        self.loop.call_soon_threadsafe(self._deliver, job)
+
+    def _deliver(self, job):
+        future = self._waiters.pop(job.seq, None)
+        if future is not None and not future.done():
+            future.set_result(job)
+
+    def render(self, text):
+        """Renders text to WAV bytes on the speech worker without blocking the event loop."""
+        return self.loop.run_in_executor(self._render_executor, render_speech, text, RENDER_TIMEOUT)
+
+    @staticmethod
+    def job_summary(job, session):
+        return {
+            "session": session.id,
+            "command": job.command,
+            "result": None if job.cancelled else job.result,
+            "cancelled": job.cancelled or job.result == CANCELLED,
+            "error": None if job.error is None else str(job.error),
+        }
+
+    # --- Connections ---
+
+    async def _handle_connection(self, reader, writer):
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        try:
+            while True:
+                request = None
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    if request.headers.get("upgrade", "").lower() == "websocket":
+                        await self._handle_websocket(request, reader, writer)
+                        break
+                    status, payload = await self._handle_http(request)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                keep_alive = request is not None and request.headers.get("connection", "").lower() != "close"
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass # Client went away, or the server is closing
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    async def _handle_http(self, request):
+        path, method = request.path, request.method
+        if path == "/health" and method == "GET":
+            return 200, {"sessions": len(self.sessions), "in_flight": len(self.scheduler.in_flight()),
+                         "commands": self.commands, "dependencies": breaker_states()}
+        if path == "/sessions" and method == "POST":
+            return 201, {"session": self.create_session().id}
+
+        match = re.fullmatch(r"/sessions/([0-9a-f]+)(/commands|/history)?", path)
+        if not match:
+            raise HTTPError(404)
+        session_id, action = match.groups()
+        if action is None and method == "DELETE":
+            self.get_session(session_id)
+            self.close_session(session_id)
+            return 204, None
+        if action == "/history" and method == "GET":
+            session = self.get_session(session_id)
+            return 200, {"history": list(session.store.history), "summary": session.store.summary}
+        if action == "/commands" and method == "POST":
+            return 200, await self._http_command(self.get_session(session_id), request.json())
+        raise HTTPError(405)
+
+    async def _http_command(self, session, body):
+        command = (body.get("command") or "").strip()
+        if not command:
+            raise HTTPError(400, "No command given.")
+        speech = []
+        renders = []
+
+        def on_speech(text):
+            speech.append(text)
+            if body.get("audio"):
+                renders.append(self.render(text))
+
+        actions = []
+        job = await self.run_command(session, command, on_speech, actions.append)
+        response = self.job_summary(job, session)
+        response["speech"] = speech
+        response["actions"] = actions
+        if body.get("audio"):
+            audio = await asyncio.gather(*renders)
+            response["audio"] = [base64.b64encode(wav).decode("ascii") if wav else None for wav in audio]
+        if job.result == "exit_program":
+            self.close_session(session.id)
+        return response
+
+    async def _handle_websocket(self, request, reader, writer):
+        if request.path == "/ws":
+            session = self.create_session()
+        else:
+            match = re.fullmatch(r"/sessions/([0-9a-f]+)/ws", request.path)
+            if not match:
+                raise HTTPError(404)
+            session = self.get_session(match.group(1))
+        key = request.headers.get("sec-websocket-key")
+        if not key:
+            raise HTTPError(400, "Missing Sec-WebSocket-Key.")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n").encode("latin-1"))
+
+        # Frames go out through one queue so speech, audio and results keep their order
+        outgoing = asyncio.Queue()
+
+        async def send_loop():
+            while True:
+                item = await outgoing.get()
+                if item is None:
+                    return
+                opcode, payload = item
+                if asyncio.isfuture(payload):
+                    payload = await payload
+                    if not payload:
+                        continue
+                write_frame(writer, opcode, payload)
+                await writer.drain()
+
+        def send_json(payload):
+            outgoing.put_nowait((OP_TEXT, json.dumps(payload)))
+
+        async def run(command, audio):
+            def on_speech(text):
+                send_json({"type": "speech", "text": text})
+                if audio:
+                    outgoing.put_nowait((OP_BINARY, self.render(text)))
+            def on_action(action):
+                send_json({"type": "action", "action": action})
+            job = await self.run_command(session, command, on_speech, on_action)
+            send_json(dict(self.job_summary(job, session), type="result"))
+
+        sender = asyncio.ensure_future(send_loop())
+        commands = set()
+        send_json({"type": "session", "session": session.id})
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    outgoing.put_nowait((OP_CLOSE, b""))
+                    break
+                if opcode == OP_PING:
+                    outgoing.put_nowait((OP_PONG, payload))
+                    continue
+                if opcode != OP_TEXT:
+                    continue
+                text = payload.decode("utf-8").strip()
+                try:
+                    message = json.loads(text) if text.startswith("{") else {"command": text}
+                except ValueError:
+                    send_json({"type": "error", "error": "Message is not valid JSON."})
+                    continue
+                command = (message.get("command") or "").strip()
+                if command:
+                    task = asyncio.ensure_future(run(command, message.get("audio")))
+                    commands.add(task)
+                    task.add_done_callback(commands.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if commands:
+                await asyncio.gather(*commands, return_exceptions=True)
+            outgoing.put_nowait(None) # The sender stops once everything queued before this is sent
+            try:
+                await asyncio.wait_for(sender, RENDER_TIMEOUT)
+            except Exception:
+                sender.cancel()
+            session.touch()
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS):
+    """Runs the server until interrupted."""
+    async def run():
+        server = await MarcoServer(host, port, workers).start()
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Marco server stopped.")
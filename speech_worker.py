@@ -0,0 +1,274 @@
+# speech_worker.py
+import os
+import wave
+import threading
+import queue
+import itertools
+import tempfile
+import time
+
+import config # The worker publishes the engine it owns through config.set_engine
+import tracing
+from phrase_cache import AudioClip, phrase_key, get_phrase_cache, get_player
+
+# Lower numbers are spoken first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+_STOP = object() # Sentinel that shuts the worker down
+
+
+class Utterance:
+    """Handle for a piece of text queued on the SpeechWorker."""
+
+    def __init__(self, text, priority=PRIORITY_NORMAL, output_path=None, cache=False):
+        self.text = text
+        self.priority = priority
+        self.output_path = output_path # Rendered to this audio file instead of being spoken
+        self.cache = cache # Fixed phrase: played from the phrase cache once it has been rendered
+        self.phrase = False # Render job that fills the phrase cache
+        self.cancelled = False
+        self.error = None
+        self._done = threading.Event()
+        self.queued_at = time.monotonic()
+        self.trace_parent = tracing.capture() # Speech is attributed to the command that queued it
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """Cancels the utterance; if it is currently being spoken it is cut off at the next word."""
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        """Blocks until the utterance has been spoken or cancelled. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def _finish(self, error=None):
+        self.error = error
+        self._done.set()
+
+
+def _default_engine_factory():
+    try:
+        # The SAPI5 driver on Windows needs COM initialised on the thread that owns the engine
+        import comtypes
+        comtypes.CoInitialize()
+    except ImportError:
+        pass
+    import pyttsx3
+    return pyttsx3.init()
+
+
+class SpeechWorker:
+    """
+    Owns the text-to-speech engine on a single background thread.
+    Utterances are spoken in priority order (FIFO within a priority) and say() never blocks.
+    """
+
+    def __init__(self, engine_factory=None, phrase_cache=None):
+        self.engine_factory = engine_factory or _default_engine_factory
+        self.engine = None
+        self.phrases = phrase_cache if phrase_cache is not None else get_phrase_cache()
+        self._rendering = set() # Phrases with a render job queued
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count() # Keeps FIFO order for equal priorities
+        self._current = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SpeechWorker", daemon=True)
+
+    def start(self, wait=False):
+        """Starts the worker thread. With wait=True, returns once the engine is initialised."""
+        self._thread.start()
+        if wait:
+            self.wait_ready()
+        return self
+
+    def wait_ready(self, timeout=None):
+        """Blocks until the engine has been initialized (or failed to). Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def say(self, text, priority=PRIORITY_NORMAL, interrupt=False, cache=False):
+        """
+        Queues text to be spoken and returns its Utterance handle immediately.
+        With interrupt=True, everything queued or playing is flushed first.
+        With cache=True (for fixed phrases), the text is rendered once and replayed from memory afterwards.
+        """
+        if interrupt:
+            self.flush()
+        utterance = Utterance(text, priority, cache=cache)
+        self._queue.put((priority, next(self._counter), utterance))
+        return utterance
+
+    def render(self, text, output_path, priority=PRIORITY_NORMAL):
+        """
+        Queues text to be synthesized into an audio file at output_path instead of being spoken.
+        Returns its Utterance handle; the file is complete once the handle is done without error.
+        """
+        utterance = Utterance(text, priority, output_path)
+        self._queue.put((priority, next(self._counter), utterance))
+        return utterance
+
+    def prerender(self, texts):
+        """Queues fixed phrases to be rendered into the phrase cache when the worker is otherwise idle."""
+        for text in texts:
+            self._queue_phrase_render(text)
+
+    def _queue_phrase_render(self, text):
+        if self.phrases is None or text in self._rendering:
+            return
+        self._rendering.add(text)
+        fd, path = tempfile.mkstemp(prefix="marco-phrase-", suffix=".wav")
+        os.close(fd)
+        utterance = Utterance(text, PRIORITY_LOW, output_path=path)
+        utterance.phrase = True
+        self._queue.put((PRIORITY_LOW, next(self._counter), utterance))
+
+    def interrupt(self):
+        """Cuts off the utterance currently being spoken, leaving the queue intact."""
+        current = self._current
+        if current:
+            current.cancel()
+
+    def flush(self):
+        """Cancels every queued utterance and interrupts the one being spoken (barge-in)."""
+        keep = [] # Renders are not heard, so barge-in leaves them alone
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            utterance = item[2]
+            if utterance is _STOP:
+                keep.append(item) # Never swallow a shutdown request
+                break
+            if utterance.output_path:
+                keep.append(item)
+                continue
+            utterance.cancel()
+            utterance._finish()
+        for item in keep:
+            self._queue.put(item)
+        current = self._current
+        if current and not current.output_path:
+            current.cancel()
+
+    def stop(self, timeout=None):
+        """Flushes all speech and shuts down the worker thread."""
+        self.flush()
+        self._queue.put((-1, next(self._counter), _STOP))
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def is_busy(self):
+        return self._current is not None or not self._queue.empty()
+
+    def wait_idle(self, timeout=None):
+        """
+        Blocks until everything queued to be spoken has been said (renders are not waited for),
+        e.g. so the goodbye is heard before shutting down. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._thread.is_alive() and self._speech_pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def _speech_pending(self):
+        current = self._current
+        if current is not None and not current.output_path:
+            return True
+        with self._queue.mutex:
+            return any(item[2] is not _STOP and not item[2].output_path and not item[2].cancelled
+                       for item in self._queue.queue)
+
+    def _on_word(self, name, location, length):
+        # Runs on the worker thread inside runAndWait, the only place engine.stop() is safe
+        current = self._current
+        if current and current.cancelled:
+            self.engine.stop()
+
+    def _run(self):
+        try:
+            self.engine = self.engine_factory()
+            self.engine.connect('started-word', self._on_word)
+            config.set_engine(self.engine)
+        except Exception as e:
+            print(f"Speech worker could not initialise the text-to-speech engine: {e}")
+            self.engine = None
+        finally:
+            self._ready.set()
+
+        while True:
+            _, _, utterance = self._queue.get()
+            if utterance is _STOP:
+                break
+            if utterance.cancelled or not self.engine:
+                if not utterance.cancelled:
+                    print(f"Text-to-speech engine unavailable. Would have said: {utterance.text}")
+                if utterance.phrase:
+                    self._discard_phrase_render(utterance)
+                utterance._finish()
+                continue
+
+            self._current = utterance
+            started = time.monotonic()
+            from_cache = False
+            try:
+                if utterance.output_path:
+                    self.engine.save_to_file(utterance.text, utterance.output_path)
+                    self.engine.runAndWait()
+                    if utterance.phrase:
+                        self._store_phrase(utterance)
+                else:
+                    from_cache = utterance.cache and self._play_phrase(utterance)
+                    if not from_cache:
+                        self.engine.say(utterance.text)
+                        self.engine.runAndWait()
+                utterance._finish()
+            except Exception as e:
+                print(f"Speech worker error: {e}")
+                utterance._finish(e)
+            finally:
+                self._current = None
+                tracing.record_span("tts.render" if utterance.output_path else "tts", started, time.monotonic(), parent=utterance.trace_parent,
+                                    chars=len(utterance.text), queued_ms=round((started - utterance.queued_at) * 1000, 3),
+                                    cancelled=utterance.cancelled, cached=from_cache)
+
+    # --- Phrase cache (runs on the worker thread, which owns the engine) ---
+
+    def _voice_settings(self):
+        return tuple(self.engine.getProperty(name) for name in ('voice', 'rate', 'volume'))
+
+    def _play_phrase(self, utterance):
+        """Plays a fixed phrase from the cache. Returns False if it has to be synthesized live instead."""
+        player = get_player()
+        if self.phrases is None or player is None:
+            return False
+        clip = self.phrases.get(phrase_key(utterance.text, self._voice_settings()))
+        if clip is None:
+            self._queue_phrase_render(utterance.text) # Spoken live this time, replayed from memory next time
+            return False
+        player.play(clip, should_stop=lambda: utterance.cancelled)
+        return True
+
+    def _store_phrase(self, utterance):
+        try:
+            clip = AudioClip.from_wav(utterance.output_path)
+            self.phrases.put(phrase_key(utterance.text, self._voice_settings()), clip)
+        except (OSError, EOFError, wave.Error) as e:
+            # Some drivers (e.g. macOS) do not write WAV, so everything is synthesized live there
+            print(f"Could not read the rendered phrase '{utterance.text}', phrase caching disabled: {e}")
+            self.phrases = None
+        finally:
+            self._discard_phrase_render(utterance)
+
+    def _discard_phrase_render(self, utterance):
+        self._rendering.discard(utterance.text)
+        try:
+            os.remove(utterance.output_path)
+        except OSError:
+            pass
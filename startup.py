@@ -0,0 +1,130 @@
+# startup.py
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter() # Imported first by main.py, so this is close to interpreter start
+REPORT_TOP_IMPORTS = 20 # Slowest module imports listed in the report
+
+
+class _TimingLoader:
+    """Wraps a module loader and records how long executing the module took (including its own imports)."""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.record("import", module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder:
+    """Meta path finder that defers to the real finders and wraps the loaders they return."""
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimingLoader(spec.loader, self._profiler)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    """Collects import and initialization timings for --profile-startup."""
+
+    def __init__(self):
+        self.enabled = False
+        self.records = [] # (kind, name, seconds, thread name)
+        self.marks = {} # name -> seconds since process start
+        self._lock = threading.Lock()
+        self._finder = None
+
+    def enable(self):
+        """Starts timing every module imported from now on."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._finder = _TimingFinder(self)
+        sys.meta_path.insert(0, self._finder)
+
+    def disable_import_timing(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def record(self, kind, name, seconds):
+        if self.enabled:
+            with self._lock:
+                self.records.append((kind, name, seconds, threading.current_thread().name))
+
+    @contextmanager
+    def timed(self, name, kind="init"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    def mark(self, name):
+        """Records a milestone, e.g. the window being shown, relative to process start."""
+        if self.enabled:
+            self.marks[name] = time.perf_counter() - PROCESS_START
+
+    def report(self, out=None):
+        out = out or sys.stderr
+        with self._lock:
+            records = list(self.records)
+        imports = sorted((r for r in records if r[0] == "import"), key=lambda r: -r[2])
+        inits = [r for r in records if r[0] != "import"]
+
+        print("=== Startup profile ===", file=out)
+        for name, seconds in sorted(self.marks.items(), key=lambda item: item[1]):
+            print(f"{name:<40} {seconds * 1000:9.1f} ms after start", file=out)
+        print(f"--- Initialization ({len(inits)}) ---", file=out)
+        for _, name, seconds, thread in inits:
+            print(f"{name:<40} {seconds * 1000:9.1f} ms  [{thread}]", file=out)
+        print(f"--- Slowest imports (cumulative, {len(imports)} modules) ---", file=out)
+        for _, name, seconds, thread in imports[:REPORT_TOP_IMPORTS]:
+            print(f"{name:<40} {seconds * 1000:9.1f} ms  [{thread}]", file=out)
+
+
+PROFILER = StartupProfiler()
+
+def timed(name, kind="init"):
+    """Context manager timing a startup step on the global profiler (cheap no-op when disabled)."""
+    return PROFILER.timed(name, kind)
+
+def run_in_background(tasks, on_done=None):
+    """
+    Runs (name, callable) warm-up tasks one after another on a daemon thread, timing each.
+    Failures are printed and do not stop the remaining tasks.
+    """
+    def worker():
+        for name, task in tasks:
+            try:
+                with timed(name):
+                    task()
+            except Exception as e:
+                print(f"Background warm-up of {name} failed: {e}")
+        if on_done:
+            on_done()
+    thread = threading.Thread(target=worker, name="WarmUp", daemon=True)
+    thread.start()
+    return thread
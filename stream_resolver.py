@@ -0,0 +1,285 @@
+# stream_resolver.py
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+import tracing
+import resilience # Deadline, retries and circuit breaker for YouTube
+
+STREAM_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".marco", "stream_cache.json")
+QUERY_CACHE_SIZE = 500 # Search query -> video id entries kept
+STREAM_CACHE_SIZE = 200 # Video id -> stream URL entries kept
+STREAM_URL_DEFAULT_TTL = 3 * 3600 # Used when a stream URL carries no expire= parameter
+EXPIRY_MARGIN = 300 # URLs that expire within this many seconds are resolved again
+YDL_POOL_SIZE = 4 # Idle YoutubeDL instances kept per set of options
+STREAM_CACHE_SAVE_DELAY = 2.0 # Seconds resolve() waits before writing, so a burst of plays is one write
+
+SEARCH_OPTS = {
+    'quiet': True,
+    'noplaylist': True,
+    'extract_flat': 'in_playlist', # Only ids and titles, no per-video resolution
+    'default_search': 'ytsearch',
+}
+STREAM_OPTS = {
+    'format': 'bestaudio/best',
+    'noplaylist': True,
+    'quiet': True,
+}
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def stream_url_expiry(stream_url, now=None):
+    """Returns the wall-clock expiry time of a stream URL (from its expire= parameter when present)."""
+    now = time.time() if now is None else now
+    try:
+        expire = parse_qs(urlparse(stream_url).query).get('expire')
+        if expire:
+            return float(expire[0])
+    except ValueError:
+        pass
+    return now + STREAM_URL_DEFAULT_TTL
+
+
+class ResolvedTrack:
+    def __init__(self, video_id, title, stream_url, expires_at):
+        self.video_id = video_id
+        self.title = title
+        self.stream_url = stream_url
+        self.expires_at = expires_at
+
+    def is_fresh(self, now=None):
+        now = time.time() if now is None else now
+        return bool(self.stream_url) and self.expires_at - EXPIRY_MARGIN > now
+
+    def to_dict(self):
+        return {'video_id': self.video_id, 'title': self.title,
+                'stream_url': self.stream_url, 'expires_at': self.expires_at}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['video_id'], data.get('title'), data.get('stream_url'), data.get('expires_at', 0))
+
+    def __repr__(self):
+        return f"ResolvedTrack({self.video_id!r}, {self.title!r})"
+
+
+class LRUCache:
+    """Small thread-safe LRU map."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+
+class YdlPool:
+    """
+    Reusable YoutubeDL instances for one set of options. An instance is not thread-safe, so each
+    extraction borrows an idle one (or a new one when all are busy) and gives it back afterwards;
+    at most max_idle are kept. Concurrent extractions never wait for each other, and one that hangs
+    past its deadline only holds its own instance.
+    """
+
+    def __init__(self, factory, opts, max_idle=YDL_POOL_SIZE):
+        self.factory = factory
+        self.opts = opts
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def extract_info(self, url):
+        with self._lock:
+            ydl = self._idle.pop() if self._idle else None
+            if ydl is None:
+                self.created += 1
+        if ydl is None:
+            ydl = self.factory(self.opts)
+        try:
+            return ydl.extract_info(url, download=False)
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(ydl)
+
+
+class StreamResolver:
+    """
+    Long-lived yt_dlp front end for music playback. YoutubeDL instances are pooled and reused
+    (see YdlPool), search results (query -> video id) and stream URLs (video id -> URL, until it expires)
+    are cached in LRU maps, and both caches are persisted to disk so repeat plays survive restarts.
+    resolve() only schedules the write, in the background; flush() does it at exit.
+    """
+
+    def __init__(self, cache_path=STREAM_CACHE_PATH, ydl_factory=None, save_delay=STREAM_CACHE_SAVE_DELAY):
+        self.cache_path = cache_path
+        self.save_delay = save_delay
+        self._save_timer = None
+        self.ydl_factory = ydl_factory or self._default_ydl_factory
+        self.queries = LRUCache(QUERY_CACHE_SIZE)
+        self.streams = LRUCache(STREAM_CACHE_SIZE)
+        self._search_pool = YdlPool(self.ydl_factory, SEARCH_OPTS)
+        self._stream_pool = YdlPool(self.ydl_factory, STREAM_OPTS)
+        self._save_lock = threading.Lock() # Guards _save_timer
+        self._write_lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def _default_ydl_factory(opts):
+        import yt_dlp
+        return yt_dlp.YoutubeDL(opts)
+
+    def resolve(self, query):
+        """
+        Returns a ResolvedTrack for the best match of query, or None if the search found nothing.
+        The track's stream_url is None if the video has no direct stream.
+        """
+        key = normalize_query(query)
+        found = self.queries.get(key)
+        if found is None:
+            found = self._search(query)
+            if found is None:
+                return None
+            self.queries.put(key, found)
+            changed = True
+        else:
+            changed = False
+
+        video_id, title = found
+        track = self.streams.get(video_id)
+        if track is None or not track.is_fresh():
+            track = self._resolve_stream(video_id, title)
+            if track.stream_url:
+                self.streams.put(video_id, track)
+            changed = True
+
+        if changed:
+            self._schedule_save()
+        return track
+
+    def resolve_cached(self, query):
+        """Returns a fresh cached ResolvedTrack for query without any network access, or None."""
+        found = self.queries.get(normalize_query(query))
+        if found is None:
+            return None
+        track = self.streams.get(found[0])
+        return track if track and track.is_fresh() else None
+
+    def _search(self, query):
+        with tracing.span("music.search"):
+            info = resilience.call("youtube", self._search_pool.extract_info, f"ytsearch1:{query}")
+        entries = [entry for entry in (info or {}).get('entries') or [] if entry and entry.get('id')]
+        if not entries:
+            return None
+        return entries[0]['id'], entries[0].get('title') or query
+
+    def _resolve_stream(self, video_id, title):
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        with tracing.span("music.stream_url", video_id=video_id):
+            info = resilience.call("youtube", self._stream_pool.extract_info, url)
+        stream_url = (info or {}).get('url')
+        title = (info or {}).get('title') or title
+        expires_at = stream_url_expiry(stream_url) if stream_url else 0
+        return ResolvedTrack(video_id, title, stream_url, expires_at)
+
+    def load(self):
+        """Loads the caches persisted by save(); expired stream URLs are skipped."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for query, video_id, title in data.get('queries', []):
+                self.queries.put(query, (video_id, title))
+            for item in data.get('streams', []):
+                track = ResolvedTrack.from_dict(item)
+                if track.is_fresh():
+                    self.streams.put(track.video_id, track)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not load stream cache: {e}")
+
+    def _schedule_save(self):
+        """Saves in the background after save_delay, unless a save is already scheduled."""
+        if not self.cache_path:
+            return
+        with self._save_lock:
+            if self._save_timer is not None:
+                return # The scheduled save writes this change too
+            self._save_timer = threading.Timer(self.save_delay, self.save)
+            self._save_timer.daemon = True # flush() writes whatever is left at exit
+            self._save_timer.start()
+
+    def flush(self):
+        """Writes a pending scheduled save now. Called at exit."""
+        with self._save_lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    def save(self):
+        """Writes both caches to disk atomically (in LRU order, so eviction order survives restarts)."""
+        if not self.cache_path:
+            return
+        with self._save_lock:
+            self._save_timer = None
+        data = {
+            'queries': [[query, video_id, title] for query, (video_id, title) in self.queries.items()],
+            'streams': [track.to_dict() for _, track in self.streams.items()],
+        }
+        try:
+            with self._write_lock:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                temp_path = self.cache_path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not save stream cache: {e}")
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_stream_resolver():
+    """Returns the shared StreamResolver, creating it on first use."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = StreamResolver()
+    return _resolver
+
+def flush_stream_cache():
+    """Writes out the streams resolved since the last save. Called at exit."""
+    if _resolver is not None:
+        _resolver.flush()
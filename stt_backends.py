@@ -0,0 +1,266 @@
+# stt_backends.py
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+import config # For the shared Recognizer
+import tracing
+
+STT_CHAIN = ("whisper", "google") # Backends tried in order; ones that are not installed are skipped
+STT_MODE = "fallback" # "fallback": next backend on failure/low confidence, "race": run all, first good result wins
+STT_MIN_CONFIDENCE = 0.6 # Results below this are only used if nothing better arrives
+STT_DEADLINE = 4.0 # Seconds the chain waits in race mode
+WHISPER_MODEL = "base"
+DEFAULT_CONFIDENCE = 0.8 # Google omits confidence for some results
+SPHINX_CONFIDENCE = 0.5 # PocketSphinx gives no usable confidence; treat it as a weak guess
+LATENCY_WINDOW = 100 # Recent samples kept per backend for percentiles
+
+
+class STTResult:
+    def __init__(self, text, confidence, backend, latency):
+        self.text = text
+        self.confidence = confidence
+        self.backend = backend
+        self.latency = latency
+
+    def __repr__(self):
+        return f"STTResult({self.text!r}, confidence={self.confidence:.2f}, backend={self.backend}, latency={self.latency:.3f}s)"
+
+
+class LatencyStats:
+    """Call counts and recent latencies for one backend."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.failures += 1
+            self.total_time += latency
+            self.recent.append(latency)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(math.ceil(p / 100.0 * len(samples))) - 1)
+        return samples[max(0, index)]
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "mean": self.total_time / self.calls if self.calls else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+_recognizer_lock = threading.Lock()
+
+def get_recognizer():
+    """Returns the shared Recognizer from config, creating it on first use."""
+    recognizer = config.get_recognizer()
+    if recognizer is None:
+        with _recognizer_lock:
+            recognizer = config.get_recognizer()
+            if recognizer is None:
+                import speech_recognition as sr # Imported on first use to keep startup fast
+                recognizer = sr.Recognizer()
+                config.set_recognizer(recognizer)
+    return recognizer
+
+
+class STTBackend:
+    """
+    Base class for speech-to-text engines.
+    transcribe() returns (text, confidence) and raises sr.UnknownValueError when nothing was understood.
+    """
+    name = "base"
+    offline = False
+
+    def available(self):
+        return True
+
+    def transcribe(self, audio_data):
+        raise NotImplementedError
+
+    def recognize(self, audio_data):
+        start = time.monotonic()
+        text, confidence = self.transcribe(audio_data)
+        return STTResult(text.strip().lower(), confidence, self.name, time.monotonic() - start)
+
+
+class GoogleBackend(STTBackend):
+    name = "google"
+
+    def transcribe(self, audio_data):
+        import speech_recognition as sr
+        response = get_recognizer().recognize_google(audio_data, show_all=True)
+        alternatives = response.get("alternative") if isinstance(response, dict) else None
+        if not alternatives:
+            raise sr.UnknownValueError()
+        best = alternatives[0]
+        return best["transcript"], best.get("confidence", DEFAULT_CONFIDENCE)
+
+
+class WhisperBackend(STTBackend):
+    """Local Whisper model, no network needed once the model is downloaded."""
+    name = "whisper"
+    offline = True
+
+    def __init__(self, model=WHISPER_MODEL):
+        self.model = model
+
+    def available(self):
+        try:
+            import whisper
+            return True
+        except ImportError:
+            return False
+
+    def transcribe(self, audio_data):
+        import speech_recognition as sr
+        result = get_recognizer().recognize_whisper(audio_data, model=self.model, language="english", show_dict=True)
+        text = result.get("text", "").strip()
+        segments = result.get("segments") or []
+        if not text or not segments:
+            raise sr.UnknownValueError()
+        # Mean per-token log probability of the segments, mapped back to a probability
+        avg_logprob = sum(seg["avg_logprob"] for seg in segments) / len(segments)
+        no_speech = max(seg.get("no_speech_prob", 0.0) for seg in segments)
+        return text, math.exp(avg_logprob) * (1.0 - no_speech)
+
+
+class SphinxBackend(STTBackend):
+    """PocketSphinx, fully offline but much less accurate."""
+    name = "sphinx"
+    offline = True
+
+    def available(self):
+        try:
+            import pocketsphinx
+            return True
+        except ImportError:
+            return False
+
+    def transcribe(self, audio_data):
+        import speech_recognition as sr
+        text = get_recognizer().recognize_sphinx(audio_data)
+        if not text.strip():
+            raise sr.UnknownValueError()
+        return text, SPHINX_CONFIDENCE
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "whisper": WhisperBackend,
+    "sphinx": SphinxBackend,
+}
+
+
+class RecognitionChain:
+    """
+    Runs one or more STT backends for an utterance.
+    In "fallback" mode backends are tried in order until one is confident enough;
+    in "race" mode they run concurrently and the first confident result within the deadline wins.
+    The best result seen is returned if no backend reaches min_confidence.
+    """
+
+    def __init__(self, backends, mode=STT_MODE, min_confidence=STT_MIN_CONFIDENCE, deadline=STT_DEADLINE):
+        self.backends = list(backends)
+        self.mode = mode
+        self.min_confidence = min_confidence
+        self.deadline = deadline
+        self.stats = {backend.name: LatencyStats() for backend in self.backends}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def recognize(self, audio_data):
+        """Returns the best STTResult, or None if no backend understood the audio."""
+        if self.mode == "race" and len(self.backends) > 1:
+            return self._race(audio_data)
+        return self._fallback(audio_data)
+
+    def latency_summary(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def _run(self, backend, audio_data):
+        import speech_recognition as sr
+        start = time.monotonic()
+        with tracing.span(f"stt.{backend.name}") as backend_span:
+            try:
+                result = backend.recognize(audio_data)
+            except sr.UnknownValueError:
+                self.stats[backend.name].record(time.monotonic() - start, ok=True)
+                backend_span.set(understood=False)
+                return None
+            except Exception as e:
+                self.stats[backend.name].record(time.monotonic() - start, ok=False)
+                backend_span.error = f"{type(e).__name__}: {e}"
+                print(f"{backend.name} speech recognition error: {e}")
+                return None
+            backend_span.set(confidence=result.confidence)
+        self.stats[backend.name].record(result.latency, ok=True)
+        return result
+
+    def _fallback(self, audio_data):
+        best = None
+        for backend in self.backends:
+            result = self._run(backend, audio_data)
+            if result is None:
+                continue
+            if result.confidence >= self.min_confidence:
+                return result
+            print(f"Low confidence from {backend.name} ({result.confidence:.2f}), trying next backend.")
+            if best is None or result.confidence > best.confidence:
+                best = result
+        return best
+
+    def _get_executor(self):
+        # Voice commands and the wake word listener can race here; only one pool may be created
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=len(self.backends), thread_name_prefix="stt")
+        return self._executor
+
+    def _race(self, audio_data):
+        executor = self._get_executor()
+        futures = [executor.submit(contextvars.copy_context().run, self._run, backend, audio_data)
+                   for backend in self.backends]
+        best = None
+        try:
+            for future in as_completed(futures, timeout=self.deadline):
+                result = future.result()
+                if result is None:
+                    continue
+                if result.confidence >= self.min_confidence:
+                    return result
+                if best is None or result.confidence > best.confidence:
+                    best = result
+        except FuturesTimeoutError:
+            print(f"Speech recognition deadline of {self.deadline}s reached.")
+        return best # Slower backends keep running in the background and only update the stats
+
+
+def build_chain(names=STT_CHAIN, **kwargs):
+    """Builds a RecognitionChain from backend names, skipping backends that are not installed."""
+    backends = []
+    for name in names:
+        backend = BACKENDS[name]()
+        if backend.available():
+            backends.append(backend)
+        else:
+            print(f"Speech recognition backend '{name}' is not installed, skipping it.")
+    return RecognitionChain(backends, **kwargs)
@@ -0,0 +1,60 @@
+# tests/conftest.py
+import os
+import sys
+import math
+import wave
+from array import array
+
+import pytest
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_storage(tmp_path_factory):
+    """
+    Keeps the suite out of ~/.marco: traces go to a temporary directory, the conversation history is
+    not saved, and the shared stream and response caches live in memory only.
+    """
+    import tracing
+    import history_db
+    import stream_resolver
+    import response_cache
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(tracing, "TRACE_LOG_PATH", str(tmp_path_factory.mktemp("marco") / "traces.jsonl"))
+        patch.setattr(history_db, "HISTORY_DB_ENABLED", False)
+        patch.setattr(history_db, "HISTORY_DB_PATH", None)
+        patch.setattr(stream_resolver, "STREAM_CACHE_PATH", None)
+        patch.setattr(stream_resolver, "_resolver", stream_resolver.StreamResolver(cache_path=None))
+        patch.setattr(response_cache, "RESPONSE_CACHE_PATH", None)
+        patch.setattr(response_cache, "_cache", response_cache.ResponseCache(path=None))
+        yield
+
+
+@pytest.fixture(scope="session")
+def fakes():
+    """Installs the fakes from benchmarks/fakes.py, with no simulated latency, for tests that need the services."""
+    from benchmarks import fakes as fake_services
+    return fake_services.install(latency_scale=0)
+
+
+@pytest.fixture
+def make_wav(tmp_path):
+    """
+    Writes a 16 kHz 16-bit mono WAV file from (seconds, amplitude) segments, like
+    audio_capture.SyntheticSource: amplitude 0 is silence, anything else a 220 Hz tone. Returns its path.
+    """
+    def make(segments, name="utterance.wav", sample_rate=16000):
+        samples = array('h')
+        for seconds, amplitude in segments:
+            for i in range(int(seconds * sample_rate)):
+                samples.append(int(amplitude * math.sin(2 * math.pi * 220 * i / sample_rate)))
+        path = str(tmp_path / name)
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(sample_rate)
+            f.writeframes(samples.tobytes())
+        return path
+    return make
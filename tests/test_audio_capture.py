@@ -0,0 +1,72 @@
+# tests/test_audio_capture.py
+import pytest
+
+from audio_capture import (AudioCapture, SyntheticSource, WavFileSource, FRAME_MS, PRE_ROLL_MS, HANGOVER_MS,
+                           MAX_UTTERANCE_SECONDS, RING_BUFFER_SECONDS, SAMPLE_WIDTH, UTTERANCE_QUEUE_SIZE)
+
+TONE = 3000 # Well above MIN_ENERGY_THRESHOLD
+FRAME = FRAME_MS / 1000.0
+
+
+def capture_all(source, timeout=10.0):
+    """Runs the capture over the whole source, returning (capture, utterances in order)."""
+    emitted = []
+    capture = AudioCapture(source, on_utterance=emitted.append).start()
+    assert capture.finished.wait(timeout)
+    utterances = []
+    while True:
+        utterance = capture.next_utterance(timeout=0)
+        if utterance is None:
+            break
+        utterances.append(utterance)
+    assert utterances == emitted[len(emitted) - len(utterances):] # The callback also sees dropped ones
+    return capture, utterances
+
+
+def test_utterance_includes_pre_roll(make_wav):
+    silence, tone = 0.99, 0.6 # Silence is a whole number of frames, so the tone starts on a frame boundary
+    _, utterances = capture_all(WavFileSource(make_wav([(silence, 0), (tone, TONE), (1.5, 0)])))
+    assert len(utterances) == 1
+    utterance = utterances[0]
+    assert utterance.started_at == pytest.approx(silence - PRE_ROLL_MS / 1000.0, abs=FRAME)
+    # Pre-roll, the tone itself and the trailing silence that ended it
+    assert utterance.duration == pytest.approx(PRE_ROLL_MS / 1000.0 + tone + HANGOVER_MS / 1000.0, abs=2 * FRAME)
+    assert utterance.sample_rate == 16000 and utterance.sample_width == SAMPLE_WIDTH
+
+def test_silence_longer_than_hangover_ends_the_utterance():
+    gap = HANGOVER_MS / 1000.0 + 0.5
+    _, utterances = capture_all(SyntheticSource([(0.5, 0), (0.6, TONE), (gap, 0), (0.6, TONE), (1.5, 0)]))
+    assert len(utterances) == 2
+    assert utterances[1].started_at == pytest.approx(0.5 + 0.6 + gap - PRE_ROLL_MS / 1000.0, abs=FRAME)
+
+def test_pause_shorter_than_hangover_keeps_one_utterance():
+    gap = HANGOVER_MS / 1000.0 - 0.3
+    _, utterances = capture_all(SyntheticSource([(0.5, 0), (0.6, TONE), (gap, 0), (0.6, TONE), (1.5, 0)]))
+    assert len(utterances) == 1
+    assert utterances[0].duration > 0.6 + gap + 0.6
+
+def test_long_speech_is_split_at_max_utterance_length():
+    speech = MAX_UTTERANCE_SECONDS + 3
+    _, utterances = capture_all(SyntheticSource([(0.5, 0), (speech, TONE), (1.5, 0)]))
+    assert len(utterances) == 2
+    assert utterances[0].duration == pytest.approx(MAX_UTTERANCE_SECONDS, abs=FRAME)
+    assert all(utterance.duration <= MAX_UTTERANCE_SECONDS for utterance in utterances)
+
+def test_ring_buffer_is_bounded():
+    capture, _ = capture_all(SyntheticSource([(RING_BUFFER_SECONDS * 2, 0)]))
+    frame_bytes = int(16000 * FRAME) * SAMPLE_WIDTH
+    ring_frames = int(RING_BUFFER_SECONDS * 1000 / FRAME_MS)
+    assert len(capture.recent_audio(RING_BUFFER_SECONDS * 4)) == ring_frames * frame_bytes
+    assert len(capture.recent_audio(1)) == int(1000 / FRAME_MS) * frame_bytes
+
+def test_unconsumed_utterances_are_bounded_keeping_the_newest():
+    gap = HANGOVER_MS / 1000.0 + 0.5
+    count = UTTERANCE_QUEUE_SIZE + 3
+    segments = [(0.5, 0)]
+    for _ in range(count):
+        segments += [(0.6, TONE), (gap, 0)]
+    capture, utterances = capture_all(SyntheticSource(segments))
+    assert len(utterances) == UTTERANCE_QUEUE_SIZE
+    assert capture.dropped == 3
+    # The oldest ones were dropped
+    assert utterances[0].started_at == pytest.approx(0.5 + 3 * (0.6 + gap) - PRE_ROLL_MS / 1000.0, abs=FRAME)
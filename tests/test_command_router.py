@@ -0,0 +1,48 @@
+# tests/test_command_router.py
+import pytest
+
+from command_router import CommandRouter
+
+
+def make_router():
+    router = CommandRouter()
+    router.register("marco_stop", lambda match: "exit", phrases=["marco stop"], priority=100)
+    router.register("play", lambda match: match.argument, prefixes=["play"], priority=80)
+    router.register("stop_music", lambda match: "stopped", phrases=["stop music"], priority=70)
+    router.register("news", lambda match: "news", phrases=["news"], priority=60)
+    router.register("next_track", lambda match: "next", patterns=[r"^\s*(?:next|skip)\s*$"], priority=82)
+    router.set_fallback("llm", lambda match: "llm")
+    return router
+
+
+@pytest.mark.parametrize("command, route", [
+    ("play some news music", "play"), # Prefix beats the lower priority phrases
+    ("please stop music and read the news", "stop_music"),
+    ("the news then marco stop music", "marco_stop"), # Overlaps "stop music", higher priority wins
+    ("marco stop music", "marco_stop"),
+    ("stop musicals", "llm"), # Phrases are whole words
+    ("next", "next_track"),
+    ("next week", "llm"),
+    ("what is the capital of australia", "llm"),
+])
+def test_highest_priority_trigger_wins(command, route):
+    assert make_router().match(command).route.name == route
+
+def test_argument_follows_the_trigger():
+    match = make_router().match("play lofi hip hop")
+    assert (match.trigger, match.argument) == ("play", "lofi hip hop")
+    assert make_router().dispatch("play lofi hip hop") == "lofi hip hop"
+
+def test_overlapping_trigger_starting_later_is_found():
+    router = CommandRouter()
+    router.register("low", lambda match: None, phrases=["good morning"], priority=1)
+    router.register("high", lambda match: None, phrases=["morning news"], priority=2)
+    match = router.match("good morning news")
+    assert match.route.name == "high" and match.trigger == "morning news"
+
+def test_named_groups_in_patterns_are_rejected():
+    router = CommandRouter()
+    with pytest.raises(ValueError):
+        router.register("volume", lambda match: None, patterns=[r"volume (?P<level>\d+)"])
+    router.register("volume", lambda match: None, patterns=[r"volume (?:\d+)"])
+    assert router.match("volume 5").route.name == "volume"
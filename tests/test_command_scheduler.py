@@ -0,0 +1,71 @@
+# tests/test_command_scheduler.py
+import time
+import threading
+
+from command_scheduler import CommandScheduler, CANCELLED
+
+
+def classify(command):
+    if command == "stop":
+        return None, None, True
+    if command.startswith("play"):
+        return "music", "supersede", False
+    return None, None, False
+
+def process(command):
+    time.sleep({"stop": 0.1}.get(command, 0.3 if "slow" in command else 0.01))
+    return command
+
+
+def test_results_are_delivered_in_submission_order():
+    delivered = []
+    done = threading.Event()
+
+    def on_result(job):
+        delivered.append(job.command)
+        if len(delivered) == 3:
+            done.set()
+
+    scheduler = CommandScheduler(process, on_result, classify=classify)
+    for command in ("slow one", "two", "three"):
+        scheduler.submit(command)
+    assert done.wait(5)
+    scheduler.shutdown()
+    assert delivered == ["slow one", "two", "three"]
+
+def test_on_result_may_shut_down_the_scheduler():
+    # Exit handled from inside the delivery while a later command still runs: nothing may deadlock
+    delivered = []
+    done = threading.Event()
+
+    def on_result(job):
+        delivered.append((job.command, job.result))
+        if job.command == "stop":
+            scheduler.shutdown()
+        if len(delivered) == 3:
+            done.set()
+
+    scheduler = CommandScheduler(process, on_result, classify=classify)
+    scheduler.submit("play something")
+    scheduler.submit("stop")
+    time.sleep(0.05)
+    scheduler.submit("play slow")
+    assert done.wait(5)
+    assert delivered == [("play something", CANCELLED), ("stop", "stop"), ("play slow", CANCELLED)]
+
+def test_submit_never_delivers_on_the_calling_thread():
+    # The GUI submits from the Tk thread, and its on_result waits for the Tk thread
+    threads = {}
+    done = threading.Event()
+
+    def on_result(job):
+        threads[job.command] = threading.current_thread()
+        if len(threads) == 2:
+            done.set()
+
+    scheduler = CommandScheduler(process, on_result, classify=classify)
+    scheduler.submit("play slow")
+    scheduler.submit("play lofi") # Supersedes the first one
+    assert done.wait(5)
+    scheduler.shutdown()
+    assert threading.current_thread() not in threads.values()
@@ -0,0 +1,62 @@
+# tests/test_conversation.py
+import time
+
+import pytest
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def db(fakes):
+    from history_db import HistoryDB
+    db = HistoryDB(":memory:", flush_interval=0)
+    yield db
+    db.close()
+
+def fill(store, turns):
+    for i in range(turns):
+        store.append("user" if i % 2 == 0 else "assistant", f"turn {i} " + "words " * 20)
+
+
+def test_summary_is_saved_with_the_turns_it_covers(db):
+    from conversation import ConversationStore
+    calls = []
+    def summarizer(previous, messages):
+        calls.append(len(messages))
+        return f"summary of {sum(calls)} messages"
+
+    store = ConversationStore(summarizer=summarizer, db=db, max_tokens=100)
+    fill(store, 10)
+    assert wait_until(lambda: db.load_summary() is not None and not store._summarizing)
+    summary, through_id = db.load_summary()
+    assert summary == store.summary
+    # Everything up to the oldest turn still in the window was summarized
+    newest_summarized = db.page(None, 10)[sum(calls) - 1]
+    assert through_id == newest_summarized["id"]
+
+def test_restart_loads_the_summary_instead_of_summarizing_again(db, monkeypatch):
+    import config
+    import conversation
+    from conversation import ConversationStore
+    store = ConversationStore(summarizer=lambda previous, messages: "what was said", db=db, max_tokens=100)
+    fill(store, 10)
+    assert wait_until(lambda: db.load_summary() is not None and not store._summarizing)
+    db.flush()
+
+    persona = [{"role": "system", "content": "You are Marco."}]
+    monkeypatch.setattr(config, "CONVERSATION_HISTORY", list(persona), raising=False)
+    monkeypatch.setattr(conversation, "get_history_db", lambda: db)
+    monkeypatch.setattr(conversation, "_store", None)
+    monkeypatch.setattr(conversation, "MAX_CONTEXT_TOKENS", 100)
+    restarted = conversation.get_store()
+    assert restarted.summary == "what was said"
+    assert not restarted._summarizing # Only the turns after the summary were loaded, and they fit
+    assert [m["content"] for m in restarted.history[1:]] == \
+        [turn["content"] for turn in db.page(None, 10) if turn["id"] > db.load_summary()[1]]
@@ -0,0 +1,90 @@
+# tests/test_conversation_view.py
+import pytest
+
+from conversation_view import ConversationView, format_turn
+
+MAX_LINES = 10
+CHUNK = 4
+
+
+@pytest.fixture
+def store(fakes):
+    from conversation import ConversationStore
+    from history_db import HistoryDB
+    db = HistoryDB(":memory:", flush_interval=0)
+    store = ConversationStore(summarizer=None, db=db, max_history=MAX_LINES)
+    yield store
+    db.close()
+
+def add_turns(store, view, count, start=0):
+    for i in range(start, start + count):
+        turn = store.append("user" if i % 2 == 0 else "assistant", f"turn {i}")
+        view.append([(format_turn(turn), turn)])
+    store.db.flush()
+
+def contents(view):
+    return [text.split(": ", 1)[1] for text in view.texts()]
+
+
+def test_window_stays_bounded(store):
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    add_turns(store, view, 50)
+    assert view.lines == MAX_LINES
+    assert contents(view) == [f"turn {i}" for i in range(40, 50)]
+    assert view.has_older and not view.detached
+
+def test_multi_line_entries_count_every_line(store):
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    added, dropped = view.append([("Marco: one\ntwo\nthree", None)] * 4)
+    assert len(added) == 4 and dropped == 3
+    assert view.lines == 9 and len(view.entries) == 3
+
+def test_scrolling_back_pages_older_turns_and_drops_the_newest(store):
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    add_turns(store, view, 50)
+    assert view.page_older() == CHUNK
+    assert contents(view) == [f"turn {i}" for i in range(36, 46)]
+    assert view.lines == MAX_LINES and view.detached
+
+    while view.page_older():
+        assert view.lines <= MAX_LINES
+    assert contents(view)[0] == "turn 0"
+    assert not view.has_older
+
+def test_scrolling_forward_pages_newer_turns_until_the_latest(store):
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    add_turns(store, view, 50)
+    for _ in range(5):
+        view.page_older()
+    assert contents(view) == [f"turn {i}" for i in range(20, 30)]
+
+    while view.detached:
+        view.page_newer()
+        assert view.lines <= MAX_LINES
+    assert contents(view) == [f"turn {i}" for i in range(40, 50)]
+
+def test_jump_to_latest_then_append_does_not_repeat_turns(store):
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    add_turns(store, view, 20)
+    view.page_older()
+    turn = store.append("user", "turn 20") # Arrives while scrolled back
+    view.jump_to_latest()
+    view.append([(format_turn(turn), turn)])
+    assert contents(view) == [f"turn {i}" for i in range(11, 21)]
+    assert not view.detached
+
+def test_echoed_command_is_linked_to_its_turn(store):
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    view.append([("You: hello", None)])
+    turn = store.append("user", "hello")
+    assert view.attach_turn(format_turn(turn), turn)
+    store.db.flush()
+    assert view.oldest_turn_id() == turn["id"]
+
+def test_without_a_database_old_lines_are_dropped(fakes):
+    from conversation import ConversationStore
+    store = ConversationStore(summarizer=None)
+    view = ConversationView(store, max_lines=MAX_LINES, chunk=CHUNK)
+    view.append([(format_turn(store.append("user", f"turn {i}")), None) for i in range(30)])
+    assert view.lines == MAX_LINES
+    assert view.page_older() == 0 and not view.detached
@@ -0,0 +1,123 @@
+# tests/test_intent_classifier.py
+"""
+Held-out evaluation of the intent classifier on the INTENTS of assistant_actions.py: phrasings
+that are not among the examples, and near misses that must stay with the LLM.
+"""
+import time
+
+import pytest
+
+# (command, what it must be rewritten to, None when it must reach the LLM unchanged)
+HELD_OUT = [
+    ("put on some taylor swift", "play taylor swift"),
+    ("i want to hear some lofi", "play lofi"),
+    ("throw on some jazz", "play jazz"),
+    ("start playing some classical music", "play classical music"),
+    ("let me hear some rock", "play rock"),
+    ("could you put on the beatles", "play beatles"),
+    ("id like to hear some piano music", "play piano music"),
+    ("blast some drake", "play drake"),
+    ("put on relaxing music please", "play relaxing music"),
+    ("i wanna listen to some old bollywood songs", "play old bollywood songs"),
+    ("add bohemian rhapsody to the queue", "queue bohemian rhapsody"),
+    ("put some jazz on my playlist", "queue jazz"),
+    ("add coldplay to the list", "queue coldplay"),
+    ("shut the music off", "stop music"),
+    ("turn off the song", "stop music"),
+    ("kill the song", "stop music"),
+    ("pause the song", "stop music"),
+    ("silence the song", "stop music"),
+    ("please stop the music", "stop music"),
+    ("skip to the next song", "next song"),
+    ("next track please", "next song"),
+    ("change this song", "next song"),
+    ("skip that track", "next song"),
+    ("move to the next track", "next song"),
+    ("what is happening in india", "indian news"),
+    ("top stories in india today", "indian news"),
+    ("latest headlines in india", "indian news"),
+    ("world headlines today", "international news"),
+    ("what is happening around the world", "international news"),
+    ("global headlines", "international news"),
+    ("top stories from around the world", "international news"),
+    ("take me to youtube", "open youtube"),
+    ("launch google", "open google"),
+    ("go to linkedin", "open linkedin"),
+    ("pull up facebook", "open facebook"),
+    ("bring up google", "open google"),
+]
+
+NEAR_MISSES = [
+    "listen to me carefully",
+    "i want to listen to you",
+    "listen to this joke",
+    "let me hear your opinion",
+    "i want to hear a story",
+    "can you hear me",
+    "put on a happy face",
+    "put on your thinking cap",
+    "turn off the lights",
+    "turn the lights off",
+    "turn on the lights",
+    "turn off the tv",
+    "stop talking",
+    "shut up",
+    "stop the car",
+    "kill the spider",
+    "what is happening in the world of football",
+    "what is happening in the world of science",
+    "whats going on with the weather",
+    "whats going on in the world of cricket",
+    "what is going on in the world of politics",
+    "whats happening in the world of movies",
+    "whats new in the world of tech",
+    "whats going on with bitcoin",
+    "what is happening with the stock market",
+    "what is happening in bollywood",
+    "whats going on in cricket these days",
+    "tell me about india",
+    "who is the prime minister of india",
+    "take me to the moon",
+    "open the door",
+    "what music should i listen to",
+    "what song is this",
+    "i love this song",
+    "skip the small talk",
+    "what is the next big thing in tech",
+    "start a timer",
+]
+
+
+@pytest.fixture(scope="module")
+def classifier(fakes):
+    from assistant_actions import ROUTER
+    classifier = ROUTER.classifier
+    classifier.ensure_fitted()
+    return classifier
+
+def rewrite(classifier, command):
+    match = classifier.classify(command)
+    return None if match is None else match.command
+
+
+@pytest.mark.parametrize("command, expected", HELD_OUT)
+def test_held_out_phrasings_are_understood(classifier, command, expected):
+    assert rewrite(classifier, command) == expected
+
+@pytest.mark.parametrize("command", NEAR_MISSES)
+def test_near_misses_stay_with_the_llm(classifier, command):
+    assert rewrite(classifier, command) is None
+
+def test_near_misses_are_routed_to_the_llm(fakes):
+    from assistant_actions import ROUTER
+    for command in NEAR_MISSES:
+        assert ROUTER.match(command).route is ROUTER.fallback, command
+
+def test_classification_takes_under_a_millisecond(classifier):
+    commands = [command for command, _ in HELD_OUT] + NEAR_MISSES
+    start = time.perf_counter()
+    for _ in range(5):
+        for command in commands:
+            classifier.classify(command)
+    per_command = (time.perf_counter() - start) / (5 * len(commands))
+    assert per_command < 0.001
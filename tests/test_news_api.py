@@ -0,0 +1,121 @@
+# tests/test_news_api.py
+import time
+import threading
+
+import pytest
+
+
+class StubResponse:
+    def __init__(self, articles):
+        self.articles = articles
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"articles": self.articles}
+
+
+class StubSession:
+    """Stands in for requests.Session: every GET returns the next batch of headlines for its feed."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.down = False
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        time.sleep(self.delay)
+        with self._lock:
+            self.calls.append((params.get("country"), params.get("topic")))
+            count = len(self.calls)
+        if self.down:
+            raise ConnectionError("GNews is down")
+        return StubResponse([{"title": f"Headline {count}"}])
+
+
+@pytest.fixture
+def session(fakes):
+    import resilience
+    resilience.reset_breakers() # Failures of one test must not open the breaker for the next
+    return StubSession()
+
+def make_client(session, ttl=0.2, stale_ttl=0.6):
+    from news_api import NewsClient
+    return NewsClient(api_key="test", ttl=ttl, stale_ttl=stale_ttl, session=session)
+
+def titles(articles):
+    return [article["title"] for article in articles]
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_fresh_headlines_are_served_from_memory(session):
+    client = make_client(session)
+    assert client.get_articles(country="in") == ([{"title": "Headline 1"}], "miss")
+    assert client.get_articles(country="in") == ([{"title": "Headline 1"}], "hit")
+    assert session.calls == [("in", None)]
+    client.get_articles(topic="breaking") # Feeds are cached separately
+    assert session.calls == [("in", None), (None, "breaking")]
+
+def test_stale_headlines_are_served_while_refreshing(session):
+    client = make_client(session)
+    client.get_articles(country="in")
+    time.sleep(0.25) # Past the TTL, within the stale TTL
+    session.delay = 0.1
+    start = time.monotonic()
+    articles, source = client.get_articles(country="in")
+    assert (titles(articles), source) == (["Headline 1"], "stale")
+    assert time.monotonic() - start < 0.05 # Did not wait for the refresh
+    assert client.get_articles(country="in")[1] == "stale" # Still refreshing: served stale, no second refresh
+    assert wait_until(lambda: client.get_articles(country="in")[1] == "hit")
+    assert titles(client.get_articles(country="in")[0]) == ["Headline 2"]
+    assert len(session.calls) == 2
+
+def test_headlines_past_the_stale_ttl_are_fetched_again(session):
+    client = make_client(session, ttl=0.05, stale_ttl=0.1)
+    client.get_articles(country="in")
+    time.sleep(0.15)
+    articles, source = client.get_articles(country="in")
+    assert (titles(articles), source) == (["Headline 2"], "miss")
+
+def test_expired_headlines_beat_no_headlines(session):
+    client = make_client(session, ttl=0.05, stale_ttl=0.1)
+    client.get_articles(country="in")
+    time.sleep(0.15)
+    session.down = True
+    articles, source = client.get_articles(country="in")
+    assert (titles(articles), source) == (["Headline 1"], "expired")
+    with pytest.raises(ConnectionError):
+        client.get_articles(topic="breaking") # Nothing cached to fall back on
+    assert client.stats()["fetch_errors"] == 2
+
+def test_prefetch_keeps_the_feeds_warm(session):
+    client = make_client(session)
+    client.start_prefetch(feeds=({"country": "in"}, {"topic": "breaking"}), interval=0.05)
+    try:
+        assert wait_until(lambda: len(session.calls) >= 4) # Two rounds
+        assert client.get_articles(country="in")[1] == "hit"
+        assert client.get_articles(topic="breaking")[1] == "hit"
+    finally:
+        client.stop_prefetch()
+    assert set(session.calls) == {("in", None), (None, "breaking")}
+
+def test_stats_count_concurrent_fetches(session):
+    client = make_client(session)
+    threads = [threading.Thread(target=lambda: [client.refresh(country="in") for _ in range(25)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = client.stats()
+    assert stats["fetches"] == len(session.calls) == 200
+    assert stats["fetch_errors"] == 0 and stats["fetch_p50"] is not None
@@ -0,0 +1,160 @@
+# tests/test_phrase_cache.py
+import sys
+import time
+import wave
+
+import pytest
+
+import phrase_cache
+from phrase_cache import AudioClip, PhraseCache, phrase_key, PRERENDER_PHRASES
+
+VOICE = ("voice-1", 200, 1.0) # voice id, rate, volume
+
+
+def clip(size):
+    return AudioClip(b"\x00" * size, 22050, 2)
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class FakeEngine:
+    """Stands in for the pyttsx3 engine: records what is spoken live and writes renders as WAV files."""
+
+    def __init__(self):
+        self.properties = {"voice": VOICE[0], "rate": VOICE[1], "volume": VOICE[2]}
+        self.said = []
+        self.rendered = []
+        self._pending = []
+
+    def getProperty(self, name):
+        return self.properties[name]
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def connect(self, event, callback):
+        pass
+
+    def say(self, text):
+        self._pending.append((text, None))
+
+    def save_to_file(self, text, path):
+        self._pending.append((text, path))
+
+    def runAndWait(self):
+        for text, path in self._pending:
+            if path is None:
+                self.said.append(text)
+                continue
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(22050)
+                f.writeframes(b"\x00\x01" * 100 * len(text))
+            self.rendered.append(text)
+        self._pending = []
+
+    def stop(self):
+        pass
+
+
+class FakePlayer:
+    def __init__(self):
+        self.played = []
+
+    def play(self, clip, should_stop=None):
+        self.played.append(clip)
+
+
+@pytest.fixture
+def worker_with(fakes, monkeypatch):
+    """Starts a SpeechWorker on a FakeEngine with its own PhraseCache and the given player."""
+    import speech_worker
+    workers = []
+
+    def start(player):
+        monkeypatch.setattr(speech_worker, "get_player", lambda: player)
+        engine = FakeEngine()
+        worker = speech_worker.SpeechWorker(lambda: engine, phrase_cache=PhraseCache()).start(wait=True)
+        workers.append(worker)
+        return worker, engine
+
+    yield start
+    for worker in workers:
+        worker.stop(timeout=2)
+
+
+def test_lru_eviction_by_entry_count():
+    cache = PhraseCache(max_entries=2)
+    cache.put("a", clip(10))
+    cache.put("b", clip(10))
+    assert cache.get("a") is not None # Now the most recently used
+    cache.put("c", clip(10))
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.stats()["evictions"] == 1
+
+def test_eviction_by_byte_budget():
+    cache = PhraseCache(max_entries=10, max_bytes=100)
+    for key in "abc":
+        cache.put(key, clip(40))
+    assert "a" not in cache and len(cache) == 2
+    assert cache.stats()["bytes"] == 80
+    assert not cache.put("huge", clip(101)) # Larger than the whole budget, never cached
+    assert len(cache) == 2
+
+def test_key_changes_with_the_voice_settings():
+    key = phrase_key("Music playback  terminated.", VOICE)
+    assert key == phrase_key("Music playback terminated.", VOICE)
+    assert key != phrase_key("Music playback terminated.", ("voice-2", 200, 1.0))
+    assert key != phrase_key("Music playback terminated.", ("voice-1", 150, 1.0))
+    assert key != phrase_key("Music playback terminated.", ("voice-1", 200, 0.5))
+
+def test_miss_is_spoken_live_and_rendered_then_replayed(worker_with):
+    player = FakePlayer()
+    worker, engine = worker_with(player)
+    assert worker.say("Music playback terminated.", cache=True).wait(2)
+    assert engine.said == ["Music playback terminated."] and player.played == []
+    assert wait_until(lambda: len(worker.phrases) == 1) # The render was queued behind it
+
+    assert worker.say("Music playback terminated.", cache=True).wait(2)
+    assert engine.said == ["Music playback terminated."] # Not synthesized again
+    assert len(player.played) == 1
+
+def test_changed_voice_settings_render_the_phrase_again(worker_with):
+    player = FakePlayer()
+    worker, engine = worker_with(player)
+    worker.prerender(["Presenting the top headlines."])
+    assert wait_until(lambda: len(worker.phrases) == 1)
+    engine.setProperty("rate", 150)
+    assert worker.say("Presenting the top headlines.", cache=True).wait(2)
+    assert engine.said == ["Presenting the top headlines."] and player.played == []
+    assert wait_until(lambda: len(worker.phrases) == 2)
+
+def test_without_a_player_phrases_are_spoken_live(worker_with):
+    worker, engine = worker_with(None)
+    for _ in range(2):
+        assert worker.say("Music playback terminated.", cache=True).wait(2)
+    assert engine.said == ["Music playback terminated."] * 2
+    assert engine.rendered == [] # Nothing to play renders back with
+
+def test_no_player_without_pyaudio_or_winsound(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyaudio", None) # Makes the import fail
+    monkeypatch.setitem(sys.modules, "winsound", None)
+    monkeypatch.setattr(phrase_cache, "_player", None)
+    monkeypatch.setattr(phrase_cache, "_player_checked", False)
+    assert phrase_cache.get_player() is None
+
+def test_website_phrases_are_prerendered(fakes):
+    from assistant_actions import WEBSITES
+    for _, site_name in WEBSITES.values():
+        assert f"Opening {site_name}." in PRERENDER_PHRASES
+
+def test_news_phrases_are_prerendered():
+    assert "Fetching top headlines from IN." in PRERENDER_PHRASES
+    assert "Fetching top breaking headlines." in PRERENDER_PHRASES
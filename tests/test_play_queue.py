@@ -0,0 +1,176 @@
+# tests/test_play_queue.py
+import time
+import threading
+
+import pytest
+
+from play_queue import PlayQueue, VlcPlayerAdapter
+from stream_resolver import ResolvedTrack
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class FakeResolver:
+    """
+    Resolves any query to a fresh stream URL after delay, except those in missing; records what was
+    requested and what it resolved.
+    """
+
+    def __init__(self, missing=(), delay=0.0):
+        self.missing = set(missing)
+        self.delay = delay
+        self.requested = []
+        self.resolved = []
+        self._lock = threading.Lock()
+
+    def resolve(self, query):
+        with self._lock:
+            self.requested.append(query)
+        time.sleep(self.delay)
+        with self._lock:
+            self.resolved.append(query)
+        if query in self.missing:
+            return None
+        return ResolvedTrack(query, query.title(), f"https://stream.example/{query}", time.time() + 3600)
+
+
+@pytest.fixture
+def vlc_player(fakes):
+    import vlc
+    instance = vlc.Instance()
+    return instance.media_player_new(), instance
+
+@pytest.fixture
+def make_queue(vlc_player):
+    player, instance = vlc_player
+    queues = []
+
+    def make(resolver, lookahead=2):
+        started = []
+        queue = PlayQueue(VlcPlayerAdapter(instance, player), resolver, lookahead=lookahead,
+                          on_track_start=lambda item: started.append(item.query))
+        queues.append(queue)
+        return queue, started
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+def playing_url(player):
+    return player.get_media().mrl if player.is_playing() else None
+
+
+def test_upcoming_tracks_are_resolved_ahead_of_time(vlc_player, make_queue):
+    player, _ = vlc_player
+    resolver = FakeResolver()
+    queue, started = make_queue(resolver, lookahead=2)
+    queue.play_now(ResolvedTrack("now", "Now", "https://stream.example/now", time.time() + 3600))
+    for query in ("one", "two", "three"):
+        queue.enqueue(query)
+
+    assert wait_until(lambda: len(resolver.resolved) == 2)
+    time.sleep(0.05)
+    assert resolver.resolved == ["one", "two"] # Only the look-ahead window, while "now" plays
+    assert all(item.media is not None for item in queue.upcoming()[:2])
+
+    player.end_of_media()
+    assert wait_until(lambda: started == ["one"])
+    assert playing_url(player) == "https://stream.example/one"
+    assert wait_until(lambda: resolver.resolved == ["one", "two", "three"]) # The window moved on
+
+def test_enqueue_starts_playing_when_idle(vlc_player, make_queue):
+    player, _ = vlc_player
+    queue, started = make_queue(FakeResolver())
+    assert queue.enqueue("lofi") == 0 # Starts right away
+    assert wait_until(lambda: started == ["lofi"])
+    assert playing_url(player) == "https://stream.example/lofi"
+
+def test_skip_moves_to_the_next_track(vlc_player, make_queue):
+    player, _ = vlc_player
+    queue, started = make_queue(FakeResolver())
+    queue.enqueue("one")
+    assert wait_until(lambda: started == ["one"])
+    assert not queue.skip() # Nothing queued after it
+    queue.enqueue("two")
+    queue.enqueue("three")
+    assert queue.skip()
+    assert wait_until(lambda: started == ["one", "two"])
+    assert playing_url(player) == "https://stream.example/two"
+    assert [item.query for item in queue.upcoming()] == ["three"]
+
+def test_unplayable_tracks_are_skipped(vlc_player, make_queue):
+    player, _ = vlc_player
+    queue, started = make_queue(FakeResolver(missing={"two"}))
+    queue.enqueue("one")
+    assert wait_until(lambda: started == ["one"])
+    queue.enqueue("two")
+    queue.enqueue("three")
+    player.end_of_media()
+    assert wait_until(lambda: started == ["one", "three"])
+
+def test_playback_ends_with_the_queue(vlc_player, make_queue):
+    player, _ = vlc_player
+    queue, started = make_queue(FakeResolver())
+    queue.enqueue("last")
+    assert wait_until(lambda: started == ["last"])
+    player.end_of_media()
+    assert wait_until(lambda: queue.current is None)
+    time.sleep(0.05)
+    assert not player.is_playing() and started == ["last"]
+    assert not queue.skip()
+
+def test_stop_keeps_the_queue(vlc_player, make_queue):
+    player, _ = vlc_player
+    queue, started = make_queue(FakeResolver())
+    queue.enqueue("one")
+    queue.enqueue("two")
+    assert wait_until(lambda: started == ["one"])
+    queue.stop()
+    time.sleep(0.05)
+    assert not player.is_playing() and started == ["one"]
+    assert [item.query for item in queue.upcoming()] == ["two"]
+
+def test_enqueue_reports_the_position_while_playing(vlc_player, make_queue):
+    queue, started = make_queue(FakeResolver())
+    assert queue.enqueue("one") == 0
+    assert wait_until(lambda: started == ["one"])
+    assert queue.enqueue("two") == 1
+    assert queue.enqueue("three") == 2
+
+def test_stop_cancels_a_handoff_still_resolving(vlc_player, make_queue):
+    player, _ = vlc_player
+    resolver = FakeResolver(delay=0.2)
+    queue, started = make_queue(resolver, lookahead=0) # Nothing resolved ahead, so the handoff resolves
+    queue.enqueue("one")
+    assert wait_until(lambda: resolver.requested == ["one"], timeout=1)
+    assert queue.stop() # Lands while "one" is being resolved
+    time.sleep(0.3)
+    assert started == [] and not player.is_playing()
+    assert [item.query for item in queue.upcoming()] == ["one"] # Kept for later
+
+def test_stop_music_between_tracks_cancels_the_next_one(vlc_player, make_queue, monkeypatch):
+    import media_player
+    from tts_stt import set_speech_sink, reset_speech_sink
+    player, _ = vlc_player
+    resolver = FakeResolver(delay=0.2)
+    queue, started = make_queue(resolver, lookahead=0)
+    monkeypatch.setattr(media_player, "_play_queue", queue)
+    queue.enqueue("next one")
+    assert wait_until(lambda: resolver.requested == ["next one"], timeout=1)
+    assert not player.is_playing() # In the gap between two tracks
+
+    speech = []
+    handle = set_speech_sink(speech.append)
+    try:
+        media_player.stop_vlc_player()
+    finally:
+        reset_speech_sink(handle)
+    time.sleep(0.3)
+    assert speech == ["Music playback terminated."]
+    assert started == [] and not player.is_playing()
@@ -0,0 +1,88 @@
+# tests/test_resilience.py
+import pytest
+
+from resilience import Dependency, CircuitOpen, CLOSED, OPEN
+
+
+def make_dependency(attempts=3, failure_threshold=2):
+    return Dependency("test", deadline=2.0, attempts=attempts, base_delay=0.001, max_delay=0.001,
+                      failure_threshold=failure_threshold, recovery_timeout=60.0)
+
+def failing(attempts_made):
+    def fn():
+        attempts_made.append(1)
+        raise ConnectionError("down")
+    return fn
+
+
+def test_a_call_counts_once_against_the_breaker_however_many_attempts():
+    dependency = make_dependency(attempts=3, failure_threshold=2)
+    attempts_made = []
+    with pytest.raises(ConnectionError):
+        dependency.call(failing(attempts_made))
+    assert len(attempts_made) == 3 # All retries were made, the breaker did not open mid-call
+    assert dependency.retries == 2
+    assert dependency.breaker.stats()["consecutive_failures"] == 1
+    assert dependency.breaker.state == CLOSED
+
+def test_breaker_opens_after_threshold_failed_calls():
+    dependency = make_dependency(attempts=3, failure_threshold=2)
+    attempts_made = []
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            dependency.call(failing(attempts_made))
+    assert dependency.breaker.state == OPEN
+    assert len(attempts_made) == 6
+    with pytest.raises(CircuitOpen):
+        dependency.call(failing(attempts_made))
+    assert len(attempts_made) == 6 # Rejected without calling
+
+def test_success_after_a_retry_resets_the_failure_count():
+    dependency = make_dependency(attempts=3, failure_threshold=2)
+    attempts_made = []
+    with pytest.raises(ConnectionError):
+        dependency.call(failing(attempts_made))
+
+    outcomes = iter([ConnectionError("blip"), "ok"])
+    def flaky():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert dependency.call(flaky) == "ok"
+    assert dependency.breaker.stats()["consecutive_failures"] == 0
+
+def test_errors_ruled_out_by_retry_if_do_not_count():
+    dependency = make_dependency(attempts=3, failure_threshold=1)
+    attempts_made = []
+    with pytest.raises(ConnectionError):
+        dependency.call(failing(attempts_made), retry_if=lambda e: False)
+    assert len(attempts_made) == 1
+    assert dependency.breaker.state == CLOSED
+
+def test_deadline_error_reports_the_per_call_deadline():
+    import time
+    from resilience import DeadlineExceeded
+    dependency = make_dependency(attempts=1)
+    with pytest.raises(DeadlineExceeded, match="0.1s"):
+        dependency.call(time.sleep, 0.5, deadline=0.1)
+
+def test_streams_use_one_reader_thread_and_time_out_per_item():
+    import time
+    import threading
+    from resilience import iter_with_deadline, DeadlineExceeded
+
+    def chunks(delays):
+        for delay in delays:
+            time.sleep(delay)
+            yield delay
+
+    before = threading.active_count()
+    readers = []
+    for item in iter_with_deadline(chunks([0.01] * 20), timeout=1.0):
+        readers.append(threading.active_count() - before)
+    assert len(readers) == 20 and max(readers) <= 1
+
+    with pytest.raises(DeadlineExceeded):
+        list(iter_with_deadline(chunks([0.01, 0.5]), timeout=0.1))
@@ -0,0 +1,77 @@
+# tests/test_response_cache.py
+import os
+import json
+
+import response_cache
+from response_cache import ResponseCache
+
+
+def test_put_saves_in_the_background(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, save_delay=60)
+    cache.put("key", "answer")
+    cache.put("other", "another answer")
+    assert not os.path.exists(path) # Nothing written on the command's thread
+    cache.flush()
+    with open(path, encoding="utf-8") as f:
+        assert [entry[0] for entry in json.load(f)["entries"]] == ["key", "other"]
+    assert ResponseCache(path=path).get("other") == "another answer"
+
+def test_scheduled_save_runs_after_the_delay(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, save_delay=0.05)
+    cache.put("key", "answer")
+    timer = cache._save_timer
+    timer.join(2)
+    assert os.path.exists(path)
+    cache.put("other", "another answer") # Schedules a new save
+    assert cache._save_timer is not None and cache._save_timer is not timer
+    cache.flush()
+
+def test_key_ignores_unrelated_turns(fakes):
+    from conversation import ConversationStore
+    from llm_interaction import _response_cache_key
+    persona = [{"role": "system", "content": "You are Marco."}]
+    store = ConversationStore(list(persona), summarizer=None)
+    empty = _response_cache_key(store, "what is the capital of australia")
+    assert empty == _response_cache_key(ConversationStore(list(persona), summarizer=None),
+                                        "What is the capital of Australia?")
+
+    store.append("user", "tell me a joke")
+    store.append("assistant", "Why did the scarecrow win an award?")
+    assert _response_cache_key(store, "what is the capital of australia") == empty
+    # Follow-ups depend on the whole conversation
+    assert _response_cache_key(store, "tell me more") != \
+        _response_cache_key(ConversationStore(list(persona), summarizer=None), "tell me more")
+    # So does a different persona
+    other = ConversationStore([{"role": "system", "content": "You are a pirate."}], summarizer=None)
+    assert _response_cache_key(other, "what is the capital of australia") != empty
+
+def test_repeated_question_after_an_unrelated_turn_hits(fakes, monkeypatch):
+    import llm_interaction
+    from conversation import ConversationStore, set_current_store, reset_current_store
+    from tts_stt import set_speech_sink, reset_speech_sink
+    cache = ResponseCache(path=None)
+    monkeypatch.setattr(response_cache, "_cache", cache)
+    speech = []
+    store_handle = set_current_store(ConversationStore([{"role": "system", "content": "You are Marco."}],
+                                                       summarizer=None))
+    sink_handle = set_speech_sink(speech.append)
+    try:
+        for question in ("what is the capital of france", "tell me a joke", "what is the capital of france"):
+            llm_interaction.get_gemini_response(question)
+    finally:
+        reset_speech_sink(sink_handle)
+        reset_current_store(store_handle)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+def test_time_of_day_questions_are_not_cached():
+    for prompt in ("what time is it", "What's the time?", "what is the time in tokyo", "what is the date today",
+                   "what's the date", "what day is it", "latest cricket news", "weather in delhi"):
+        assert response_cache.is_time_sensitive(prompt), prompt
+
+def test_questions_that_mention_time_or_date_are_cached():
+    for prompt in ("what time zone is india in", "what is the date of independence day",
+                   "what is the time difference between india and japan", "what is the capital of france"):
+        assert not response_cache.is_time_sensitive(prompt), prompt
@@ -0,0 +1,52 @@
+# tests/test_server.py
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def server(fakes, monkeypatch):
+    import history_db
+    monkeypatch.setattr(history_db, "HISTORY_DB_ENABLED", False)
+    from server import MarcoServer
+    loop = asyncio.new_event_loop()
+    marco = loop.run_until_complete(MarcoServer("127.0.0.1", 0, workers=4).start())
+    yield loop, marco
+    loop.run_until_complete(marco.close())
+    loop.close()
+
+def run_commands(loop, marco, commands):
+    from benchmarks.bench_server import HTTPClient
+
+    async def session():
+        client = await HTTPClient("127.0.0.1", marco.port).connect()
+        try:
+            _, created = await client.request("POST", "/sessions")
+            responses = []
+            for command in commands:
+                _, response = await client.request("POST", f"/sessions/{created['session']}/commands",
+                                                   {"command": command})
+                responses.append(response)
+            return responses
+        finally:
+            client.close()
+    return loop.run_until_complete(session())
+
+
+def test_websites_open_on_the_client(fakes, server):
+    opened = len(fakes.opened_urls)
+    response, = run_commands(*server, ["open google"])
+    assert response["actions"] == [{"type": "open_url", "url": "https://www.google.com", "title": "Google"}]
+    assert response["speech"] == ["Opening Google."]
+    assert len(fakes.opened_urls) == opened # Nothing opened on the host
+
+def test_music_plays_on_the_client(fakes, server):
+    import config
+    play, queue, skip, stop = run_commands(*server, ["play lofi", "queue jazz", "next song", "stop music"])
+    assert [action["type"] for action in play["actions"]] == ["play"]
+    assert play["actions"][0]["url"].startswith("http") and play["actions"][0]["query"] == "lofi"
+    assert [action["type"] for action in queue["actions"]] == ["queue"]
+    assert skip["actions"] == [{"type": "next"}]
+    assert stop["actions"] == [{"type": "stop"}]
+    player = config.get_vlc_player()
+    assert player is None or not player.is_playing() # The host's VLC player was never started
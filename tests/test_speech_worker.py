@@ -0,0 +1,76 @@
+# tests/test_speech_worker.py
+import time
+
+import pytest
+
+
+class SlowEngine:
+    """Stands in for the pyttsx3 engine: every utterance takes delay seconds to say."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.said = []
+        self._pending = []
+
+    def connect(self, event, callback):
+        pass
+
+    def getProperty(self, name):
+        return None
+
+    def say(self, text):
+        self._pending.append(text)
+
+    def save_to_file(self, text, path):
+        self._pending.append(text)
+
+    def runAndWait(self):
+        for text in self._pending:
+            time.sleep(self.delay)
+            self.said.append(text)
+        self._pending = []
+
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def start_worker(fakes, monkeypatch):
+    """Makes a SpeechWorker on a SlowEngine the shared worker that tts_stt stops."""
+    import tts_stt
+    from speech_worker import SpeechWorker
+
+    def start(delay):
+        engine = SlowEngine(delay)
+        worker = SpeechWorker(lambda: engine, phrase_cache=None).start(wait=True)
+        monkeypatch.setattr(tts_stt, "_speech_worker", worker)
+        return worker, engine
+    return start
+
+
+def test_queued_speech_is_spoken_before_shutdown(start_worker):
+    from tts_stt import speak, stop_speech_worker
+    worker, engine = start_worker(0.05)
+    speak("Music playback terminated.")
+    speak("Goodbye.")
+    stop_speech_worker()
+    assert engine.said == ["Music playback terminated.", "Goodbye."]
+
+def test_shutdown_drain_is_bounded(start_worker):
+    from tts_stt import stop_speech_worker
+    worker, engine = start_worker(0.2)
+    for i in range(20):
+        worker.say(f"sentence {i}")
+    start = time.monotonic()
+    stop_speech_worker(drain_timeout=0.3)
+    assert time.monotonic() - start < 1.0
+    assert 0 < len(engine.said) < 20 # The rest was flushed
+
+def test_wait_idle_ignores_renders(start_worker, tmp_path):
+    worker, engine = start_worker(0.5)
+    worker.render("rendered to a file", str(tmp_path / "speech.wav"))
+    time.sleep(0.05) # The worker is now busy rendering
+    assert worker.is_busy()
+    start = time.monotonic()
+    assert worker.wait_idle(timeout=1) # Renders are never heard, so they are not waited for
+    assert time.monotonic() - start < 0.2
@@ -0,0 +1,97 @@
+# tests/test_stream_resolver.py
+import time
+import threading
+
+import pytest
+
+SEARCH_DELAY = 0.2
+
+
+class SlowYdl:
+    """Stands in for yt_dlp.YoutubeDL: every extraction takes SEARCH_DELAY and records when it ran."""
+
+    def __init__(self, opts, log):
+        self.opts = opts
+        self.log = log
+        self.busy = False
+
+    def extract_info(self, url, download=False):
+        assert not self.busy, "YoutubeDL instance used by two threads at once"
+        self.busy = True
+        start = time.monotonic()
+        time.sleep(SEARCH_DELAY)
+        self.busy = False
+        self.log.append((start, time.monotonic()))
+        if url.startswith("ytsearch1:"):
+            query = url[len("ytsearch1:"):]
+            return {"entries": [{"id": query.replace(" ", "_"), "title": query}]}
+        return {"url": f"https://stream.example/{url[-8:]}?expire={int(time.time()) + 3600}", "title": "Track"}
+
+
+@pytest.fixture
+def resolver():
+    import resilience
+    from stream_resolver import StreamResolver
+    resilience.reset_breakers()
+    log = []
+    instances = []
+
+    def factory(opts):
+        ydl = SlowYdl(opts, log)
+        instances.append(ydl)
+        return ydl
+
+    resolver = StreamResolver(cache_path=None, ydl_factory=factory)
+    resolver.log = log
+    resolver.instances = instances
+    return resolver
+
+
+def test_concurrent_resolves_overlap(resolver):
+    results = {}
+    def resolve(query):
+        results[query] = resolver.resolve(query)
+
+    threads = [threading.Thread(target=resolve, args=(query,)) for query in ("lofi one", "lofi two", "lofi three")]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    assert all(track.stream_url for track in results.values())
+    # Search plus stream URL each take SEARCH_DELAY; serialized, three resolves would take 6 of them
+    assert elapsed < SEARCH_DELAY * 4
+    searches = sorted(resolver.log)[:3]
+    assert searches[1][0] < searches[0][1] # The second extraction started before the first ended
+
+def test_instances_are_reused(resolver):
+    resolver.resolve("first song")
+    resolver.resolve("second song")
+    assert len(resolver.instances) == 2 # One search and one stream instance, reused for the second resolve
+    assert resolver.resolve_cached("first song").title == "Track"
+
+def test_pool_keeps_at_most_max_idle_instances():
+    from stream_resolver import YdlPool
+    log = []
+    pool = YdlPool(lambda opts: SlowYdl(opts, log), {}, max_idle=1)
+    threads = [threading.Thread(target=pool.extract_info, args=(f"ytsearch1:song {i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.created == 3
+    assert len(pool._idle) == 1
+
+def test_cache_is_saved_in_the_background(tmp_path):
+    import os
+    from stream_resolver import StreamResolver
+    path = str(tmp_path / "stream_cache.json")
+    log = []
+    resolver = StreamResolver(cache_path=path, ydl_factory=lambda opts: SlowYdl(opts, log), save_delay=60)
+    resolver.resolve("lofi")
+    assert not os.path.exists(path) # Nothing written on the command's thread
+    resolver.flush()
+    reloaded = StreamResolver(cache_path=path, ydl_factory=lambda opts: SlowYdl(opts, log))
+    assert reloaded.resolve_cached("lofi").title == "Track"
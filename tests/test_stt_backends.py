@@ -0,0 +1,113 @@
+# tests/test_stt_backends.py
+import time
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def audio(fakes, make_wav):
+    """A short utterance read from a WAV file, as the recognizers get it."""
+    import wave
+    import speech_recognition as sr
+    with wave.open(make_wav([(0.2, 0), (0.5, 8000), (0.2, 0)]), 'rb') as f:
+        return sr.AudioData(f.readframes(f.getnframes()), f.getframerate(), f.getsampwidth())
+
+def scripted_backend(name, text=None, confidence=0.9, delay=0.0, error=None):
+    """A backend that answers (text, confidence) after delay, raises error, or understands nothing."""
+    from stt_backends import STTBackend
+
+    class ScriptedBackend(STTBackend):
+        def __init__(self):
+            self.name = name
+            self.calls = 0
+            self.heard = []
+
+        def transcribe(self, audio_data):
+            import speech_recognition as sr
+            self.calls += 1
+            self.heard.append(len(audio_data.frame_data))
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            if text is None:
+                raise sr.UnknownValueError()
+            return text, confidence
+    return ScriptedBackend()
+
+
+def test_fallback_stops_at_the_first_confident_result(audio):
+    from stt_backends import RecognitionChain
+    first = scripted_backend("whisper", "play lofi", 0.9)
+    second = scripted_backend("google", "play lo fi", 0.95)
+    result = RecognitionChain([first, second], mode="fallback").recognize(audio)
+    assert (result.text, result.backend) == ("play lofi", "whisper")
+    assert first.heard == [len(audio.frame_data)] and second.calls == 0
+
+def test_fallback_moves_on_after_errors_and_low_confidence(audio):
+    from stt_backends import RecognitionChain
+    failing = scripted_backend("whisper", error=RuntimeError("model not loaded"))
+    unsure = scripted_backend("sphinx", "play low fee", 0.3)
+    confident = scripted_backend("google", "play lofi", 0.9)
+    chain = RecognitionChain([failing, unsure, confident], mode="fallback")
+    assert chain.recognize(audio).text == "play lofi"
+    assert chain.stats["whisper"].failures == 1 and chain.stats["sphinx"].failures == 0
+
+def test_fallback_returns_the_best_guess_when_nobody_is_confident(audio):
+    from stt_backends import RecognitionChain
+    chain = RecognitionChain([scripted_backend("sphinx", "play low fee", 0.3),
+                              scripted_backend("google", "play lofi", 0.5),
+                              scripted_backend("whisper")], mode="fallback")
+    assert chain.recognize(audio).text == "play lofi"
+    assert RecognitionChain([scripted_backend("google")]).recognize(audio) is None
+
+def test_race_returns_the_first_confident_result(audio):
+    from stt_backends import RecognitionChain
+    slow = scripted_backend("google", "play lofi", 0.95, delay=0.5)
+    fast = scripted_backend("whisper", "play lofi", 0.9, delay=0.01)
+    chain = RecognitionChain([slow, fast], mode="race", deadline=2)
+    start = time.monotonic()
+    result = chain.recognize(audio)
+    assert result.backend == "whisper"
+    assert time.monotonic() - start < 0.4
+
+def test_race_gives_up_at_the_deadline_with_the_best_guess(audio):
+    from stt_backends import RecognitionChain
+    hung = scripted_backend("google", "play lofi", 0.95, delay=1.0)
+    unsure = scripted_backend("whisper", "play low fee", 0.4)
+    chain = RecognitionChain([hung, unsure], mode="race", deadline=0.2)
+    start = time.monotonic()
+    assert chain.recognize(audio).text == "play low fee"
+    assert time.monotonic() - start < 0.6
+
+def test_race_creates_one_executor_under_concurrent_use(audio):
+    from stt_backends import RecognitionChain
+    chain = RecognitionChain([scripted_backend("google", "stop", 0.9, delay=0.01),
+                              scripted_backend("whisper", "stop", 0.9, delay=0.01)], mode="race")
+    executors = []
+    barrier = threading.Barrier(8)
+
+    def recognize():
+        barrier.wait()
+        chain.recognize(audio)
+        executors.append(chain._executor)
+    threads = [threading.Thread(target=recognize) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(executor) for executor in executors}) == 1
+
+def test_latency_stats():
+    from stt_backends import LatencyStats, LATENCY_WINDOW
+    stats = LatencyStats()
+    assert stats.summary() == {"calls": 0, "failures": 0, "mean": None, "p50": None, "p95": None}
+    for i in range(1, 101):
+        stats.record(i / 100, ok=i % 10 != 0)
+    summary = stats.summary()
+    assert (summary["calls"], summary["failures"]) == (100, 10)
+    assert summary["mean"] == pytest.approx(0.505)
+    assert (summary["p50"], summary["p95"]) == (0.5, 0.95)
+    for _ in range(LATENCY_WINDOW):
+        stats.record(2.0, ok=True)
+    assert stats.percentile(50) == 2.0 # Only the recent window counts for percentiles
@@ -0,0 +1,291 @@
+# tracing.py
+"""
+Lightweight per-command tracing.
+
+Every command gets a trace id when it enters the GUI; work done for it is recorded as nested
+spans with monotonic timings. Finished spans are appended to a rotating JSONL file (written by
+a background thread) and feed rolling p50/p95/p99 latencies per stage.
+
+    python tracing.py            # per-stage percentiles from the trace log
+    python tracing.py --tail 20  # last 20 spans
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import threading
+import itertools
+import contextvars
+import logging
+import logging.handlers
+from collections import deque
+from contextlib import contextmanager
+
+TRACING_ENABLED = True
+TRACE_LOG_PATH = os.path.join(os.path.expanduser("~"), ".marco", "traces.jsonl")
+TRACE_LOG_MAX_BYTES = 5 * 1024 * 1024
+TRACE_LOG_BACKUPS = 3
+METRICS_WINDOW = 500 # Recent durations kept per stage for percentiles
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """One timed unit of work within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attrs", "error", "_wall_start")
+
+    def __init__(self, name, trace_id, parent_id=None, attrs=None):
+        self.trace_id = trace_id
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.monotonic()
+        self._wall_start = time.time()
+        self.end = None
+        self.attrs = attrs or {}
+        self.error = None
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def finish(self, end=None):
+        if self.end is None:
+            self.end = time.monotonic() if end is None else end
+            _on_span_finished(self)
+        return self
+
+    def to_dict(self):
+        return {
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "ts": round(self._wall_start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+def current_trace_id():
+    return _current_trace.get()
+
+def current_span():
+    return _current_span.get()
+
+@contextmanager
+def trace(**attrs):
+    """Starts a new trace (e.g. for one command from the GUI); spans opened inside belong to it."""
+    trace_id = new_trace_id()
+    token = _current_trace.set(trace_id)
+    span_token = _current_span.set(None)
+    try:
+        yield trace_id
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(token)
+
+def start_span(name, parent=None, **attrs):
+    """Creates a span (without making it current). Its parent defaults to the current span."""
+    parent = parent if parent is not None else _current_span.get()
+    trace_id = parent.trace_id if parent is not None else (_current_trace.get() or new_trace_id())
+    return Span(name, trace_id, parent.span_id if parent is not None else None, attrs)
+
+@contextmanager
+def activate(span):
+    """Makes span the current span (and its trace the current trace) for the duration of the block."""
+    trace_token = _current_trace.set(span.trace_id)
+    span_token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+@contextmanager
+def span(name, **attrs):
+    """Times the enclosed block as a child of the current span."""
+    current = start_span(name, **attrs)
+    with activate(current):
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current.finish()
+
+def capture():
+    """Returns the current span so work handed to another thread can be attributed to it."""
+    return _current_span.get()
+
+def record_span(name, start, end, parent=None, **attrs):
+    """Records a span measured elsewhere (e.g. on a worker thread) from monotonic start/end times."""
+    recorded = start_span(name, parent=parent, **attrs)
+    recorded.start = start
+    recorded._wall_start = time.time() - (time.monotonic() - start)
+    return recorded.finish(end)
+
+
+# --- Rolling per-stage metrics ---
+
+class StageMetrics:
+    """Rolling latency percentiles per span name."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._durations = {}
+        self._counts = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, error=False):
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+                self._errors[name] = 0
+            self._durations[name].append(seconds)
+            self._counts[name] += 1
+            self._errors[name] += bool(error)
+
+    def summary(self):
+        """{stage: {count, errors, p50, p95, p99}} with latencies in seconds."""
+        with self._lock:
+            snapshot = {name: sorted(values) for name, values in self._durations.items()}
+            counts = dict(self._counts)
+            errors = dict(self._errors)
+        return {name: dict(count=counts[name], errors=errors[name], **percentiles(values))
+                for name, values in snapshot.items()}
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+
+def percentiles(sorted_values):
+    if not sorted_values:
+        return {"p50": None, "p95": None, "p99": None}
+    last = len(sorted_values) - 1
+    return {f"p{p}": sorted_values[min(last, int(round(p / 100.0 * last)))] for p in (50, 95, 99)}
+
+def format_summary(summary, stages=None):
+    """Formats a metrics summary as aligned text lines (latencies in ms)."""
+    lines = [f"{'stage':<24}{'count':>7}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}"]
+    for name in sorted(stages or summary):
+        if name not in summary:
+            continue
+        stats = summary[name]
+        cells = ["-" if stats[p] is None else f"{stats[p] * 1000:.1f}" for p in ("p50", "p95", "p99")]
+        lines.append(f"{name:<24}{stats['count']:>7}{stats['errors']:>5}" + "".join(f"{c:>10}" for c in cells))
+    return lines
+
+
+METRICS = StageMetrics()
+
+
+# --- JSONL writer ---
+
+_writer_lock = threading.Lock()
+_listener = None
+_trace_logger = logging.getLogger("marco.trace")
+_trace_logger.propagate = False
+
+def _start_writer():
+    """Starts the background thread that appends finished spans to the rotating trace log."""
+    global _listener, TRACING_ENABLED
+    with _writer_lock:
+        if _listener is not None:
+            return
+        try:
+            os.makedirs(os.path.dirname(TRACE_LOG_PATH), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                TRACE_LOG_PATH, maxBytes=TRACE_LOG_MAX_BYTES, backupCount=TRACE_LOG_BACKUPS, encoding="utf-8")
+        except OSError as e:
+            print(f"Trace log disabled, cannot open {TRACE_LOG_PATH}: {e}")
+            TRACING_ENABLED = False
+            return
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        records = queue.SimpleQueue()
+        _trace_logger.addHandler(logging.handlers.QueueHandler(records))
+        _trace_logger.setLevel(logging.INFO)
+        _listener = logging.handlers.QueueListener(records, file_handler)
+        _listener.start()
+
+def flush():
+    """Stops the writer thread after writing out every queued span (call at exit)."""
+    global _listener
+    with _writer_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            for handler in list(_trace_logger.handlers):
+                _trace_logger.removeHandler(handler)
+
+def _on_span_finished(finished):
+    METRICS.record(finished.name, finished.duration, error=finished.error is not None)
+    if not TRACING_ENABLED:
+        return
+    if _listener is None:
+        _start_writer()
+    if _listener is not None:
+        _trace_logger.info(json.dumps(finished.to_dict(), default=str))
+
+
+# --- CLI dump ---
+
+def read_trace_log(path=TRACE_LOG_PATH):
+    """Yields span dicts from the trace log and its rotated backups, oldest first."""
+    paths = [f"{path}.{i}" for i in range(TRACE_LOG_BACKUPS, 0, -1)] + [path]
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def summarize_trace_log(path=TRACE_LOG_PATH, window=None):
+    metrics = StageMetrics(window=window or sys.maxsize)
+    for record in read_trace_log(path):
+        metrics.record(record["name"], record["duration_ms"] / 1000.0, error=bool(record.get("error")))
+    return metrics.summary()
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize Marco trace logs")
+    parser.add_argument("--file", default=TRACE_LOG_PATH, help="trace log to read")
+    parser.add_argument("--tail", type=int, default=0, help="print the last N spans instead of percentiles")
+    args = parser.parse_args(argv)
+
+    if args.tail:
+        for record in deque(read_trace_log(args.file), maxlen=args.tail):
+            print(json.dumps(record))
+        return
+    summary = summarize_trace_log(args.file)
+    if not summary:
+        print(f"No spans found in {args.file}")
+        return
+    for line in format_summary(summary):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,128 @@
 # tts_stt.py
-import speech_recognition as sr
-import config # Import config to access the global engine and recognizer
-
-def speak(text):
-    """Converts text to speech using the initialized engine from config."""
-    engine = config.get_engine()
-    if engine:
-        engine.say(text)
-        engine.runAndWait()
-    else:
-        print("Text-to-speech engine not initialized in config.")
+import os
+import threading
+import tempfile
+import contextvars
+from speech_worker import SpeechWorker, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from stt_backends import build_chain, get_recognizer
+from phrase_cache import PRERENDER_PHRASES
+from cancellation import is_cancelled
+import tracing
+
+SPEECH_DRAIN_TIMEOUT = 3 # Seconds queued speech may take to finish when shutting down
+_speech_worker = None # Background thread that owns the TTS engine, see start_speech_worker()
+_speech_worker_lock = threading.Lock()
+_recognition_chain = None # Speech-to-text backends, see get_recognition_chain()
+# When set (by the server), speak() hands text to this callable instead of the local speakers
+_speech_sink = contextvars.ContextVar("speech_sink", default=None)
+
+def start_speech_worker(engine_factory=None):
+    """
+    Starts the background speech worker (once) and returns it.
+    The pyttsx3 engine is initialized on the worker thread, so this never blocks the caller.
+    """
+    global _speech_worker
+    with _speech_worker_lock:
+        if _speech_worker is None:
+            _speech_worker = SpeechWorker(engine_factory).start()
+        return _speech_worker
+
+def stop_speech_worker(drain_timeout=SPEECH_DRAIN_TIMEOUT):
+    """
+    Stops the background speech worker. What is still queued (e.g. "Music playback terminated." and
+    the goodbye of an exit command) is spoken first, for up to drain_timeout seconds; the rest is flushed.
+    """
+    global _speech_worker
+    if _speech_worker is not None:
+        if drain_timeout:
+            _speech_worker.wait_idle(drain_timeout)
+        _speech_worker.stop(timeout=2)
+        _speech_worker = None
+
+def flush_speech():
+    """Cancels queued speech and cuts off the current utterance, e.g. when a new command arrives."""
+    if _speech_worker is not None:
+        _speech_worker.flush()
+
+def speak(text, priority=PRIORITY_NORMAL, cache=False):
+    """
+    Converts text to speech.
+    Queues the text on the speech worker (starting it on first use) and returns its Utterance
+    handle without blocking. Nothing is said for a command that has been cancelled.
+    Pass cache=True for fixed phrases: they are rendered once and then played back from memory.
+    """
+    if is_cancelled():
+        return None
+    sink = _speech_sink.get()
+    if sink is not None:
+        sink(text)
+        return None
+    return start_speech_worker().say(text, priority, cache=cache)
+
+def prerender_phrases():
+    """Renders phrase_cache.PRERENDER_PHRASES in the background so they play from memory the first time."""
+    start_speech_worker().prerender(PRERENDER_PHRASES)
+
+def set_speech_sink(sink):
+    """
+    Redirects speak() in the current context to sink(text), e.g. to send a server session's
+    speech to its client. Returns a reset handle for reset_speech_sink().
+    """
+    return _speech_sink.set(sink)
+
+def reset_speech_sink(handle):
+    _speech_sink.reset(handle)
+
+def render_speech(text, timeout=None):
+    """
+    Synthesizes text with the TTS engine and returns the audio file's bytes (WAV),
+    or None if it could not be rendered. Blocks until the speech worker gets to it.
+    """
+    fd, path = tempfile.mkstemp(prefix="marco-tts-", suffix=".wav")
+    os.close(fd)
+    try:
+        utterance = start_speech_worker().render(text, path)
+        if not utterance.wait(timeout):
+            utterance.cancel() # Skipped if the worker has not started on it yet
+            return None
+        if utterance.error or utterance.cancelled:
+            return None
+        with open(path, "rb") as f:
+            return f.read() or None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def get_recognition_chain():
+    """Returns the speech recognition chain, building it from stt_backends.STT_CHAIN on first use."""
+    global _recognition_chain
+    if _recognition_chain is None:
+        _recognition_chain = build_chain()
+    return _recognition_chain
+
+def set_recognition_chain(chain):
+    """Replaces the recognition chain, e.g. with a different backend order or offline backends."""
+    global _recognition_chain
+    _recognition_chain = chain
 
 def recognize_speech(audio_data):
     """
-    Recognizes speech from audio data using the recognizer from config.
+    Recognizes speech from audio data using the configured chain of STT backends.
     Returns the recognized text or an empty string if not understood.
     """
-    recognizer = config.get_recognizer()
-    if recognizer:
-        try:
-            return recognizer.recognize_google(audio_data).lower()
-        except sr.UnknownValueError:
-            print("Google Speech Recognition could not understand audio")
-            return ""
-        except sr.RequestError as e:
-            print(f"Could not request results from Google Speech Recognition service; {e}")
-            return ""
-        except Exception as e:
-            print(f"An unexpected error occurred during speech recognition: {e}")
-            return ""
-    else:
-        print("Speech recognizer not initialized in config.")
-        return ""
\ No newline at end of file
+    chain = get_recognition_chain()
+    if not chain.backends:
+        print("No speech recognition backend available.")
+        return ""
+
+    with tracing.span("stt") as stt_span:
+        result = chain.recognize(audio_data)
+        if result is not None:
+            stt_span.set(backend=result.backend, confidence=result.confidence)
+    if result is None:
+        print("Speech recognition could not understand audio")
+        return ""
+    print(f"Recognized with {result.backend} in {result.latency:.2f}s (confidence {result.confidence:.2f})")
+    return result.text
@@ -0,0 +1,52 @@
+# ui_dispatch.py
+import threading
+from collections import deque
+
+DISPATCH_EVENT = "<<MarcoDispatch>>"
+
+
+class TkDispatcher:
+    """
+    Runs callables posted from any thread on the Tk main thread.
+
+    Posting appends to a queue and, only when the queue was empty, wakes the main loop with a
+    Tk virtual event. The handler then drains everything queued so far in one batch, so bursts
+    of messages cost a single wakeup and an idle GUI does no polling at all.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup_pending = False
+        self._main_thread = threading.current_thread()
+        root.bind(DISPATCH_EVENT, self._drain)
+
+    def post(self, func, *args, **kwargs):
+        """Schedules func(*args, **kwargs) on the Tk main thread. Safe to call from any thread."""
+        with self._lock:
+            self._queue.append((func, args, kwargs))
+            if self._wakeup_pending:
+                return # The pending wakeup will pick this up too
+            self._wakeup_pending = True
+
+        try:
+            if threading.current_thread() is self._main_thread:
+                self.root.after_idle(self._drain)
+            else:
+                # Tkinter forwards this to the main thread's event loop
+                self.root.event_generate(DISPATCH_EVENT, when="tail")
+        except Exception as e:
+            # The main loop has already stopped (window closed); nothing left to update
+            print(f"UI dispatch failed: {e}")
+
+    def _drain(self, event=None):
+        with self._lock:
+            batch = list(self._queue)
+            self._queue.clear()
+            self._wakeup_pending = False
+        for func, args, kwargs in batch:
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"Error in UI callback {getattr(func, '__name__', func)}: {e}")
@@ -0,0 +1,65 @@
+# wake_word.py
+import re
+
+WAKE_WORD = "marco"
+WAKE_WORD_VARIANTS = ("marco", "marko") # Spellings the cloud recognizer commonly returns
+WAKE_WORD_WINDOW_SECONDS = 1.5 # Only the start of an utterance is scanned by the local detector
+SPHINX_KEYWORD_THRESHOLD = 1e-20 # Lower is more sensitive (more false activations)
+
+_WAKE_WORD_PATTERN = re.compile(r"\b(?:%s)\b[\s,.!?:;-]*" % "|".join(WAKE_WORD_VARIANTS))
+
+def split_wake_word(transcript):
+    """
+    Looks for the wake word in a transcript.
+    Returns (found, command) where command is whatever was said after the wake word,
+    e.g. "marco, play lofi" -> (True, "play lofi").
+    """
+    match = _WAKE_WORD_PATTERN.search(transcript.lower())
+    if not match:
+        return False, ""
+    return True, transcript[match.end():].strip(" ,.!?")
+
+
+class SphinxWakeWordDetector:
+    """
+    Local keyword spotter for the wake word using PocketSphinx (through speech_recognition).
+    Runs entirely offline on the first WAKE_WORD_WINDOW_SECONDS of each utterance, so
+    utterances without the wake word never reach the cloud recognizer.
+    """
+
+    def __init__(self, keyword=WAKE_WORD, threshold=SPHINX_KEYWORD_THRESHOLD, window_seconds=WAKE_WORD_WINDOW_SECONDS):
+        import speech_recognition as sr
+        import pocketsphinx # Raises ImportError when PocketSphinx is not installed
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+        self.keyword_entries = [(keyword, threshold)]
+        self.window_seconds = window_seconds
+
+    def detect(self, utterance):
+        """Returns True if the wake word is heard at the start of the utterance."""
+        window_bytes = int(self.window_seconds * utterance.sample_rate) * utterance.sample_width
+        audio = self._sr.AudioData(utterance.frame_data[:window_bytes], utterance.sample_rate, utterance.sample_width)
+        try:
+            hypothesis = self._recognizer.recognize_sphinx(audio, keyword_entries=self.keyword_entries)
+        except self._sr.UnknownValueError:
+            return False
+        except Exception as e:
+            print(f"Wake word detector error: {e}")
+            return True # Let the cloud recognizer decide rather than dropping the command
+        return bool(hypothesis.strip())
+
+
+_detector = None
+_detector_checked = False
+
+def get_wake_word_detector():
+    """Returns the local wake word detector, or None if no local engine is installed."""
+    global _detector, _detector_checked
+    if not _detector_checked:
+        _detector_checked = True
+        try:
+            _detector = SphinxWakeWordDetector()
+        except ImportError:
+            print("PocketSphinx not installed; the wake word will be checked in the cloud transcript.")
+            _detector = None
+    return _detector